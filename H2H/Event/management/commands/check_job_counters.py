@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+from django.db.models import F, Q
+
+from Event.models import Job
+
+
+class Command(BaseCommand):
+    help = 'Compares the accepted/applied counters of the jobs with their participations.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repair', action='store_true', help='set the wrong counters to the actual counts')
+
+    def handle(self, *args, **options):
+        jobs = Job.all_objects.get_queryset().annotate_actual_counts().filter(
+            ~Q(accepted_count=F('actual_accepted_count')) | ~Q(applied_count=F('actual_applied_count'))
+        )
+        wrong = list(jobs.values_list('id', 'accepted_count', 'actual_accepted_count', 'applied_count', 'actual_applied_count'))
+        for job_id, accepted, actual_accepted, applied, actual_applied in wrong:
+            self.stdout.write('Job {0}: accepted {1} (actual {2}), applied {3} (actual {4})'.format(
+                job_id, accepted, actual_accepted, applied, actual_applied))
+
+        if not wrong:
+            self.stdout.write(self.style.SUCCESS('All job counters are correct'))
+        elif options['repair']:
+            repaired = Job.all_objects.filter(id__in=[row[0] for row in wrong]).repair_counters()
+            self.stdout.write(self.style.SUCCESS('Repaired {0} jobs'.format(repaired)))
+        else:
+            self.stdout.write(self.style.WARNING('{0} jobs have wrong counters, use --repair to fix them'.format(len(wrong))))
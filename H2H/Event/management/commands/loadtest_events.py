@@ -0,0 +1,181 @@
+import json
+import os
+import random
+import shutil
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.request
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from graphql_jwt.shortcuts import get_token
+
+# the discovery queries of the app, the search by coordinates and radius computes distances
+EVENTS = """
+    query events {
+        events {
+            id
+            name
+            start
+            location { latitude longitude }
+            jobSet { id name totalPositions }
+        }
+    }
+"""
+EVENTS_BY_COORDINATES = """
+    query eventsByCoordinates($ulLongitude: Float, $ulLatitude: Float, $lrLongitude: Float, $lrLatitude: Float) {
+        eventsByCoordinates(ulLongitude: $ulLongitude, ulLatitude: $ulLatitude,
+                            lrLongitude: $lrLongitude, lrLatitude: $lrLatitude) {
+            id
+            name
+            location { latitude longitude }
+        }
+    }
+"""
+EVENTS_WITHIN_RADIUS = """
+    query eventsWithinRadius($lat: Float!, $lon: Float!, $km: Float!) {
+        eventsWithinRadius(lat: $lat, lon: $lon, km: $km) {
+            id
+            name
+            location { latitude longitude }
+        }
+    }
+"""
+
+
+def query_mix(rng):
+    """Returns the query and variables of the next request, the variables vary like the map of the app."""
+    choice = rng.random()
+    lat, lon = rng.uniform(47.0, 55.0), rng.uniform(6.0, 15.0)
+    if choice < 0.4:
+        return EVENTS, {}
+    if choice < 0.7:
+        return EVENTS_BY_COORDINATES, {
+            'ulLongitude': lon, 'ulLatitude': lat + 1, 'lrLongitude': lon + 1, 'lrLatitude': lat
+        }
+    return EVENTS_WITHIN_RADIUS, {'lat': lat, 'lon': lon, 'km': rng.choice((5, 25, 100))}
+
+
+class Command(BaseCommand):
+    help = 'Fires the events query mix at a running server, or at gunicorn started with each worker class to compare them.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--url', help='graphql endpoint of a running server, e.g. http://localhost:8000/graphql')
+        parser.add_argument(
+            '--compare', metavar='CLASSES', default='sync,gthread',
+            help='comma separated worker classes, each is started with gunicorn on --port when no --url is given'
+        )
+        parser.add_argument('--port', type=int, default=8765)
+        parser.add_argument('--workers', type=int, help='gunicorn workers of every class, GUNICORN_WORKERS by default')
+        parser.add_argument('--requests', type=int, default=500)
+        parser.add_argument('--concurrency', type=int, default=32, help='number of concurrent requests')
+        parser.add_argument(
+            '--anonymous', action='store_true',
+            help='send the requests without a token, anonymous discovery queries may be answered from the response cache'
+        )
+        parser.add_argument('--seed', type=int, default=0, help='seed of the query mix, equal seeds send equal requests')
+
+    def handle(self, *args, **options):
+        user = None
+        token = None
+        if not options['anonymous']:
+            user = User.objects.create(username='loadtest-' + uuid.uuid4().hex[:8])
+            token = get_token(user)
+
+        try:
+            if options['url']:
+                self.report(options['url'], self.run(options['url'], token, options))
+                return
+
+            results = []
+            for worker_class in options['compare'].split(','):
+                url = 'http://127.0.0.1:{0}/graphql'.format(options['port'])
+                with self.gunicorn(worker_class, options):
+                    results.append(self.report(worker_class, self.run(url, token, options)))
+            self.stdout.write('')
+            for name, throughput, p95 in results:
+                self.stdout.write('{0:>10}: {1:8.1f} requests/s, p95 {2:.1f} ms'.format(name, throughput, p95 * 1000))
+        finally:
+            if user is not None:
+                user.delete()
+
+    def gunicorn(self, worker_class, options):
+        command = self
+
+        class Server:
+            def __enter__(self):
+                env = dict(os.environ, GUNICORN_WORKER_CLASS=worker_class)
+                if options['workers']:
+                    env['GUNICORN_WORKERS'] = str(options['workers'])
+                # gunicorn 19 can not run with -m, prefer the script next to this interpreter
+                gunicorn = shutil.which('gunicorn', path=os.path.dirname(sys.executable)) or 'gunicorn'
+                self.process = subprocess.Popen(
+                    [gunicorn, 'H2H.wsgi', '--config', 'H2H/gunicorn_conf.py',
+                     '--bind', '127.0.0.1:{0}'.format(options['port'])],
+                    cwd=settings.BASE_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+                )
+                command.wait_until_ready(options['port'], self.process)
+                return self
+
+            def __exit__(self, *exc_info):
+                self.process.terminate()
+                self.process.wait()
+
+        return Server()
+
+    def wait_until_ready(self, port, process, timeout=30):
+        deadline = time.time() + timeout
+        while time.time() < deadline:
+            if process.poll() is not None:
+                raise CommandError('gunicorn exited with {0}'.format(process.returncode))
+            try:
+                urllib.request.urlopen('http://127.0.0.1:{0}/graphql'.format(port), timeout=1)
+                return
+            except urllib.error.HTTPError:
+                return  # answers, a GET without a query is a bad request
+            except OSError:
+                time.sleep(0.2)
+        process.terminate()
+        raise CommandError('gunicorn did not answer within {0} s'.format(timeout))
+
+    def run(self, url, token, options):
+        rng = random.Random(options['seed'])
+        requests = [query_mix(rng) for _ in range(options['requests'])]
+        headers = {'Content-Type': 'application/json'}
+        if token:
+            headers['Authorization'] = 'JWT ' + token
+
+        def send(request):
+            query, variables = request
+            body = json.dumps({'query': query, 'variables': variables}).encode('utf-8')
+            started = time.perf_counter()
+            try:
+                with urllib.request.urlopen(urllib.request.Request(url, data=body, headers=headers)) as response:
+                    result = json.loads(response.read().decode('utf-8'))
+                failed = bool(result.get('errors'))
+            except OSError:
+                failed = True
+            return time.perf_counter() - started, failed
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=options['concurrency']) as executor:
+            results = list(executor.map(send, requests))
+        return results, time.perf_counter() - started
+
+    def report(self, name, run):
+        results, elapsed = run
+        durations = sorted(duration for duration, failed in results)
+        failed = sum(1 for duration, failed in results if failed)
+        throughput = len(results) / elapsed
+        p95 = durations[min(len(durations) - 1, int(len(durations) * 0.95))]
+
+        self.stdout.write('{0}: {1} requests in {2:.3f} s, {3:.1f} requests/s, {4} failed'.format(
+            name, len(results), elapsed, throughput, failed))
+        self.stdout.write('  latency p50 {0:.1f} ms, p95 {1:.1f} ms, max {2:.1f} ms'.format(
+            durations[len(durations) // 2] * 1000, p95 * 1000, durations[-1] * 1000))
+        return name, throughput, p95
@@ -0,0 +1,130 @@
+import json
+import time
+import urllib.request
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import RequestFactory
+from django.utils import timezone
+from graphene_django.settings import graphene_settings
+from graphql_jwt.shortcuts import get_token
+
+from Event.models import Event, Job, Participation
+from Location.models import Location
+
+ACCEPT = """
+    mutation accept($id: ID!) {
+        updateParticipation(participationId: $id, state: 4) {
+            state
+        }
+    }
+"""
+
+# error of an accept that found the job full, see update_job_counters
+JOB_FULL = "The job has no free positions left"
+
+
+class Command(BaseCommand):
+    help = 'Fires parallel accept mutations at a single job and checks that it is never overbooked.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--positions', type=int, default=10, help='total positions of the job')
+        parser.add_argument('--applicants', type=int, default=100, help='number of applied participations')
+        parser.add_argument('--workers', type=int, default=16, help='number of concurrent requests')
+        parser.add_argument(
+            '--url', help='graphql endpoint of a running server, e.g. http://localhost:8000/graphql/. '
+                          'Without it the mutations are executed in this process, one database connection per worker.'
+        )
+        parser.add_argument('--keep', action='store_true', help='keep the generated users, event and job')
+
+    def handle(self, *args, **options):
+        prefix = 'loadtest-' + uuid.uuid4().hex[:8]
+        organiser = User.objects.create(username=prefix)
+        now = timezone.now()
+        location = Location.objects.create(latitude=0, longitude=0, name=prefix)
+        event = Event.objects.create(
+            name=prefix, description=prefix, start=now, end=now, creator=organiser, location=location
+        )
+        job = Job.objects.create(name=prefix, description=prefix, event=event, total_positions=options['positions'])
+        User.objects.bulk_create(User(username='{0}-{1}'.format(prefix, i)) for i in range(options['applicants']))
+        applicants = User.objects.filter(username__startswith=prefix + '-')
+        participations = [Participation.objects.create(job=job, user=applicant).id for applicant in applicants]
+
+        try:
+            if options['url']:
+                accept = self.http_accept(options['url'], get_token(organiser))
+            else:
+                accept = self.local_accept(organiser)
+
+            started = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=options['workers']) as executor:
+                results = list(executor.map(accept, participations))
+            elapsed = time.perf_counter() - started
+
+            self.report(results, elapsed, job)
+        finally:
+            if not options['keep']:
+                event.delete()  # deletes the location as well
+                User.objects.filter(username__startswith=prefix).delete()
+
+    def local_accept(self, organiser):
+        schema = graphene_settings.SCHEMA
+        factory = RequestFactory()
+
+        def accept(participation_id):
+            request = factory.post('/graphql/')
+            request.user = organiser
+            started = time.perf_counter()
+            try:
+                result = schema.execute(ACCEPT, variables={'id': participation_id}, context_value=request)
+                errors = [str(error) for error in result.errors or []]
+            finally:
+                connection.close()
+            return time.perf_counter() - started, errors
+
+        return accept
+
+    def http_accept(self, url, token):
+        def accept(participation_id):
+            body = json.dumps({'query': ACCEPT, 'variables': {'id': participation_id}}).encode('utf-8')
+            request = urllib.request.Request(url, data=body, headers={
+                'Content-Type': 'application/json',
+                'Authorization': 'JWT ' + token,
+            })
+            started = time.perf_counter()
+            with urllib.request.urlopen(request) as response:
+                result = json.loads(response.read().decode('utf-8'))
+            errors = [error.get('message') for error in result.get('errors') or []]
+            return time.perf_counter() - started, errors
+
+        return accept
+
+    def report(self, results, elapsed, job):
+        durations = sorted(duration for duration, errors in results)
+        accepted = sum(1 for duration, errors in results if not errors)
+        full = sum(1 for duration, errors in results if errors == [JOB_FULL])
+        failed = len(results) - accepted - full
+
+        job.refresh_from_db()
+        actual = Participation.objects.filter(job=job, state=4).count()
+
+        self.stdout.write('{0} requests in {1:.3f} s, {2:.1f} requests/s'.format(len(results), elapsed, len(results) / elapsed))
+        self.stdout.write('latency p50 {0:.1f} ms, p95 {1:.1f} ms, max {2:.1f} ms'.format(
+            durations[len(durations) // 2] * 1000,
+            durations[min(len(durations) - 1, int(len(durations) * 0.95))] * 1000,
+            durations[-1] * 1000,
+        ))
+        self.stdout.write('{0} accepted, {1} rejected because the job was full, {2} failed'.format(accepted, full, failed))
+        for duration, errors in results:
+            if errors and errors != [JOB_FULL]:
+                self.stdout.write('  ' + '; '.join(errors))
+                break
+        self.stdout.write('job: {0} total positions, accepted counter {1}, accepted participations {2}'.format(
+            job.total_positions, job.accepted_count, actual))
+
+        if actual > job.total_positions or job.accepted_count != actual:
+            raise CommandError('The job is overbooked or its counter is wrong')
+        self.stdout.write(self.style.SUCCESS('The job was not overbooked'))
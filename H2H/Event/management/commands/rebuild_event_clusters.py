@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from Event.models import EventCluster
+
+
+class Command(BaseCommand):
+    help = 'Recomputes the map clusters of the upcoming events. Run it regularly to drop ended events.'
+
+    def handle(self, *args, **options):
+        count = EventCluster.objects.rebuild()
+        self.stdout.write(self.style.SUCCESS('Rebuilt {0} event clusters'.format(count)))
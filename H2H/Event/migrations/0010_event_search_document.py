@@ -0,0 +1,138 @@
+# Generated by Django 2.1.2 on 2019-01-29 11:20
+
+import django.contrib.postgres.search
+from django.db import migrations
+
+# The search document of an event is the weighted text of the event, its alive jobs,
+# its location and its organisation. The triggers keep it up to date whenever one of
+# those rows changes, so a search never has to join the related tables.
+CREATE_SEARCH_DOCUMENT = """
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+CREATE OR REPLACE FUNCTION event_search_document(event "Event_event") RETURNS tsvector AS $$
+    SELECT
+        setweight(to_tsvector('german', coalesce(event.name, '')), 'A') ||
+        setweight(to_tsvector('german', coalesce(event.description, '')), 'B') ||
+        setweight(to_tsvector('german', coalesce((
+            SELECT string_agg(coalesce(job.name, '') || ' ' || coalesce(job.description, ''), ' ')
+            FROM "Event_job" job
+            WHERE job.event_id = event.id AND job.deleted_at IS NULL
+        ), '')), 'C') ||
+        setweight(to_tsvector('german', coalesce((
+            SELECT location.name FROM "Location_location" location WHERE location.id = event.location_id
+        ), '')), 'C') ||
+        setweight(to_tsvector('german', coalesce((
+            SELECT coalesce(organisation.name, '') || ' ' || coalesce(organisation.description, '')
+            FROM "Organisation_organisation" organisation WHERE organisation.id = event.organisation_id
+        ), '')), 'D')
+$$ LANGUAGE sql STABLE;
+
+CREATE OR REPLACE FUNCTION event_search_document_trigger() RETURNS trigger AS $$
+BEGIN
+    NEW.search_document := event_search_document(NEW);
+    RETURN NEW;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION event_refresh_search_document(event_ids integer[]) RETURNS void AS $$
+    UPDATE "Event_event" event SET search_document = event_search_document(event)
+    WHERE event.id = ANY(event_ids);
+$$ LANGUAGE sql;
+
+CREATE OR REPLACE FUNCTION job_search_document_trigger() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        PERFORM event_refresh_search_document(ARRAY[NEW.event_id]);
+    ELSIF TG_OP = 'UPDATE' THEN
+        PERFORM event_refresh_search_document(ARRAY[OLD.event_id, NEW.event_id]);
+    ELSE
+        PERFORM event_refresh_search_document(ARRAY[OLD.event_id]);
+    END IF;
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION location_search_document_trigger() RETURNS trigger AS $$
+BEGIN
+    PERFORM event_refresh_search_document(ARRAY(
+        SELECT id FROM "Event_event" WHERE location_id = NEW.id
+    ));
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION organisation_search_document_trigger() RETURNS trigger AS $$
+BEGIN
+    PERFORM event_refresh_search_document(ARRAY(
+        SELECT id FROM "Event_event" WHERE organisation_id = NEW.id
+    ));
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql;
+
+-- only fires for the searchable columns, so the refresh above does not trigger it again
+CREATE TRIGGER event_search_document
+    BEFORE INSERT OR UPDATE OF name, description, location_id, organisation_id ON "Event_event"
+    FOR EACH ROW EXECUTE PROCEDURE event_search_document_trigger();
+
+CREATE TRIGGER job_search_document
+    AFTER INSERT OR DELETE OR UPDATE OF name, description, event_id, deleted_at ON "Event_job"
+    FOR EACH ROW EXECUTE PROCEDURE job_search_document_trigger();
+
+CREATE TRIGGER location_search_document
+    AFTER UPDATE OF name ON "Location_location"
+    FOR EACH ROW EXECUTE PROCEDURE location_search_document_trigger();
+
+CREATE TRIGGER organisation_search_document
+    AFTER UPDATE OF name, description ON "Organisation_organisation"
+    FOR EACH ROW EXECUTE PROCEDURE organisation_search_document_trigger();
+
+UPDATE "Event_event" event SET search_document = event_search_document(event);
+
+CREATE INDEX "Event_event_search_document_gin" ON "Event_event" USING gin (search_document);
+CREATE INDEX "Event_event_name_trgm" ON "Event_event" USING gin (name gin_trgm_ops);
+"""
+
+DROP_SEARCH_DOCUMENT = """
+DROP INDEX IF EXISTS "Event_event_name_trgm";
+DROP INDEX IF EXISTS "Event_event_search_document_gin";
+DROP TRIGGER IF EXISTS organisation_search_document ON "Organisation_organisation";
+DROP TRIGGER IF EXISTS location_search_document ON "Location_location";
+DROP TRIGGER IF EXISTS job_search_document ON "Event_job";
+DROP TRIGGER IF EXISTS event_search_document ON "Event_event";
+DROP FUNCTION IF EXISTS organisation_search_document_trigger();
+DROP FUNCTION IF EXISTS location_search_document_trigger();
+DROP FUNCTION IF EXISTS job_search_document_trigger();
+DROP FUNCTION IF EXISTS event_refresh_search_document(integer[]);
+DROP FUNCTION IF EXISTS event_search_document_trigger();
+DROP FUNCTION IF EXISTS event_search_document("Event_event");
+"""
+
+
+def create_search_document(apps, schema_editor):
+    # triggers and GIN indexes only exist on postgres, other databases do not support search
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(CREATE_SEARCH_DOCUMENT, params=None)
+
+
+def drop_search_document(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(DROP_SEARCH_DOCUMENT, params=None)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Event', '0009_requiresskill'),
+        ('Location', '0002_location_geohash'),
+        ('Organisation', '0003_auto_20190124_0134'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='event',
+            name='search_document',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.RunPython(create_search_document, drop_search_document),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 2.1.2 on 2019-01-30 10:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Event', '0010_event_search_document'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EventCluster',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('precision', models.PositiveSmallIntegerField()),
+                ('geohash', models.CharField(max_length=7)),
+                ('count', models.PositiveIntegerField()),
+                ('latitude', models.FloatField()),
+                ('longitude', models.FloatField()),
+                ('sample_ids', models.CharField(blank=True, max_length=100)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='eventcluster',
+            index=models.Index(fields=['precision', 'latitude', 'longitude'], name='Event_event_precisi_bb58e9_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='eventcluster',
+            unique_together={('precision', 'geohash')},
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 2.1.2 on 2019-01-30 16:45
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def fill_counters(apps, schema_editor):
+    Job = apps.get_model('Event', 'Job')
+    Participation = apps.get_model('Event', 'Participation')
+
+    def count(state):
+        counts = Participation.objects.filter(job=OuterRef('pk'), state=state).order_by() \
+            .values('job').annotate(count=Count('pk')).values('count')
+        return Coalesce(Subquery(counts, output_field=models.IntegerField()), 0)
+
+    Job.objects.update(accepted_count=count(4), applied_count=count(2))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Event', '0011_eventcluster'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='job',
+            name='accepted_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='job',
+            name='applied_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(fill_counters, migrations.RunPython.noop),
+    ]
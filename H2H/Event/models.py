@@ -1,13 +1,22 @@
+import logging
+
 from django.contrib.auth.models import User
-from django.db import models
+from django.contrib.postgres.search import SearchVectorField
+from django.db import IntegrityError, models, transaction
 
 # Create your models here.
-from django.db.models import QuerySet
+from django.db.models import Avg, Count, F, OuterRef, Q, QuerySet, Subquery
+from django.db.models.functions import Coalesce
+from django.db.models.functions import Substr
 from django.db.models.signals import post_delete, post_save
 from django.dispatch import receiver
 from django.utils import timezone
 
-from Location.models import Location
+from H2H import response_cache
+from Location import geohash
+from Location.functions import haversine
+
+logger = logging.getLogger(__name__)
 
 
 class SoftDeletionQuerySet(QuerySet):
@@ -50,18 +59,40 @@ class SoftDeletionModel(models.Model):
 
 
 class EventQuerySet(models.QuerySet):
+    def annotate_distance(self, other):
+        """
+        Annotates every event with the `distance` in km between its location and `other`.
+        The coordinates of `other` are annotated as well, so the location can tell which point
+        the distance was computed to.
+        """
+        return self.filter(location__isnull=False).annotate(
+            distance=haversine('location__latitude', 'location__longitude', other),
+            distance_latitude=models.Value(float(other.latitude), output_field=models.FloatField()),
+            distance_longitude=models.Value(float(other.longitude), output_field=models.FloatField()),
+        )
+
     def order_by_distance(self, other):
-        all_locations = [e.location for e in self]  # not pretty but we have no geodjango to fix this
-        sorted_events = []
-        for location in all_locations:
-            try:
-                event = location.event
-            except Location.event.RelatedObjectDoesNotExist:
-                event = None
-            if event:
-                sorted_events.append((location.distance(other), event))
-        sorted_events.sort(key=lambda d: d[0])  # sort by distance
-        return [e[1] for e in sorted_events]
+        return self.annotate_distance(other).order_by('distance', 'id')
+
+    def within_radius(self, other, km):
+        """
+        Returns the events at most `km` away from `other`, nearest first.
+        The geohash prefixes and the bounding box let the database use the location indexes
+        before the exact distance is checked on the remaining rows.
+        """
+        latitude, longitude = float(other.latitude), float(other.longitude)
+        delta_latitude, delta_longitude = geohash.bounding_box(latitude, longitude, km)
+        events = self.filter(
+            location__latitude__gte=latitude - delta_latitude,
+            location__latitude__lte=latitude + delta_latitude,
+        )
+        cells = geohash.covering_cells(latitude, longitude, km)
+        if cells:
+            in_cells = models.Q()
+            for cell in cells:
+                in_cells |= models.Q(location__geohash__startswith=cell)
+            events = events.filter(in_cells)
+        return events.annotate_distance(other).filter(distance__lte=km).order_by('distance', 'id')
 
 
 class EventManager(models.Manager):
@@ -82,6 +113,9 @@ class Event(models.Model):
     creator = models.ForeignKey(User, on_delete=models.CASCADE)
     location = models.OneToOneField('Location.Location', on_delete=models.PROTECT, null=True)
 
+    # weighted text of the event, its jobs, location and organisation. maintained by database triggers
+    search_document = SearchVectorField(null=True, editable=False)
+
     objects = EventManager()
 
     def save(self, *args, **kwargs):
@@ -94,14 +128,55 @@ class Event(models.Model):
         return self.name
 
 
+class JobQuerySet(SoftDeletionQuerySet):
+    def annotate_actual_counts(self):
+        """Annotates the counts of accepted and applied participations counted from the participations."""
+        return self.annotate(
+            actual_accepted_count=Count('participation', filter=Q(participation__state=4)),
+            actual_applied_count=Count('participation', filter=Q(participation__state=2)),
+        )
+
+    def repair_counters(self):
+        """Sets the counters of the jobs to the counts of their participations with one UPDATE."""
+        def count(state):
+            counts = Participation.objects.filter(job=OuterRef('pk'), state=state).order_by() \
+                .values('job').annotate(count=Count('pk')).values('count')
+            return Coalesce(Subquery(counts, output_field=models.IntegerField()), 0)
+
+        return self.update(accepted_count=count(4), applied_count=count(2))
+
+
+class JobManager(SoftDeletionManager):
+    def get_queryset(self):
+        return JobQuerySet(self.model).filter(deleted_at=None) if self.alive_only else JobQuerySet(self.model)
+
+
 class Job(SoftDeletionModel):
+    COUNTER_FIELDS = ('accepted_count', 'applied_count')
+
     name = models.CharField(max_length=200)
     description = models.TextField(null=True)
     event = models.ForeignKey(Event, on_delete=models.CASCADE)
     total_positions = models.PositiveIntegerField(default=None, null=True, blank=True)
 
+    # number of accepted and applied participations, maintained by Participation.save
+    accepted_count = models.PositiveIntegerField(default=0, editable=False)
+    applied_count = models.PositiveIntegerField(default=0, editable=False)
+
+    objects = JobManager()
+    all_objects = JobManager(alive_only=False)
+
+    def save(self, *args, **kwargs):
+        # the counters are only changed with F() updates, writing the loaded values back would lose updates
+        if not self._state.adding and kwargs.get('update_fields') is None:
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name not in self.COUNTER_FIELDS
+            ]
+        super(Job, self).save(*args, **kwargs)
+
     def occupied_positions(self):
-        return self.participation_set.filter(state=4).count()
+        return self.accepted_count
 
     def __str__(self):
         return str(self.name) + " at the event " + str(self.event)
@@ -125,10 +200,67 @@ class Participation(models.Model):
     state = models.IntegerField(choices=PARTICIPATION_STATES, default=2)
     rating = models.ForeignKey('Feedback.Rating', on_delete=models.SET_NULL, blank=True, null=True)
 
+    # state -> counter of the job
+    JOB_COUNTERS = {4: 'accepted_count', 2: 'applied_count'}
+
+    loaded_job_id = None
+    loaded_state = None
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super(Participation, cls).from_db(db, field_names, values)
+        # remember the stored job and state, so save can tell which counters change
+        instance.loaded_job_id = instance.__dict__.get('job_id')
+        instance.loaded_state = instance.__dict__.get('state')
+        return instance
+
+    def save(self, *args, **kwargs):
+        with transaction.atomic():
+            super(Participation, self).save(*args, **kwargs)
+            update_job_counters([(self.loaded_job_id, self.loaded_state, -1), (self.job_id, self.state, 1)])
+        self.loaded_job_id = self.job_id
+        self.loaded_state = self.state
+        if Participation.job.is_cached(self) and self.job is not None:
+            self.job.refresh_from_db(fields=Job.COUNTER_FIELDS)
+
     def __str__(self):
         return str(self.user) + ' attends ' + str(self.job)
 
 
+def update_job_counters(changes, event_ids=None):
+    """
+    Applies (job id, state, +1/-1) changes of participations to the counters of the jobs,
+    with one UPDATE per job and counter. Has to run in the transaction that changed the participations.
+    `event_ids` are the events of the jobs if the caller knows them, they are looked up otherwise.
+
+    Accepting participants is a conditional UPDATE that only matches while the job has free
+    positions. The row lock of the UPDATE serializes concurrent accepts, the later one sees the
+    committed counter and matches no row, so the job can never be overbooked.
+    """
+    deltas = {}
+    for job_id, state, delta in changes:
+        counter = Participation.JOB_COUNTERS.get(state)
+        if job_id is not None and counter is not None:
+            deltas[job_id, counter] = deltas.get((job_id, counter), 0) + delta
+    for (job_id, counter), delta in sorted(deltas.items()):
+        if not delta:
+            continue
+        jobs = Job.all_objects.filter(pk=job_id)
+        if counter == 'accepted_count' and delta > 0:
+            jobs = jobs.filter(Q(total_positions=None) | Q(accepted_count__lte=F('total_positions') - delta))
+            if not jobs.update(accepted_count=F('accepted_count') + delta):
+                raise Exception("The job has no free positions left")
+        else:
+            jobs.update(**{counter: F(counter) + delta})
+
+    # queryset updates send no signals, the cached responses show the free positions
+    changed_jobs = {job_id for (job_id, counter), delta in deltas.items() if delta}
+    if changed_jobs:
+        if event_ids is None:
+            event_ids = set(Job.all_objects.filter(pk__in=changed_jobs).values_list('event_id', flat=True))
+        response_cache.invalidate('events', *('event:{0}'.format(event_id) for event_id in sorted(event_ids)))
+
+
 class RequiresSkill(models.Model):
     job = models.ForeignKey(Job, on_delete=models.CASCADE)
     skill = models.ForeignKey("User.Skill", on_delete=models.CASCADE)
@@ -137,15 +269,163 @@ class RequiresSkill(models.Model):
         return str(self.job) + " requires skill " + str(self.skill)
 
 
+class EventClusterManager(models.Manager):
+    def refresh(self, geohashes):
+        """
+        Recomputes the clusters of every precision that contain one of the given geohashes.
+        Every cell is updated in its own short transaction, so refreshes of events in the same
+        region only wait for each other while one cell is written.
+        """
+        cells = set()
+        for location_geohash in geohashes:
+            if location_geohash:
+                cells.update(location_geohash[:precision] for precision in EventCluster.PRECISIONS)
+        for cell in sorted(cells):
+            self._refresh_cell(cell)
+
+    def refresh_on_commit(self, geohashes):
+        """
+        Refreshes the clusters once the current transaction is committed, outside of it. A failed
+        refresh is logged and leaves the cells to the next refresh or `rebuild_event_clusters`.
+        """
+        geohashes = list(geohashes)
+
+        def refresh():
+            try:
+                self.refresh(geohashes)
+            except Exception:
+                logger.exception('Refreshing the event clusters of %s failed', geohashes)
+
+        transaction.on_commit(refresh)
+
+    def _refresh_cell(self, cell):
+        events = Event.objects.filter(end__gt=timezone.now(), location__geohash__startswith=cell)
+        aggregate = events.aggregate(
+            count=Count('id'), latitude=Avg('location__latitude'), longitude=Avg('location__longitude')
+        )
+        clusters = self.filter(precision=len(cell), geohash=cell)
+        if not aggregate['count']:
+            clusters.delete()
+            return
+        sample_ids = events.order_by('start', 'id').values_list('id', flat=True)[:EventCluster.SAMPLE_SIZE]
+        values = {
+            'count': aggregate['count'],
+            'latitude': float(aggregate['latitude']),
+            'longitude': float(aggregate['longitude']),
+            'sample_ids': ','.join(str(pk) for pk in sample_ids),
+        }
+        if clusters.update(**values):
+            return
+        try:
+            with transaction.atomic():
+                self.create(precision=len(cell), geohash=cell, **values)
+        except IntegrityError:
+            # a concurrent refresh created the cell first
+            clusters.update(**values)
+
+    def rebuild(self):
+        """Recomputes all clusters. Ended events only drop out of the clusters on a rebuild or a refresh."""
+        events = Event.objects.filter(end__gt=timezone.now(), location__isnull=False).exclude(location__geohash='')
+
+        # a few sample ids per cell, the earliest events first
+        samples = {}
+        for pk, location_geohash in events.order_by('start', 'id').values_list('id', 'location__geohash'):
+            for precision in EventCluster.PRECISIONS:
+                cell_samples = samples.setdefault(location_geohash[:precision], [])
+                if len(cell_samples) < EventCluster.SAMPLE_SIZE:
+                    cell_samples.append(str(pk))
+
+        clusters = []
+        for precision in EventCluster.PRECISIONS:
+            cells = events.annotate(cell=Substr('location__geohash', 1, precision)).values('cell').annotate(
+                count=Count('id'), latitude=Avg('location__latitude'), longitude=Avg('location__longitude')
+            ).order_by()
+            for cell in cells:
+                clusters.append(EventCluster(
+                    precision=precision,
+                    geohash=cell['cell'],
+                    count=cell['count'],
+                    latitude=float(cell['latitude']),
+                    longitude=float(cell['longitude']),
+                    sample_ids=','.join(samples.get(cell['cell'], [])),
+                ))
+
+        with transaction.atomic():
+            self.all().delete()
+            self.bulk_create(clusters)
+        response_cache.invalidate('events')
+        return len(clusters)
+
+
+class EventCluster(models.Model):
+    """
+    Number, centroid and a few ids of the upcoming events inside a geohash cell.
+    The clusters are kept for every precision so the map can show a zoom level with one query.
+    """
+    PRECISIONS = range(1, 8)
+    SAMPLE_SIZE = 3
+
+    precision = models.PositiveSmallIntegerField()
+    geohash = models.CharField(max_length=max(PRECISIONS))
+    count = models.PositiveIntegerField()
+    latitude = models.FloatField()
+    longitude = models.FloatField()
+    sample_ids = models.CharField(max_length=100, blank=True)
+
+    objects = EventClusterManager()
+
+    class Meta:
+        unique_together = ('precision', 'geohash')
+        indexes = [
+            models.Index(fields=['precision', 'latitude', 'longitude']),
+        ]
+
+    @property
+    def event_ids(self):
+        return [int(pk) for pk in self.sample_ids.split(',') if pk]
+
+    def __str__(self):
+        return str(self.count) + " events in " + self.geohash
+
+
 @receiver(post_delete, sender=Event)
 def delete_location_for_event(sender, instance, *args, **kwargs):
     if instance.location:
         instance.location.delete()
 
 
+@receiver([post_save, post_delete], sender=Event)
+def invalidate_event_responses(sender, instance, *args, **kwargs):
+    response_cache.invalidate('events', 'organisations', 'event:{0}'.format(instance.pk))
+
+
+@receiver([post_save, post_delete], sender=Job)
+def invalidate_job_responses(sender, instance, *args, **kwargs):
+    response_cache.invalidate('events', 'organisations', 'event:{0}'.format(instance.event_id))
+
+
+@receiver([post_save, post_delete], sender=Event)
+def refresh_event_clusters(sender, instance, *args, **kwargs):
+    if instance.location:
+        EventCluster.objects.refresh_on_commit([instance.location.geohash])
+
+
+@receiver(post_save, sender='Location.Location')
+def refresh_moved_location_clusters(sender, instance, created, *args, **kwargs):
+    # new locations have no event yet, the event refreshes the clusters when it is saved
+    if not created and instance.loaded_geohash != instance.geohash:
+        EventCluster.objects.refresh_on_commit([instance.loaded_geohash, instance.geohash])
+
+
 @receiver(post_delete, sender=Job)
 def set_participations_to_cancelled(sender, instance, *args, **kwargs):
-    for participation in instance.participation_set.all():
-        if participation.state in (2, 4):
-            participation.state = 5
-            participation.save()
+    with transaction.atomic():
+        for participation in instance.participation_set.all():
+            if participation.state in (2, 4):
+                participation.state = 5
+                participation.save()
+
+
+@receiver(post_delete, sender=Participation)
+def decrement_job_counters(sender, instance, *args, **kwargs):
+    update_job_counters([(instance.loaded_job_id, instance.loaded_state, -1)])
@@ -1,23 +1,47 @@
 import re
 
 import graphene
-from django.contrib.postgres.search import SearchVector, SearchQuery, SearchRank, TrigramSimilarity
-from django.db.models import Case, When, F
-from django.db.models.functions import Greatest
+from django.contrib.postgres.search import SearchQuery, SearchRank, TrigramSimilarity
+from django.db import transaction
+from django.db.models import F, Q
 from graphene_django import DjangoObjectType
 from graphql_jwt.decorators import login_required
 from django.utils import timezone
 
+from H2H.loaders import get_loaders
+from H2H.optimizer import optimize_queryset
+from H2H.pagination import connection_args, paginate
+from Location import geohash
 from Location.models import Location
 from Location.schema import LocationInputType
-from User.models import Skill
-from .models import Event, Job, Participation, RequiresSkill
+from User.models import Skill, add_credit_points
+from .models import Event, EventCluster, Job, Participation, RequiresSkill, update_job_counters
 from Organisation.models import Organisation
+from Organisation.permissions import is_member
 
 
 class EventType(DjangoObjectType):
     class Meta:
         model = Event
+        exclude_fields = ('search_document',)
+
+    def resolve_location(self, info, **kwargs):
+        location = self.location
+        # hand the distance computed by the database down to LocationType.distance
+        if location and getattr(self, 'distance', None) is not None:
+            location.annotated_distance = ((self.distance_latitude, self.distance_longitude), self.distance)
+        return location
+
+
+class EventClusterType(DjangoObjectType):
+    event_ids = graphene.List(graphene.ID)
+
+    class Meta:
+        model = EventCluster
+        only_fields = ('geohash', 'count', 'latitude', 'longitude')
+
+    def resolve_event_ids(self, info, **kwargs):
+        return self.event_ids
 
 
 class ParticipationType(DjangoObjectType):
@@ -38,11 +62,10 @@ class JobType(DjangoObjectType):
         model = Job
 
     def resolve_current_users_participation(self, info, **kwargs):
-        participation = Participation.objects.filter(user=info.context.user, job=self)
-        return None if not participation else participation.first()
+        return get_loaders(info).participation_by_job.load(self.id)
 
     def resolve_required_skills(self, info, **kwargs):
-        return Skill.objects.filter(requiresskill__job=self)
+        return get_loaders(info).required_skills_by_job.load(self.id)
 
 
 class RequiresSkillType(DjangoObjectType):
@@ -50,6 +73,21 @@ class RequiresSkillType(DjangoObjectType):
         model = RequiresSkill
 
 
+class EventConnection(graphene.relay.Connection):
+    class Meta:
+        node = EventType
+
+
+class JobConnection(graphene.relay.Connection):
+    class Meta:
+        node = JobType
+
+
+class ParticipationConnection(graphene.relay.Connection):
+    class Meta:
+        node = ParticipationType
+
+
 class CreateParticipation(graphene.Mutation):
     id = graphene.ID()
     job = graphene.Field(JobType)
@@ -95,66 +133,168 @@ class UpdateParticipation(graphene.Mutation):
 
     @login_required
     def mutate(self, info, state, participation_id):
+        with transaction.atomic():
+            user = info.context.user
+            # the participation stays locked until its state and the job counters are committed, the
+            # counter update refuses to accept more participants than the job has positions
+            participation = Participation.objects.select_for_update().get(id=participation_id)
+            job = participation.job
+            event_creator = job.event.creator
+
+            # if job.deleted_at:  # it is not possible to change the state of a canceled/inactive job
+            #     raise Exception("Job is canceled/inactive")
+
+            if state == 5:  # 5 = canceled
+                if user != participation.user:
+                    raise Exception("You need to be the participator")
+                participation.state = state
+                participation.save()
+                return UpdateParticipation(
+                    id=participation.id,
+                    job=job,
+                    user=user,
+                    state=participation.state,
+                    rating=participation.rating
+                )
+
+            if state == 2:  # 2 = applied
+                if user != participation.user:
+                    raise Exception("You need to be the participator")
+                if job.deleted_at:
+                    raise Exception("The job you try to apply for has been removed")
+                participation.state = state
+                participation.save()
+                return UpdateParticipation(
+                    id=participation.id,
+                    job=job,
+                    user=user,
+                    state=participation.state,
+                    rating=participation.rating
+                )
+
+            if state in (3, 4, 1):  # 3 = declined, 4 = accepted, 1 = participated
+                if user != event_creator and not is_member(info, job.event.organisation_id):
+                    raise Exception("You need to be the event creator or in its organisations members")
+                if state == 4 and job.deleted_at:
+                    raise Exception("You cannot accept a user for a removed job")
+                if state == 1:
+                    if participation.state == 1:
+                        raise Exception("This user already participated")
+                    if participation.state in (3, 5):
+                        raise Exception("This user was either declined already or cancelled the participation")
+                    add_credit_points([(participation.user_id, 5, job.event)], 2)  # 2 = participated
+
+                participation.state = state
+                participation.save()
+                return UpdateParticipation(
+                    id=participation.id,
+                    job=job,
+                    user=participation.user,
+                    state=participation.state,
+                    rating=participation.rating
+                )
+
+            raise Exception("State change not allowed")
+
+
+class ParticipationResultType(graphene.ObjectType):
+    id = graphene.ID()
+    participation = graphene.Field(ParticipationType)
+    error = graphene.String()
+
+
+class BulkUpdateParticipations(graphene.Mutation):
+    results = graphene.List(ParticipationResultType)
+
+    class Arguments:
+        ids = graphene.List(graphene.ID, required=True)
+        state = graphene.Int(required=True)
+
+    @login_required
+    def mutate(self, info, ids, state):
+        """
+        Declines (3), accepts (4) or marks as participated (1) many participations at once, with
+        the rules of updateParticipation. The permissions are checked once per event, the states
+        are written with one UPDATE and the credit points with one more. A participation that
+        breaks a rule is left unchanged and reported in the error of its result.
+        """
+        if state not in (3, 4, 1):
+            raise Exception("State change not allowed")
         user = info.context.user
-        participation = Participation.objects.get(id=participation_id)
-        job = participation.job
-        event_creator = job.event.creator
-
-        # if job.deleted_at:  # it is not possible to change the state of a canceled/inactive job
-        #     raise Exception("Job is canceled/inactive")
-
-        if state == 5:  # 5 = canceled
-            if user != participation.user:
-                raise Exception("You need to be the participator")
-            participation.state = state
-            participation.save()
-            return UpdateParticipation(
-                id=participation.id,
-                job=job,
-                user=user,
-                state=participation.state,
-                rating=participation.rating
-            )
+        ids = list(dict.fromkeys(str(participation_id) for participation_id in ids))
+
+        with transaction.atomic():
+            participations = {
+                str(participation.id): participation
+                for participation in Participation.objects.select_for_update(of=('self',))
+                .select_related('job__event').filter(id__in=[i for i in ids if i.isdigit()])
+            }
+            organisations = set(Organisation.objects.filter(members=user).values_list('id', flat=True))
+            permitted = {}
+            errors = {}
+            for participation_id in ids:
+                participation = participations.get(participation_id)
+                if participation is None:
+                    errors[participation_id] = "Participation does not exist"
+                    continue
+                job = participation.job
+                if job is None:
+                    errors[participation_id] = "The job of the participation has been removed"
+                    continue
+                event = job.event
+                if event.id not in permitted:
+                    permitted[event.id] = user.id == event.creator_id or event.organisation_id in organisations
+                if not permitted[event.id]:
+                    errors[participation_id] = "You need to be the event creator or in its organisations members"
+                elif state == 4 and job.deleted_at:
+                    errors[participation_id] = "You cannot accept a user for a removed job"
+                elif state == 1 and participation.state == 1:
+                    errors[participation_id] = "This user already participated"
+                elif state == 1 and participation.state in (3, 5):
+                    errors[participation_id] = "This user was either declined already or cancelled the participation"
+
+            changed = [
+                participation for participation_id, participation in participations.items()
+                if participation_id not in errors and participation.state != state
+            ]
+
+            event_ids = {participation.job.event_id for participation in changed}
+            if state == 4:
+                # all accepts of a job have to fit into its free positions
+                accepting = {}
+                for participation in changed:
+                    accepting.setdefault(participation.job_id, []).append(participation)
+                for job_id, job_participations in accepting.items():
+                    try:
+                        with transaction.atomic():
+                            update_job_counters([(job_id, 4, len(job_participations))], event_ids)
+                    except Exception as e:
+                        for participation in job_participations:
+                            errors[str(participation.id)] = str(e)
+                changed = [participation for participation in changed if str(participation.id) not in errors]
+                update_job_counters([(p.job_id, p.state, -1) for p in changed], event_ids)
+            else:
+                update_job_counters(
+                    [(p.job_id, p.state, -1) for p in changed] + [(p.job_id, state, 1) for p in changed], event_ids
+                )
 
-        if state == 2:  # 2 = applied
-            if user != participation.user:
-                raise Exception("You need to be the participator")
-            if job.deleted_at:
-                raise Exception("The job you try to apply for has been removed")
-            participation.state = state
-            participation.save()
-            return UpdateParticipation(
-                id=participation.id,
-                job=job,
-                user=user,
-                state=participation.state,
-                rating=participation.rating
-            )
+            Participation.objects.filter(id__in=[participation.id for participation in changed]).update(state=state)
 
-        if state in (3, 4, 1):  # 3 = declined, 4 = accepted, 1 = participated
-            if user != event_creator and user not in job.event.organisation.members.all():
-                raise Exception("You need to be the event creator or in its organisations members")
-            if state == 4 and job.deleted_at:
-                raise Exception("You cannot accept a user for a removed job")
             if state == 1:
-                if participation.state == 1:
-                    raise Exception("This user already participated")
-                if participation.state in (3, 5):
-                    raise Exception("This user was either declined already or cancelled the participation")
-                participation.user.profile.credit_points += 5
-                participation.user.profile.save()
-
-            participation.state = state
-            participation.save()
-            return UpdateParticipation(
-                id=participation.id,
-                job=job,
-                user=participation.user,
-                state=participation.state,
-                rating=participation.rating
-            )
+                # 2 = participated
+                add_credit_points([(participation.user_id, 5, participation.job.event) for participation in changed], 2)
 
-        raise Exception("State change not allowed")
+            for participation in changed:
+                participation.state = state
+
+        return BulkUpdateParticipations(results=[
+            ParticipationResultType(
+                id=participation_id,
+                participation=None if participation_id in errors else participations[participation_id],
+                error=errors.get(participation_id)
+            )
+            for participation_id in ids
+        ])
 
 
 class CreateJob(graphene.Mutation):
@@ -238,8 +378,9 @@ class UpdateJob(graphene.Mutation):
         if description:
             job.description = description
         if total_positions:
-            occupied_positions = job.occupied_positions()
-            if total_positions < occupied_positions:
+            # conditional update, a participant accepted at the same time can not overbook the job
+            if not Job.all_objects.filter(pk=job.pk, accepted_count__lte=total_positions).update(total_positions=total_positions):
+                occupied_positions = Job.all_objects.get(pk=job.pk).occupied_positions()
                 raise Exception(f"Total positions cannot be less than occupied positions({occupied_positions})")
             job.total_positions = total_positions
 
@@ -351,21 +492,22 @@ class CreateEvent(graphene.Mutation):
         organisation = None
         if organisation_id:
             organisation = Organisation.objects.get(id=organisation_id)
-            if user not in organisation.members.all():
+            if not is_member(info, organisation):
                 raise Exception(f"You need to be a member of {organisation.name} to create an event")
-        else:
-            user.profile.credit_points -= 10
-            user.profile.save()
 
-        event = Event.objects.create(
-            name=name,
-            description=description,
-            creator=user,
-            location=location,
-            organisation=organisation,
-            start=start,
-            end=end
-        )
+        with transaction.atomic():
+            event = Event.objects.create(
+                name=name,
+                description=description,
+                creator=user,
+                location=location,
+                organisation=organisation,
+                start=start,
+                end=end
+            )
+            if organisation is None:  # private events cost 10 credit points
+                add_credit_points([(user.id, -10, event)], 3)  # 3 = event created
+                user.profile.refresh_from_db(fields=['credit_points'])
 
         jobs = kwargs.get("jobs", None)
         if jobs:
@@ -426,7 +568,7 @@ class UpdateEvent(graphene.Mutation):
         if not organisation and user != event.creator:
             raise Exception("You need to be the event creator to update the event")
 
-        if organisation and user not in organisation.members.all():
+        if organisation and not is_member(info, organisation):
             raise Exception(f"You need to be a member of {organisation.name} to update the event")
 
         if kwargs.get('name', None):
@@ -505,7 +647,7 @@ class DeleteEvent(graphene.Mutation):
 
         if user != event.creator:
             if organisation:
-                if user not in organisation.members.all():
+                if not is_member(info, organisation):
                     raise Exception(f"You need to be a member of {organisation.name} to delete the event")
             raise Exception("You need to be the event creator to delete the event")
 
@@ -514,6 +656,10 @@ class DeleteEvent(graphene.Mutation):
         return DeleteEvent(id=event_id)
 
 
+# the fields events can be sorted by, the keyset cursors of eventsConnection need keys that are never NULL
+SORTABLE_EVENT_FIELDS = ('id', 'name', 'start', 'end')
+
+
 class SortInputType(graphene.InputObjectType):
     field = graphene.String()
     desc = graphene.Boolean()
@@ -525,12 +671,114 @@ class TimeDeltaInputType(graphene.InputObjectType):
     end = graphene.DateTime()
 
 
+class BoundingBoxInputType(graphene.InputObjectType):
+    ul_longitude = graphene.Float(required=True)
+    ul_latitude = graphene.Float(required=True)
+    lr_longitude = graphene.Float(required=True)
+    lr_latitude = graphene.Float(required=True)
+
+
 class FilterInputType(graphene.InputObjectType):
     show_private = graphene.Boolean()
     required_skills = graphene.List(graphene.String)
     time = TimeDeltaInputType()
 
 
+def find_events(**kwargs):
+    """
+    Searches, filters and sorts the upcoming events.
+    Returns the events and the field or annotation they are ordered by.
+    """
+    events = Event.objects.filter(end__gt=timezone.now())
+    order_by = 'id'
+
+    # Search Events
+    search = kwargs.get("search", None)
+    if search:
+        query = SearchQuery(search, config='german')  # use german stop words
+
+        # the stored search document and the trigram index on the name narrow the events down,
+        # only the matches are ranked. the score stays an annotation so the queryset stays lazy
+        events = events.filter(
+            Q(search_document=query) | Q(name__trigram_similar=search)
+        ).annotate(
+            rank=SearchRank(F('search_document'), query),
+            similarity=TrigramSimilarity('name', search),
+            score=(F("rank") + F("similarity")) / 2.  # open for debate.
+        ).filter(score__gt=0.1)
+        order_by = '-score'
+
+    # Filter Events
+    filtering = kwargs.get("filtering", None)
+    if filtering:
+        # has organisation
+        show_private = filtering.get("show_private", True)
+        if not show_private:
+            events = events.exclude(organisation__isnull=True)
+        required_skills = filtering.get("required_skills", None)
+        if required_skills:
+            events = events.filter(job__requiresskill__skill__name__in=required_skills).distinct()
+        # time is between start and/or end
+        timedelta = filtering.get("time", None)
+        if timedelta:
+            start = timedelta.get("start", None)
+            end = timedelta.get("end", None)
+            if start:
+                events = events.filter(start__gte=start)
+            if end:
+                events = events.filter(end__lte=end)
+
+    # Sort Events
+    sorting = kwargs.get("sorting", None)
+    if sorting:
+        field = sorting.get("field", None)
+        distance = sorting.get("distance", None)
+        if field and distance:
+            raise Exception("Cannot sort by field and distance at the same time!")
+        # sort by field name
+        if field:
+            if field not in SORTABLE_EVENT_FIELDS:
+                raise Exception(f"Cannot sort events by {field}, sort by one of {', '.join(SORTABLE_EVENT_FIELDS)}")
+            desc = sorting.get("desc", False)
+            minus = "-" if desc else ""
+            order_by = minus + field
+        # sort by distance to self
+        if distance:
+            events = events.annotate_distance(distance)
+            order_by = 'distance'
+
+    # the id breaks ties, so equal keys come back in the same order on every database
+    events = events.order_by(order_by, 'id')
+    return events, order_by
+
+
+def cluster_precision(zoom):
+    """
+    Returns the geohash precision of the clusters for a map zoom level: the coarsest precision
+    whose cells are at most a quarter of a map tile wide.
+    """
+    tile_width = 360.0 / 2 ** max(zoom, 0)
+    for precision in EventCluster.PRECISIONS:
+        if geohash.cell_size(precision)[1] <= tile_width / 4:
+            return precision
+    return max(EventCluster.PRECISIONS)
+
+
+def events_in_area(ul_longitude, ul_latitude, lr_longitude, lr_latitude):
+    """
+    Returns all events that are inside the span of the rectangle area made up of two coordinates.
+    ul = upper left
+    lr = lower right
+    """
+    return Event.objects.filter(
+        end__gt=timezone.now(),
+        location__latitude__gte=ul_latitude,
+        location__longitude__gte=ul_longitude,
+        location__latitude__lte=lr_latitude,
+        location__longitude__lte=lr_longitude,
+    )
+
+
 class Query(graphene.ObjectType):
     event = graphene.Field(EventType, id=graphene.ID())
     events = graphene.List(
@@ -546,109 +794,75 @@ class Query(graphene.ObjectType):
         lr_longitude=graphene.Float(),
         lr_latitude=graphene.Float()
     )
+    event_clusters = graphene.List(
+        EventClusterType,
+        bbox=BoundingBoxInputType(required=True),
+        zoom=graphene.Int(required=True),
+    )
+    events_within_radius = graphene.List(
+        EventType,
+        lat=graphene.Float(required=True),
+        lon=graphene.Float(required=True),
+        km=graphene.Float(required=True)
+    )
     jobs = graphene.List(JobType)
     job = graphene.Field(JobType, id=graphene.ID())
     participations = graphene.List(ParticipationType)
 
+    # paginated versions of the lists above
+    events_connection = graphene.Field(
+        EventConnection,
+        **connection_args(
+            search=graphene.String(),
+            sorting=SortInputType(),
+            filtering=FilterInputType()
+        )
+    )
+    events_by_coordinates_connection = graphene.Field(
+        EventConnection,
+        **connection_args(
+            ul_longitude=graphene.Float(),
+            ul_latitude=graphene.Float(),
+            lr_longitude=graphene.Float(),
+            lr_latitude=graphene.Float()
+        )
+    )
+    jobs_connection = graphene.Field(JobConnection, **connection_args())
+    participations_connection = graphene.Field(ParticipationConnection, **connection_args())
+
     def resolve_event(self, info, id):
         return Event.objects.get(id=id)
 
     def resolve_events(self, info, **kwargs):
-        events = Event.objects.filter(end__gt=timezone.now())
-
-        # Search Events
-        search = kwargs.get("search", None)
-        if search:
-            # fields to consider with weighing and stop words
-            # weights are debatable
-            vector = SearchVector('name', weight='A', config='german') + \
-                SearchVector('description', weight='B', config='german') + \
-                SearchVector('job__name', weigth='C', config='german') + \
-                SearchVector('job__description', weight='C', config='german') + \
-                SearchVector('location__name', weight='C', config='german') + \
-                SearchVector('organisation__name', weight='D', config='german') + \
-                SearchVector('organisation__description', weight='D', config='german')
-
-            query = SearchQuery(search, config='german')  # use german stop words
-
-            # get the relevant event ids first. uses trigram similarity and search rank
-            event_ids = events.annotate(
-                rank=SearchRank(vector, query),
-                similarity=Greatest(
-                    TrigramSimilarity('name', search),
-                    TrigramSimilarity('description', search),
-                    TrigramSimilarity('job__name', search),
-                    TrigramSimilarity('job__description', search),
-                    TrigramSimilarity('location__name', search),
-                    TrigramSimilarity('organisation__name', search),
-                    TrigramSimilarity('organisation__description', search)),
-                score=(F("rank") + F("similarity")) / 2.  # open for debate.
-            ).order_by('-score').filter(score__gt=0.1).values_list("id", flat=True)
-
-            if event_ids:
-                # keep the ordering of the relevant ids
-                preserved = Case(*[When(pk=pk, then=pos) for pos, pk in enumerate(event_ids)])
-                # filter by relevant ids
-                events = Event.objects.all().filter(id__in=event_ids).order_by(preserved)
-            else:
-                # nothing relevant found. return none
-                return Event.objects.none()
-
-        # Filter Events
-        filtering = kwargs.get("filtering", None)
-        if filtering:
-            # has organisation
-            show_private = filtering.get("show_private", True)
-            if not show_private:
-                events = events.exclude(organisation__isnull=True)
-            required_skills = filtering.get("required_skills", None)
-            if required_skills:
-                events = events.filter(job__requiresskill__skill__name__in=required_skills).distinct()
-            # time is between start and/or end
-            timedelta = filtering.get("time", None)
-            if timedelta:
-                start = timedelta.get("start", None)
-                end = timedelta.get("end", None)
-                if start:
-                    events = events.filter(start__gte=start)
-                if end:
-                    events = events.filter(end__lte=end)
-
-        # Sort Events
-        sorting = kwargs.get("sorting", None)
-        if sorting:
-            field = sorting.get("field", None)
-            distance = sorting.get("distance", None)
-            if field and distance:
-                raise Exception("Cannot sort by field and distance at the same time!")
-            # sort by field name
-            if field:
-                desc = sorting.get("desc", False)
-                minus = "-" if desc else ""
-                events = events.order_by(minus + field)
-            # sort by distance to self
-            if distance:
-                # events is a list, not a QuerySet
-                events = events.order_by_distance(distance)
-
-        return events
-
-    def resolve_events_by_coordinates(self, info, ul_longitude, ul_latitude, lr_longitude, lr_latitude):
+        events, order_by = find_events(**kwargs)
+        return optimize_queryset(events, info)
+
+    def resolve_events_by_coordinates(self, info, **kwargs):
+        return optimize_queryset(events_in_area(**kwargs), info)
+
+    def resolve_event_clusters(self, info, bbox, zoom):
         """
-        Returns all events that are inside the span of the rectangle area made up of two coordinates.
-        ul = upper left
-        lr = lower right
+        Returns the precomputed clusters of upcoming events for the zoom level whose centroid is inside bbox.
+        The number of clusters depends on the size of the map, not on the number of events.
         """
-        return Event.objects.filter(
-            end__gt=timezone.now(),
-            location__latitude__gte=ul_latitude,
-            location__longitude__gte=ul_longitude,
-            location__latitude__lte=lr_latitude,
-            location__longitude__lte=lr_longitude,
+        return EventCluster.objects.filter(
+            precision=cluster_precision(zoom),
+            latitude__gte=bbox.ul_latitude,
+            longitude__gte=bbox.ul_longitude,
+            latitude__lte=bbox.lr_latitude,
+            longitude__lte=bbox.lr_longitude,
         )
 
+    def resolve_events_within_radius(self, info, lat, lon, km):
+        """
+        Returns all events whose location is at most km kilometers away from the given coordinates,
+        ordered by distance.
+        """
+        events = Event.objects.filter(end__gt=timezone.now()).within_radius(Location(latitude=lat, longitude=lon), km)
+        return optimize_queryset(events, info)
+
     def resolve_jobs(self, info):
-        return Job.objects.filter(participation__user=info.context.user)
+        return optimize_queryset(Job.objects.filter(participation__user=info.context.user), info)
         # return [p.job for p in Participation.objects.filter(user=info.context.user)]
 
     def resolve_job(self, info, id):
@@ -656,12 +870,32 @@ class Query(graphene.ObjectType):
         return Job.all_objects.filter(participation__user=info.context.user).get(id=id)
 
     def resolve_participations(self, info):
-        return Participation.objects.filter(user=info.context.user)
+        return optimize_queryset(Participation.objects.filter(user=info.context.user), info)
+
+    def resolve_events_connection(self, info, first=None, after=None, **kwargs):
+        events, order_by = find_events(**kwargs)
+        events = optimize_queryset(events, info, path=('edges', 'node'))
+        return paginate(EventConnection, events, order_by, first, after)
+
+    def resolve_events_by_coordinates_connection(self, info, first=None, after=None, **kwargs):
+        events = optimize_queryset(events_in_area(**kwargs), info, path=('edges', 'node'))
+        return paginate(EventConnection, events, 'id', first, after)
+
+    def resolve_jobs_connection(self, info, first=None, after=None):
+        jobs = Job.objects.filter(participation__user=info.context.user)
+        jobs = optimize_queryset(jobs, info, path=('edges', 'node'))
+        return paginate(JobConnection, jobs, 'id', first, after)
+
+    def resolve_participations_connection(self, info, first=None, after=None):
+        participations = Participation.objects.filter(user=info.context.user)
+        participations = optimize_queryset(participations, info, path=('edges', 'node'))
+        return paginate(ParticipationConnection, participations, 'id', first, after)
 
 
 class Mutation(graphene.AbstractType):
     create_participation = CreateParticipation.Field()
     update_participation = UpdateParticipation.Field()
+    bulk_update_participations = BulkUpdateParticipations.Field()
 
     create_job = CreateJob.Field()
     update_job = UpdateJob.Field()
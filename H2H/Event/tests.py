@@ -1,15 +1,35 @@
-from django.contrib.auth import get_user_model
-
-from graphql_jwt.testcases import JSONWebTokenTestCase
-from unittest import skip
+import json
+import os
+import runpy
+import shutil
+import tempfile
 
-from Event.models import Event, Job, Participation
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.core.cache import cache
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db import connection, connections
+from django.db.backends.sqlite3 import base as sqlite_base
+from django.test import Client, SimpleTestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from graphql_jwt.shortcuts import get_token
+
+from unittest import mock, skip, skipUnless
+
+from H2H import db_router, metrics
+from H2H.db_backend.base import HealthCheckMixin
+from H2H.documents import document_backend, document_hash
+from H2H.testcases import GraphQLTestCase
+
+from Event.models import Event, EventCluster, Job, Participation, update_job_counters
 from Location.models import Location
 from Organisation.models import Organisation
 from User.models import Profile
 
 
-class TestEvent(JSONWebTokenTestCase):
+class TestEvent(GraphQLTestCase):
     
     @classmethod
     def setUpTestData(cls):
@@ -180,6 +200,8 @@ class TestEvent(JSONWebTokenTestCase):
 
     def test_create_event_credits(self):
         """ Test for non-organisation event creation and subtraction of user credits """
+        self.user_0.is_staff = True  # only staff can set credit points
+        self.user_0.save()
         resp_0 = self.client.execute(
             """
             query {
@@ -703,3 +725,539 @@ class TestEvent(JSONWebTokenTestCase):
         self.assertIsNone(resp_3.data["updateParticipation"])   # need to be event creator
         self.assertIsNone(resp_4.data["updateParticipation"])   # need to be event creator
         self.assertIsNone(resp_5.data["updateParticipation"])   # need to be participator
+
+    def test_query_events_sorted_by_distance(self):
+        resp_0 = self.client.execute(
+            """
+            query {
+              events(sorting: {distance: {latitude: 15, longitude: 15}}) {
+                  id
+                  location {
+                    distance(to: {latitude: 15, longitude: 15})
+                  }
+                }
+            }
+            """
+        )
+
+        self.assertEqual([e["id"] for e in resp_0.data["events"]], [str(self.event_1.id), str(self.event_0.id)])
+        self.assertAlmostEqual(resp_0.data["events"][0]["location"]["distance"], 0)
+        # the database haversine has to agree with geopy up to half a percent
+        self.assertAlmostEqual(resp_0.data["events"][1]["location"]["distance"] /
+                               self.location_0.distance(self.location_1), 1, places=2)
+
+    def test_query_events_within_radius(self):
+        resp_0 = self.client.execute(
+            """
+            query {
+              eventsWithinRadius(lat: 10, lon: 10, km: 100) {
+                  id
+                }
+            }
+            """
+        )
+
+        resp_1 = self.client.execute(
+            """
+            query {
+              eventsWithinRadius(lat: 10, lon: 10, km: 1000) {
+                  id
+                }
+            }
+            """
+        )
+
+        self.assertEqual([e["id"] for e in resp_0.data["eventsWithinRadius"]], [str(self.event_0.id)])
+        self.assertEqual([e["id"] for e in resp_1.data["eventsWithinRadius"]], [str(self.event_0.id), str(self.event_1.id)])
+        self.assertEqual(self.location_0.geohash, "s1z0gs3y0zh7")
+
+    def test_query_job_fields_are_batched(self):
+        query = """
+            query {
+              events {
+                  jobSet {
+                    requiredSkills
+                    currentUsersParticipation {
+                      id
+                    }
+                  }
+                }
+            }
+            """
+
+        # authentication + events + jobSet of all events + one batch per job field
+        with self.assertNumQueries(5):
+            resp_0 = self.client.execute(query)
+
+        participations = [j["currentUsersParticipation"] for e in resp_0.data["events"] for j in e["jobSet"]]
+        self.assertEqual(participations.count(None), 3)
+        self.assertIn({"id": str(self.participation_0.id)}, participations)
+
+    def test_query_events_related_objects_are_planned(self):
+        query = """
+            query {
+              events {
+                  ...EventFields
+                  organisation {
+                    name
+                    members {
+                      username
+                    }
+                  }
+                  jobSet {
+                    name
+                  }
+                }
+            }
+
+            fragment EventFields on EventType {
+                name
+                creator {
+                  username
+                }
+                location {
+                  name
+                }
+                image {
+                  url
+                }
+            }
+            """
+
+        # authentication + events with location, organisation, creator and image + jobs + members
+        with self.assertNumQueries(4):
+            resp_0 = self.client.execute(query)
+
+        self.assertIsNone(resp_0.errors)
+        self.assertEqual(resp_0.data["events"][0]["location"]["name"], "test_location_0")
+        self.assertEqual(resp_0.data["events"][0]["organisation"]["members"], [{"username": "test_user"}])
+        self.assertEqual(resp_0.data["events"][0]["creator"]["username"], "test_user")
+        self.assertEqual(len(resp_0.data["events"][0]["jobSet"]), 3)
+        self.assertIsNone(resp_0.data["events"][0]["image"])
+
+    def test_query_nested_users_stay_within_budget(self):
+        query = """
+            query {
+              events {
+                  creator {
+                    skills {
+                      name
+                      approved
+                    }
+                    eventSet {
+                      name
+                    }
+                  }
+                  organisation {
+                    members {
+                      username
+                      skills {
+                        name
+                      }
+                    }
+                  }
+                }
+            }
+            """
+        self.client.authenticate(self.user_0)
+
+        with self.assertMaxQueries(6):
+            resp_0 = self.client.execute(query)
+
+        self.assertIsNone(resp_0.errors)
+        self.assertEqual(resp_0.data["events"][0]["creator"]["eventSet"], [])
+
+    @override_settings(GRAPHQL_TRACING=True)
+    def test_query_events_tracing(self):
+        query = """
+            query {
+              events {
+                  name
+                  jobSet {
+                    name
+                  }
+                }
+            }
+            """
+        client = Client()
+
+        resp_0 = client.post('/graphql', json.dumps({"query": query}), content_type='application/json')
+        resp_1 = client.post('/graphql', json.dumps({"query": query}), content_type='application/json',
+                             HTTP_X_GRAPHQL_TRACING='1')
+
+        self.assertNotIn("extensions", resp_0.json())
+        resolvers = resp_1.json()["extensions"]["tracing"]["execution"]["resolvers"]
+        self.assertIn(["events"], [r["path"] for r in resolvers])
+        self.assertIn(["events", 0, "jobSet", 0, "name"], [r["path"] for r in resolvers])
+
+        metrics = client.get('/metrics').content.decode()
+        self.assertIn('graphql_resolver_duration_seconds_count{field="Query.events"}', metrics)
+        self.assertIn('graphql_resolver_duration_seconds_bucket{field="EventType.jobSet",le="+Inf"}', metrics)
+        self.assertEqual(client.get('/metrics', HTTP_X_FORWARDED_FOR='1.2.3.4').status_code, 404)
+
+    def test_query_events_persisted(self):
+        query = "query { events { name } }"
+        extensions = {"persistedQuery": {"version": 1, "sha256Hash": document_hash(query)}}
+        client = Client()
+        cache.clear()
+        document_backend.clear()
+
+        resp_0 = client.post('/graphql', json.dumps({"extensions": extensions}), content_type='application/json')
+        resp_1 = client.post('/graphql', json.dumps({"query": query, "extensions": extensions}),
+                             content_type='application/json')
+        resp_2 = client.get('/graphql', {"extensions": json.dumps(extensions)})
+
+        self.assertEqual(resp_0.json()["errors"][0]["message"], "PersistedQueryNotFound")
+        self.assertIn({"name": "test_event_0"}, resp_1.json()["data"]["events"])
+        self.assertEqual(resp_2.json()["data"], resp_1.json()["data"])
+        # the document is parsed and validated only once
+        self.assertEqual(document_backend.misses, 1)
+
+    def test_query_events_response_cache(self):
+        events_query = json.dumps({"query": "query { events { name } }"})
+        event_query = json.dumps({"query": "query ($id: ID) { event(id: $id) { name } }",
+                                  "variables": {"id": self.event_1.id}})
+        client = Client()
+        cache.clear()
+
+        client.post('/graphql', events_query, content_type='application/json')
+        client.post('/graphql', event_query, content_type='application/json')
+        with self.assertNumQueries(0):
+            resp_0 = client.post('/graphql', events_query, content_type='application/json')
+
+        self.event_0.name = "renamed_event_0"
+        self.event_0.save()
+        resp_1 = client.post('/graphql', events_query, content_type='application/json')
+        with self.assertNumQueries(0):
+            resp_2 = client.post('/graphql', event_query, content_type='application/json')
+
+        self.assertIn({"name": "test_event_0"}, resp_0.json()["data"]["events"])
+        self.assertIn({"name": "renamed_event_0"}, resp_1.json()["data"]["events"])
+        self.assertNotIn({"name": "test_event_0"}, resp_1.json()["data"]["events"])
+        self.assertEqual(resp_2.json()["data"]["event"]["name"], "test_event_1")
+
+        # the job counters change with queryset updates, which send no signal
+        client.post('/graphql', event_query, content_type='application/json')
+        update_job_counters([(self.job_1.id, 2, 1)])
+        with self.assertNumQueries(1):
+            client.post('/graphql', event_query, content_type='application/json')
+
+    def test_query_event_clusters(self):
+        query = """
+            query ($zoom: Int!) {
+              eventClusters(bbox: {ulLongitude: 0, ulLatitude: 0, lrLongitude: 20, lrLatitude: 20}, zoom: $zoom) {
+                  geohash
+                  count
+                  latitude
+                  eventIds
+                }
+            }
+            """
+        EventCluster.objects.rebuild()
+
+        resp_0 = self.client.execute(query, {"zoom": 0})
+        resp_1 = self.client.execute(query, {"zoom": 5})
+        location = Location.objects.get(id=self.location_1.id)
+        location.latitude = 10
+        location.longitude = 10
+        location.save()
+        resp_2 = self.client.execute(query, {"zoom": 5})
+        # the clusters are refreshed once the save is committed, which TestCase never does
+        for savepoint_ids, callback in connection.run_on_commit:
+            callback()
+        resp_3 = self.client.execute(query, {"zoom": 5})
+
+        self.assertEqual(resp_0.data["eventClusters"], [{
+            "geohash": "s", "count": 2, "latitude": 12.5, "eventIds": [str(self.event_0.id), str(self.event_1.id)]
+        }])
+        self.assertEqual(sorted(c["count"] for c in resp_1.data["eventClusters"]), [1, 1])
+        self.assertEqual(sorted(c["count"] for c in resp_2.data["eventClusters"]), [1, 1])
+        self.assertEqual([c["count"] for c in resp_3.data["eventClusters"]], [2])
+
+    def test_update_participation_full_job(self):
+        """ participation_job_1 has one position, the second accept must be rejected """
+        applicant_0 = Participation.objects.create(job=self.participation_job_1, user=self.user_0)
+        applicant_1 = Participation.objects.create(job=self.participation_job_1, user=self.user_1)
+        query = """
+            mutation {
+                updateParticipation(participationId: %s, state: 4) {
+                    state
+                }
+            }
+            """
+
+        resp_0 = self.client.execute(query % applicant_0.id)
+        resp_1 = self.client.execute(query % applicant_1.id)
+
+        self.assertEqual(resp_0.data["updateParticipation"]["state"], 4)
+        self.assertIsNone(resp_1.data["updateParticipation"])
+        self.assertEqual(resp_1.errors[0].message, "The job has no free positions left")
+        self.assertEqual(Participation.objects.get(id=applicant_1.id).state, 2)
+        job = Job.objects.get(id=self.participation_job_1.id)
+        self.assertEqual((job.accepted_count, job.applied_count), (1, 1))
+
+    def test_bulk_update_participations(self):
+        applicants = [
+            Participation.objects.create(
+                job=self.participation_job_0, user=get_user_model().objects.create(username='applicant_%d' % i)
+            )
+            for i in range(2)
+        ]
+        foreign = Participation.objects.create(job=self.job_1, user=self.user_0)
+        query = """
+            mutation {
+                bulkUpdateParticipations(ids: [%s], state: %d) {
+                    results {
+                        id
+                        error
+                        participation {
+                            state
+                        }
+                    }
+                }
+            }
+            """
+        ids = ", ".join(str(i) for i in [applicants[0].id, applicants[1].id, foreign.id, 999])
+
+        # constant in the number of participations, the savepoints included
+        with self.assertMaxQueries(10):
+            resp_0 = self.client.execute(query % (ids, 4))
+        resp_1 = self.client.execute(query % ("%d, %d" % (applicants[0].id, applicants[1].id), 1))
+
+        results = resp_0.data["bulkUpdateParticipations"]["results"]
+        self.assertEqual([r["participation"] and r["participation"]["state"] for r in results], [4, 4, None, None])
+        self.assertEqual(results[2]["error"], "You need to be the event creator or in its organisations members")
+        self.assertEqual(results[3]["error"], "Participation does not exist")
+        self.assertEqual(Participation.objects.get(id=foreign.id).state, 2)
+
+        self.assertEqual([r["participation"]["state"] for r in resp_1.data["bulkUpdateParticipations"]["results"]], [1, 1])
+        self.assertEqual(get_user_model().objects.get(username='applicant_0').profile.credit_points, 5)
+        job = Job.objects.get(id=self.participation_job_0.id)
+        self.assertEqual((job.accepted_count, job.applied_count), (2, 0))
+
+    def test_bulk_update_participations_full_job(self):
+        """ participation_job_1 has one position, two accepts at once are both rejected """
+        applicants = [
+            Participation.objects.create(job=self.participation_job_1, user=user).id for user in (self.user_0, self.user_1)
+        ]
+
+        resp_0 = self.client.execute(
+            """
+            mutation {
+                bulkUpdateParticipations(ids: [%d, %d], state: 4) {
+                    results {
+                        error
+                    }
+                }
+            }
+            """ % tuple(applicants)
+        )
+
+        self.assertEqual([r["error"] for r in resp_0.data["bulkUpdateParticipations"]["results"]],
+                         ["The job has no free positions left"] * 2)
+        self.assertEqual(Job.objects.get(id=self.participation_job_1.id).accepted_count, 0)
+
+    def test_job_counters(self):
+        query = """
+            query {
+              event(id: %s) {
+                  jobSet {
+                    name
+                    acceptedCount
+                    appliedCount
+                  }
+                }
+            }
+            """ % self.event_0.id
+
+        participation = Participation.objects.get(id=self.participation_0.id)
+        participation.state = 5
+        participation.save()
+        Participation.objects.create(job=self.participation_job_0, user=get_user_model().objects.create(username='u'))
+
+        # the user, the event and its jobs, the counters need no query of the participations
+        with self.assertNumQueries(3):
+            resp_0 = self.client.execute(query)
+
+        job = {j["name"]: j for j in resp_0.data["event"]["jobSet"]}["participation_job_0"]
+        self.assertEqual((job["acceptedCount"], job["appliedCount"]), (1, 1))
+
+        Participation.objects.filter(id=self.participation_1.id).delete()
+        self.assertEqual(Job.objects.get(id=self.participation_job_0.id).accepted_count, 0)
+
+    def test_check_job_counters_command(self):
+        Job.objects.filter(id=self.participation_job_0.id).update(accepted_count=7, applied_count=3)
+
+        call_command('check_job_counters', '--repair', stdout=open(os.devnull, 'w'))
+
+        job = Job.objects.get(id=self.participation_job_0.id)
+        self.assertEqual((job.accepted_count, job.applied_count), (2, 0))
+
+    def test_query_events_connection(self):
+        query = """
+            query ($after: String) {
+              eventsConnection(first: 1, after: $after, sorting: {distance: {latitude: 15, longitude: 15}}) {
+                  edges {
+                    cursor
+                    node {
+                      id
+                    }
+                  }
+                  pageInfo {
+                    hasPreviousPage
+                    hasNextPage
+                    endCursor
+                  }
+                }
+            }
+            """
+
+        resp_0 = self.client.execute(query)
+        resp_1 = self.client.execute(query, {"after": resp_0.data["eventsConnection"]["pageInfo"]["endCursor"]})
+
+        self.assertEqual(resp_0.data["eventsConnection"]["edges"][0]["node"]["id"], str(self.event_1.id))
+        self.assertFalse(resp_0.data["eventsConnection"]["pageInfo"]["hasPreviousPage"])
+        self.assertTrue(resp_0.data["eventsConnection"]["pageInfo"]["hasNextPage"])
+        self.assertEqual(resp_1.data["eventsConnection"]["edges"][0]["node"]["id"], str(self.event_0.id))
+        self.assertTrue(resp_1.data["eventsConnection"]["pageInfo"]["hasPreviousPage"])
+        self.assertFalse(resp_1.data["eventsConnection"]["pageInfo"]["hasNextPage"])
+
+    def test_query_events_invalid_sort_field(self):
+        resp = self.client.execute(
+            """
+            query {
+              eventsConnection(sorting: {field: "organisation"}) {
+                  edges {
+                    node {
+                      id
+                    }
+                  }
+                }
+            }
+            """
+        )
+
+        self.assertIsNone(resp.data["eventsConnection"])
+        self.assertEqual(resp.errors[0].message, "Cannot sort events by organisation, sort by one of id, name, start, end")
+
+    def test_query_events_connection_max_page_size(self):
+        with self.settings(GRAPHQL_MAX_PAGE_SIZE=1):
+            resp_0 = self.client.execute(
+                """
+                query {
+                  eventsConnection(first: 100, sorting: {field: "start", desc: true}) {
+                      edges {
+                        node {
+                          id
+                        }
+                      }
+                    }
+                }
+                """
+            )
+
+        self.assertEqual(len(resp_0.data["eventsConnection"]["edges"]), 1)
+
+
+class ProductionSettingsTests(SimpleTestCase):
+    path = os.path.join(settings.BASE_DIR, 'H2H', 'settings_prod.py')
+
+    def test_replicas_need_shared_cache(self):
+        with mock.patch.dict(os.environ, {'DB_REPLICA_HOSTS': 'replica-0,replica-1'}):
+            os.environ.pop('REDIS_URL', None)
+            with self.assertRaises(ImproperlyConfigured):
+                runpy.run_path(self.path)
+
+            os.environ['REDIS_URL'] = 'redis://localhost:6379/0'
+            self.assertEqual(runpy.run_path(self.path)['DATABASE_REPLICAS'], ['replica_0', 'replica_1'])
+
+
+class HealthCheckedWrapper(HealthCheckMixin, sqlite_base.DatabaseWrapper):
+    """SQLite connections are always usable, `usable` stands in for a server that went away"""
+    usable = True
+
+    def is_usable(self):
+        return self.usable
+
+
+class ConnectionTests(SimpleTestCase):
+    def test_persistent_connection_health_check(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        # in-memory databases are never closed
+        settings_dict = dict(
+            connection.settings_dict, NAME=os.path.join(directory, 'db.sqlite3'), CONN_MAX_AGE=None, CONN_HEALTH_CHECKS=True
+        )
+        wrapper = HealthCheckedWrapper(settings_dict, alias='health_check')
+        counters = (metrics.DB_CONNECTIONS_OPENED, metrics.DB_CONNECTIONS_REUSED, metrics.DB_HEALTH_CHECK_FAILURES,
+                    metrics.DB_CONNECTIONS_OPEN)
+
+        def values():
+            return [counter.value('health_check') for counter in counters]
+
+        wrapper.ensure_connection()
+        wrapper.ensure_connection()  # the same request, no second check
+        self.assertEqual(values(), [1, 0, 0, 1])
+
+        wrapper.close_if_unusable_or_obsolete()  # the request finished, the connection is kept
+        wrapper.ensure_connection()
+        self.assertEqual(values(), [1, 1, 0, 1])
+
+        wrapper.close_if_unusable_or_obsolete()
+        wrapper.usable = False
+        old_connection = wrapper.connection
+        wrapper.ensure_connection()
+        self.assertIsNot(wrapper.connection, old_connection)
+        self.assertEqual(values(), [2, 1, 1, 1])
+
+        wrapper.close()
+        self.assertEqual(values(), [2, 1, 1, 0])
+        self.assertIn('db_connections_opened_total{alias="health_check"} 2', metrics.render())
+
+
+@skipUnless(settings.DATABASE_REPLICAS, 'no replica configured')
+class ReplicaRoutingTests(TransactionTestCase):
+    multi_db = True  # the replica is a test mirror of default, the rows have to be committed to be seen
+
+    def setUp(self):
+        self.user = get_user_model().objects.create(username='test_user', password='test_password')
+        location = Location.objects.create(latitude=10, longitude=10, name='test_location')
+        now = timezone.now()
+        Event.objects.create(
+            name='test_event', description='test', start=now, end=now, creator=self.user, location=location
+        )
+        self.addCleanup(db_router.get_cache().delete, db_router.sticky_key(self.user.pk))
+
+    def execute(self, query):
+        """Returns the number of queries sent to the primary and to the replica"""
+        client = Client(HTTP_AUTHORIZATION='JWT ' + get_token(self.user))
+        with CaptureQueriesContext(connections['default']) as primary, \
+                CaptureQueriesContext(connections[settings.DATABASE_REPLICAS[0]]) as replica:
+            resp = client.post('/graphql', json.dumps({'query': query}), content_type='application/json')
+        self.assertNotIn('errors', resp.json())
+        return len(primary), len(replica)
+
+    def test_query_reads_from_replica(self):
+        primary, replica = self.execute('{ events { name } }')
+
+        self.assertEqual(primary, 1)  # the user of the token is looked up before the operation
+        self.assertEqual(replica, 1)
+
+    def test_operation_reads_from_one_replica(self):
+        with override_settings(DATABASE_REPLICAS=['replica', 'other_replica']):
+            for _ in range(10):
+                with db_router.route_operation('query', self.user) as operation:
+                    aliases = {db_router.ReplicaRouter().db_for_read(Event) for _ in range(10)}
+                self.assertEqual(aliases, {operation.replica})
+
+    def test_read_your_writes(self):
+        primary, replica = self.execute('mutation { createOrganisation(name: "test" description: "test") { id } }')
+        self.assertEqual(replica, 0)
+
+        # pinned to the primary until the replicas caught up
+        primary, replica = self.execute('{ events { name } }')
+        self.assertEqual((primary, replica), (2, 0))
+
+        db_router.get_cache().delete(db_router.sticky_key(self.user.pk))
+        primary, replica = self.execute('{ events { name } }')
+        self.assertEqual((primary, replica), (1, 1))
@@ -1,6 +1,8 @@
 import graphene
 from graphene_django import DjangoObjectType
 
+from H2H.optimizer import optimize_queryset
+from H2H.pagination import connection_args, paginate
 from .models import Rating, Report
 
 
@@ -14,10 +16,22 @@ class ReportType(DjangoObjectType):
         model = Report
 
 
+class RatingConnection(graphene.relay.Connection):
+    class Meta:
+        node = RatingType
+
+
+class ReportConnection(graphene.relay.Connection):
+    class Meta:
+        node = ReportType
+
+
 # Queries
 class Query(graphene.ObjectType):
     ratings = graphene.List(RatingType)
     reports = graphene.List(ReportType)
+    ratings_connection = graphene.Field(RatingConnection, **connection_args())
+    reports_connection = graphene.Field(ReportConnection, **connection_args())
 
     def resolve_ratings(self, info, id):
         return Rating.objects.all()
@@ -25,6 +39,14 @@ class Query(graphene.ObjectType):
     def resolve_reports(self, info, id):
         return Report.objects.all()
 
+    def resolve_ratings_connection(self, info, first=None, after=None):
+        ratings = optimize_queryset(Rating.objects.all(), info, path=('edges', 'node'))
+        return paginate(RatingConnection, ratings, 'id', first, after)
+
+    def resolve_reports_connection(self, info, first=None, after=None):
+        reports = optimize_queryset(Report.objects.all(), info, path=('edges', 'node'))
+        return paginate(ReportConnection, reports, 'id', first, after)
+
 
 # Mutations
 class Mutation(graphene.AbstractType):
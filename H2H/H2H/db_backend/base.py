@@ -0,0 +1,61 @@
+"""
+PostgreSQL backend with persistent connections that are checked before they are reused.
+
+With CONN_MAX_AGE every thread keeps its connection between requests. A persistent connection
+may have been closed by the server or a proxy meanwhile, so with CONN_HEALTH_CHECKS it is
+pinged once when a request first uses it and replaced if the ping fails, instead of failing
+the request. Opening, reusing and replacing connections is recorded in H2H.metrics.
+
+Behind pgbouncer in transaction pooling mode set DISABLE_SERVER_SIDE_CURSORS, the cursors of
+`QuerySet.iterator()` would outlive the transaction and the server connection they belong to.
+"""
+import time
+
+from django.db import DatabaseError
+from django.db.backends.postgresql import base
+
+from H2H.metrics import (
+    DB_CONNECT_DURATION, DB_CONNECTIONS_OPEN, DB_CONNECTIONS_OPENED, DB_CONNECTIONS_REUSED, DB_HEALTH_CHECK_FAILURES,
+)
+
+
+class HealthCheckMixin(object):
+    health_check_done = False
+
+    def connect(self):
+        # a new connection needs no check, connect() itself ensures the connection on the way
+        self.health_check_done = True
+        started = time.perf_counter()
+        super(HealthCheckMixin, self).connect()
+        DB_CONNECT_DURATION.observe(time.perf_counter() - started, self.alias)
+        DB_CONNECTIONS_OPENED.inc(self.alias)
+        DB_CONNECTIONS_OPEN.inc(self.alias)
+
+    def _close(self):
+        try:
+            super(HealthCheckMixin, self)._close()
+        finally:
+            DB_CONNECTIONS_OPEN.dec(self.alias)
+
+    def close_if_unusable_or_obsolete(self):
+        # called when a request starts and finishes, the next use of a kept connection checks it
+        super(HealthCheckMixin, self).close_if_unusable_or_obsolete()
+        self.health_check_done = False
+
+    def ensure_connection(self):
+        if self.connection is not None and not self.health_check_done and not self.in_atomic_block:
+            self.health_check_done = True
+            if self.settings_dict.get('CONN_HEALTH_CHECKS'):
+                if self.is_usable():
+                    DB_CONNECTIONS_REUSED.inc(self.alias)
+                else:
+                    DB_HEALTH_CHECK_FAILURES.inc(self.alias)
+                    try:
+                        self.close()
+                    except DatabaseError:
+                        self.connection = None
+        super(HealthCheckMixin, self).ensure_connection()
+
+
+class DatabaseWrapper(HealthCheckMixin, base.DatabaseWrapper):
+    pass
@@ -0,0 +1,94 @@
+"""
+Routing of the GraphQL operations between the primary database and its replicas.
+
+`route_operation` sends the reads of `query` operations to one of DATABASE_REPLICAS and
+everything else to the primary ('default'). Writes always go to the primary, and so do
+reads inside a transaction or after the operation wrote something. A user whose operation
+wrote is pinned to the primary for DATABASE_STICKINESS_TIMEOUT seconds, so the queries
+following a mutation see its result even if the replicas lag behind. Code running outside
+an operation (admin, management commands, background tasks) only uses the primary.
+
+The pin has to be seen by every worker, so the production settings refuse DB_REPLICA_HOSTS
+without a shared cache (REDIS_URL). A local-memory cache only pins the user in the worker
+that served the mutation.
+"""
+import random
+import threading
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import DEFAULT_DB_ALIAS, connections
+
+KEY_PREFIX = 'db:primary:'
+
+_local = threading.local()
+
+
+def get_cache():
+    return caches[settings.DATABASE_STICKINESS_CACHE_ALIAS]
+
+
+def sticky_key(user_id):
+    return '{0}{1}'.format(KEY_PREFIX, user_id)
+
+
+def is_pinned(user):
+    return user.is_authenticated and get_cache().get(sticky_key(user.pk)) is not None
+
+
+def pin(user):
+    """Sends the reads of `user` to the primary until the replicas have caught up."""
+    if user.is_authenticated:
+        get_cache().set(sticky_key(user.pk), True, settings.DATABASE_STICKINESS_TIMEOUT)
+
+
+class _Operation(object):
+    def __init__(self, replica):
+        self.replica = replica  # alias all reads of the operation go to, None for the primary
+        self.wrote = False
+
+
+def current_operation():
+    return getattr(_local, 'operation', None)
+
+
+@contextmanager
+def route_operation(operation_type, user):
+    """Routes the queries of a GraphQL operation of `operation_type` ('query', 'mutation') run for `user`."""
+    replica = None
+    if operation_type == 'query' and settings.DATABASE_REPLICAS and not is_pinned(user):
+        # one replica for the whole operation, replicas lag differently and parents and
+        # children read from different ones could disagree
+        replica = random.choice(settings.DATABASE_REPLICAS)
+    previous = current_operation()
+    operation = _local.operation = _Operation(replica)
+    try:
+        yield operation
+    finally:
+        _local.operation = previous
+        if operation.wrote:
+            pin(user)
+
+
+class ReplicaRouter(object):
+    def db_for_read(self, model, **hints):
+        operation = current_operation()
+        if operation is None or operation.replica is None or operation.wrote:
+            return DEFAULT_DB_ALIAS
+        if connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS  # reads inside a transaction have to see its writes and locks
+        return operation.replica
+
+    def db_for_write(self, model, **hints):
+        operation = current_operation()
+        if operation is not None:
+            operation.wrote = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # the replicas hold the same rows as the primary
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db not in settings.DATABASE_REPLICAS
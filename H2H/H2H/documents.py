@@ -0,0 +1,79 @@
+"""
+A graphql-core backend caching parsed and validated documents.
+
+The default backend parses the query string of every request and validates it against the
+schema on every execution. The clients send the same few operations over and over, so the
+documents are kept in an LRU cache keyed by the sha256 of the query string and validated once.
+"""
+import hashlib
+import threading
+from collections import OrderedDict
+from functools import partial
+
+from django.conf import settings
+from graphql import parse, validate
+from graphql.backend.base import GraphQLBackend, GraphQLDocument
+from graphql.execution import ExecutionResult, execute
+
+
+def document_hash(query):
+    return hashlib.sha256(query.encode('utf-8')).hexdigest()
+
+
+def _invalid(errors, *args, **kwargs):
+    return ExecutionResult(errors=errors, invalid=True)
+
+
+class CachedDocumentBackend(GraphQLBackend):
+    def __init__(self, size=None, executor=None):
+        self.size = size
+        self.execute_params = {'executor': executor}
+        self.hits = 0
+        self.misses = 0
+        self._documents = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_size(self):
+        return self.size if self.size is not None else settings.GRAPHQL_DOCUMENT_CACHE_SIZE
+
+    def document_from_string(self, schema, document_string):
+        key = (id(schema), document_hash(document_string))
+        with self._lock:
+            document = self._documents.get(key)
+            if document is not None:
+                self._documents.move_to_end(key)
+                self.hits += 1
+                return document
+            self.misses += 1
+
+        document = self.parse_and_validate(schema, document_string)
+
+        with self._lock:
+            self._documents[key] = document
+            while len(self._documents) > self.get_size():
+                self._documents.popitem(last=False)
+        return document
+
+    def parse_and_validate(self, schema, document_string):
+        # syntax errors are raised and never cached, the view turns them into a response
+        document_ast = parse(document_string)
+        errors = validate(schema, document_ast)
+        if errors:
+            execute_document = partial(_invalid, errors)
+        else:
+            execute_document = partial(execute, schema, document_ast, **self.execute_params)
+        return GraphQLDocument(
+            schema=schema,
+            document_string=document_string,
+            document_ast=document_ast,
+            execute=execute_document,
+        )
+
+    def clear(self):
+        with self._lock:
+            self._documents.clear()
+            self.hits = 0
+            self.misses = 0
+
+
+document_backend = CachedDocumentBackend()
@@ -0,0 +1,39 @@
+"""
+gunicorn configuration, the worker profile is taken from the GUNICORN_* settings.
+
+    gunicorn H2H.wsgi --config H2H/gunicorn_conf.py
+"""
+import os
+import sys
+
+# the config is read before gunicorn puts the project on the path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'H2H.settings')
+
+from django.conf import settings  # noqa: E402
+
+bind = os.getenv('GUNICORN_BIND', '0.0.0.0:8000')
+worker_class = settings.GUNICORN_WORKER_CLASS
+workers = settings.GUNICORN_WORKERS
+timeout = settings.GUNICORN_TIMEOUT
+if worker_class == 'gthread':
+    threads = settings.GUNICORN_THREADS
+elif worker_class == 'gevent':
+    worker_connections = settings.GUNICORN_WORKER_CONNECTIONS
+
+
+def post_fork(server, worker):
+    if worker_class == 'gevent':
+        # psycopg2 blocks the whole worker on every query unless it yields to the gevent hub
+        try:
+            from psycogreen.gevent import patch_psycopg
+        except ImportError:
+            raise RuntimeError("The gevent workers need psycogreen, install it or use GUNICORN_WORKER_CLASS=gthread")
+        patch_psycopg()
+
+    # Django keeps one connection per thread (greenlet with gevent) and closes it at the end of
+    # the request. A connection opened in the master before the fork would be shared by all
+    # workers, drop it so every worker connects on its own.
+    from django.db import connections
+    for connection in connections.all():
+        connection.close()
@@ -0,0 +1,141 @@
+"""
+Per-request DataLoaders for the nested resolvers.
+
+Every loader collects the keys requested while one level of the query is resolved and
+fetches them with a single `IN (...)` query. The loaders live on the request
+(`info.context`), so results are cached for exactly one GraphQL request.
+"""
+from collections import defaultdict
+
+from promise import Promise
+from promise.dataloader import DataLoader
+
+from Event.models import Event, Participation, RequiresSkill
+from Image.models import ImageDerivative
+from Location.distance import distances_km
+from User.models import HasSkill
+
+
+def _grouped(pairs, keys):
+    groups = defaultdict(list)
+    for key, value in pairs:
+        groups[key].append(value)
+    return [groups[key] for key in keys]
+
+
+class UserDataLoader(DataLoader):
+    """DataLoader whose results depend on the authenticated user of the request"""
+
+    def __init__(self, user, *args, **kwargs):
+        self.user = user
+        super(UserDataLoader, self).__init__(*args, **kwargs)
+
+
+class ParticipationByJobLoader(UserDataLoader):
+    """job id -> participation of the authenticated user or None"""
+
+    def batch_load_fn(self, job_ids):
+        if not self.user.is_authenticated:
+            return Promise.resolve([None for _ in job_ids])
+        participations = {
+            p.job_id: p for p in Participation.objects.filter(user=self.user, job_id__in=job_ids)
+        }
+        return Promise.resolve([participations.get(job_id) for job_id in job_ids])
+
+
+class SkillApprovalLoader(UserDataLoader):
+    """skill id -> whether the skill of the authenticated user is approved"""
+
+    def batch_load_fn(self, skill_ids):
+        if not self.user.is_authenticated:
+            return Promise.resolve([None for _ in skill_ids])
+        approved = dict(
+            HasSkill.objects.filter(user=self.user, skill_id__in=skill_ids).values_list('skill_id', 'approved')
+        )
+        return Promise.resolve([approved.get(skill_id) for skill_id in skill_ids])
+
+
+class RequiredSkillsByJobLoader(DataLoader):
+    """job id -> list of required skills"""
+
+    def batch_load_fn(self, job_ids):
+        requirements = RequiresSkill.objects.filter(job_id__in=job_ids).select_related('skill')
+        return Promise.resolve(_grouped(((r.job_id, r.skill) for r in requirements), job_ids))
+
+
+class SkillsByUserLoader(DataLoader):
+    """user id -> list of skills"""
+
+    def batch_load_fn(self, user_ids):
+        has_skills = HasSkill.objects.filter(user_id__in=user_ids).select_related('skill')
+        return Promise.resolve(_grouped(((h.user_id, h.skill) for h in has_skills), user_ids))
+
+
+class PrivateEventsByCreatorLoader(DataLoader):
+    """user id -> list of events the user created without an organisation"""
+
+    def batch_load_fn(self, user_ids):
+        events = Event.objects.filter(creator_id__in=user_ids, organisation=None)
+        return Promise.resolve(_grouped(((e.creator_id, e) for e in events), user_ids))
+
+
+class DerivativesByImageLoader(DataLoader):
+    """image id -> dict of the derivatives by size"""
+
+    def batch_load_fn(self, image_ids):
+        derivatives = defaultdict(dict)
+        for derivative in ImageDerivative.objects.filter(image_id__in=image_ids):
+            derivatives[derivative.image_id][derivative.size] = derivative
+        return Promise.resolve([derivatives[image_id] for image_id in image_ids])
+
+
+class DistanceLoader(DataLoader):
+    """(latitude, longitude, to latitude, to longitude) -> distance in km, computed for all keys at once"""
+
+    def batch_load_fn(self, keys):
+        points_by_target = defaultdict(list)
+        for key in keys:
+            points_by_target[key[2:]].append(key[:2])
+        distances = {}
+        for to, points in points_by_target.items():
+            for point, distance in zip(points, distances_km(points, to)):
+                distances[point + to] = distance
+        return Promise.resolve([distances[key] for key in keys])
+
+
+class Loaders(object):
+    """Creates the loaders of one request on first use"""
+
+    loader_classes = {
+        'participation_by_job': ParticipationByJobLoader,
+        'skill_approval': SkillApprovalLoader,
+        'required_skills_by_job': RequiredSkillsByJobLoader,
+        'skills_by_user': SkillsByUserLoader,
+        'private_events_by_creator': PrivateEventsByCreatorLoader,
+        'derivatives_by_image': DerivativesByImageLoader,
+        'distance': DistanceLoader,
+    }
+
+    def __init__(self, context):
+        self.context = context
+
+    def __getattr__(self, name):
+        if name not in self.loader_classes:
+            raise AttributeError(name)
+        loader_class = self.loader_classes[name]
+        if issubclass(loader_class, UserDataLoader):
+            loader = loader_class(self.context.user)
+        else:
+            loader = loader_class()
+        setattr(self, name, loader)
+        return loader
+
+
+def get_loaders(info):
+    """Returns the loaders of the request that is being resolved."""
+    context = info.context
+    if context is None:
+        raise Exception("DataLoaders need the request as context")
+    if not hasattr(context, 'loaders'):
+        context.loaders = Loaders(context)
+    return context.loaders
@@ -0,0 +1,136 @@
+"""
+In-process histograms, counters and gauges rendered in the Prometheus text format.
+
+Every gunicorn worker keeps its own histograms, a scrape sees the worker that answered it.
+"""
+import threading
+
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+REGISTRY = []
+
+
+def _format_labels(labels):
+    return ','.join('{0}="{1}"'.format(name, str(value).replace('\\', '\\\\').replace('"', '\\"'))
+                    for name, value in labels)
+
+
+class Histogram(object):
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._lock = threading.Lock()
+        self._series = {}  # label values -> [bucket counts..., sum, count]
+        REGISTRY.append(self)
+
+    def observe(self, value, *labelvalues):
+        with self._lock:
+            series = self._series.get(labelvalues)
+            if series is None:
+                series = self._series[labelvalues] = [0] * len(self.buckets) + [0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def clear(self):
+        with self._lock:
+            self._series.clear()
+
+    def render(self):
+        lines = [
+            '# HELP {0} {1}'.format(self.name, self.documentation),
+            '# TYPE {0} histogram'.format(self.name),
+        ]
+        with self._lock:
+            series = sorted((labelvalues, list(values)) for labelvalues, values in self._series.items())
+        for labelvalues, values in series:
+            labels = list(zip(self.labelnames, labelvalues))
+            for bound, count in zip(self.buckets, values):
+                lines.append('{0}_bucket{{{1}}} {2}'.format(
+                    self.name, _format_labels(labels + [('le', repr(bound))]), count))
+            lines.append('{0}_bucket{{{1}}} {2}'.format(
+                self.name, _format_labels(labels + [('le', '+Inf')]), values[-1]))
+            suffix = '{{{0}}}'.format(_format_labels(labels)) if labels else ''
+            lines.append('{0}_sum{1} {2!r}'.format(self.name, suffix, values[-2]))
+            lines.append('{0}_count{1} {2}'.format(self.name, suffix, values[-1]))
+        return lines
+
+
+class Counter(object):
+    def __init__(self, name, documentation, labelnames=(), kind='counter'):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.kind = kind
+        self._lock = threading.Lock()
+        self._values = {}  # label values -> value
+        REGISTRY.append(self)
+
+    def inc(self, *labelvalues, amount=1):
+        with self._lock:
+            self._values[labelvalues] = self._values.get(labelvalues, 0) + amount
+
+    def value(self, *labelvalues):
+        with self._lock:
+            return self._values.get(labelvalues, 0)
+
+    def clear(self):
+        with self._lock:
+            self._values.clear()
+
+    def render(self):
+        lines = [
+            '# HELP {0} {1}'.format(self.name, self.documentation),
+            '# TYPE {0} {1}'.format(self.name, self.kind),
+        ]
+        with self._lock:
+            values = sorted(self._values.items())
+        for labelvalues, value in values:
+            labels = list(zip(self.labelnames, labelvalues))
+            suffix = '{{{0}}}'.format(_format_labels(labels)) if labels else ''
+            lines.append('{0}{1} {2!r}'.format(self.name, suffix, value))
+        return lines
+
+
+class Gauge(Counter):
+    def __init__(self, name, documentation, labelnames=()):
+        super(Gauge, self).__init__(name, documentation, labelnames, kind='gauge')
+
+    def dec(self, *labelvalues, amount=1):
+        self.inc(*labelvalues, amount=-amount)
+
+
+def render():
+    """Returns all registered metrics in the Prometheus text format."""
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    return '\n'.join(lines) + '\n'
+
+
+RESOLVER_DURATION = Histogram(
+    'graphql_resolver_duration_seconds', 'Time spent resolving a GraphQL field.', ('field',)
+)
+OPERATION_DURATION = Histogram(
+    'graphql_operation_duration_seconds', 'Time spent executing a GraphQL operation.'
+)
+DB_CONNECT_DURATION = Histogram(
+    'db_connect_duration_seconds', 'Time spent opening a database connection.', ('alias',)
+)
+DB_CONNECTIONS_OPENED = Counter(
+    'db_connections_opened_total', 'Database connections opened.', ('alias',)
+)
+DB_CONNECTIONS_REUSED = Counter(
+    'db_connections_reused_total', 'Requests served by a persistent database connection that passed its health check.',
+    ('alias',)
+)
+DB_HEALTH_CHECK_FAILURES = Counter(
+    'db_health_check_failures_total', 'Persistent database connections found broken and replaced.', ('alias',)
+)
+DB_CONNECTIONS_OPEN = Gauge(
+    'db_connections_open', 'Database connections currently held by this worker.', ('alias',)
+)
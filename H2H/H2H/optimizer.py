@@ -0,0 +1,99 @@
+"""
+Plans `select_related`/`prefetch_related`/`only` for a root queryset from the fields the
+GraphQL query selects, so nested objects are loaded with the root instead of one query per row.
+"""
+from graphene.utils.str_converters import to_snake_case
+from graphql.language.ast import Field, FragmentSpread, InlineFragment
+
+
+def _selected_fields(selection_sets, fragments):
+    """Yields the fields of the given selection sets with fragments resolved."""
+    for selection_set in selection_sets:
+        if not selection_set:
+            continue
+        for selection in selection_set.selections:
+            if isinstance(selection, Field):
+                yield selection
+            elif isinstance(selection, FragmentSpread):
+                yield from _selected_fields([fragments[selection.name.value].selection_set], fragments)
+            elif isinstance(selection, InlineFragment):
+                yield from _selected_fields([selection.selection_set], fragments)
+
+
+def _model_fields(model):
+    """Maps the names graphene-django uses for a model's fields to the django fields."""
+    fields = {}
+    for field in model._meta.get_fields():
+        if field.auto_created and not field.concrete:
+            fields[field.get_accessor_name()] = field  # reverse relation, e.g. job_set
+        else:
+            fields[field.name] = field
+    return fields
+
+
+class QueryPlan(object):
+    def __init__(self):
+        self.select_related = set()
+        self.prefetch_related = set()
+        self.only = set()
+
+    def walk(self, model, fields, fragments, path='', prefetch=False):
+        model_fields = _model_fields(model)
+        only = {model._meta.pk.name}
+        restrict = True
+
+        # group the selections per field, the same field may be selected several times
+        selections = {}
+        for field in fields:
+            name = to_snake_case(field.name.value)
+            if name.startswith('__'):
+                continue
+            selections.setdefault(name, []).append(field.selection_set)
+
+        for name, selection_sets in selections.items():
+            model_field = model_fields.get(name)
+            if model_field is None:
+                # resolved by a custom resolver which might need any column
+                restrict = False
+                continue
+            if not model_field.is_relation:
+                only.add(name)
+                continue
+
+            related_path = path + name
+            children = list(_selected_fields(selection_sets, fragments))
+            single = model_field.many_to_one or model_field.one_to_one
+            if single and not prefetch:
+                self.select_related.add(related_path)
+                if model_field.concrete:
+                    only.add(name)
+                self.walk(model_field.related_model, children, fragments, related_path + '__')
+            else:
+                self.prefetch_related.add(related_path)
+                self.walk(model_field.related_model, children, fragments, related_path + '__', prefetch=True)
+
+        # only() can not reach into prefetched querysets
+        if not prefetch:
+            if not restrict:
+                only = {f.name for f in model._meta.concrete_fields}
+            self.only |= {path + name for name in only}
+
+
+def optimize_queryset(queryset, info, path=()):
+    """
+    Applies select_related/prefetch_related/only to `queryset` for the fields selected in `info`.
+    `path` names the fields between the resolved field and the model, e.g. ('edges', 'node') for connections.
+    """
+    plan = QueryPlan()
+    fields = info.field_asts
+    for name in path:
+        fields = [field for field in _selected_fields([field.selection_set for field in fields], info.fragments)
+                  if field.name.value == name]
+    children = list(_selected_fields([field.selection_set for field in fields], info.fragments))
+    plan.walk(queryset.model, children, info.fragments)
+
+    if plan.select_related:
+        queryset = queryset.select_related(*sorted(plan.select_related))
+    if plan.prefetch_related:
+        queryset = queryset.prefetch_related(*sorted(plan.prefetch_related))
+    return queryset.only(*sorted(plan.only))
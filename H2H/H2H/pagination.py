@@ -0,0 +1,96 @@
+"""
+Relay-style connections with keyset cursors.
+
+A cursor stores the sort key and the id of the last row of a page. The next page is
+fetched with `WHERE (key, id) > (cursor key, cursor id)` instead of an OFFSET, so every
+page costs the same no matter how deep the client pages. The sort key must not be NULL,
+rows with a NULL key drop out of the `>` comparison and were never paged to.
+"""
+import base64
+import datetime
+import json
+
+import graphene
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import F, Q
+
+
+def connection_args(**kwargs):
+    """Returns the arguments of a connection field plus the given ones."""
+    return dict(first=graphene.Int(), after=graphene.String(), **kwargs)
+
+
+class CursorEncoder(DjangoJSONEncoder):
+    def default(self, o):
+        # DjangoJSONEncoder cuts datetimes to milliseconds, the cursor needs the exact value
+        if isinstance(o, datetime.datetime):
+            return o.isoformat()
+        return super(CursorEncoder, self).default(o)
+
+
+def encode_cursor(value, pk):
+    data = json.dumps([value, pk], cls=CursorEncoder)
+    return base64.urlsafe_b64encode(data.encode()).decode()
+
+
+def decode_cursor(cursor):
+    try:
+        value, pk = json.loads(base64.urlsafe_b64decode(cursor.encode()).decode())
+    except (TypeError, ValueError):
+        raise Exception("Invalid cursor")
+    return value, pk
+
+
+def page_size(first):
+    if first is None:
+        return settings.GRAPHQL_PAGE_SIZE
+    if first < 0:
+        raise Exception("first has to be positive")
+    return min(first, settings.GRAPHQL_MAX_PAGE_SIZE)
+
+
+def paginate(connection_type, queryset, order_by='id', first=None, after=None):
+    """
+    Returns one page of `queryset` as `connection_type`.
+    `order_by` is a field or annotation name, prefixed with '-' for descending order.
+    """
+    desc = order_by.startswith('-')
+    key = order_by.lstrip('-')
+    size = page_size(first)
+    minus = '-' if desc else ''
+
+    if key in ('id', 'pk'):
+        queryset = queryset.annotate(cursor_value=F('pk')).order_by(minus + 'pk')
+    else:
+        queryset = queryset.annotate(cursor_value=F(key)).order_by(minus + key, minus + 'pk')
+
+    has_previous_page = False
+    if after:
+        value, pk = decode_cursor(after)
+        comparison = 'lt' if desc else 'gt'
+        if key in ('id', 'pk'):
+            following = Q(**{'pk__' + comparison: pk})
+        else:
+            following = Q(**{key + '__' + comparison: value}) | Q(**{key: value, 'pk__' + comparison: pk})
+        # one indexed lookup, the rows up to the cursor are not counted
+        has_previous_page = queryset.exclude(following).exists()
+        queryset = queryset.filter(following)
+
+    nodes = list(queryset[:size + 1])
+    has_next_page = len(nodes) > size
+    nodes = nodes[:size]
+
+    edges = [
+        connection_type.Edge(node=node, cursor=encode_cursor(node.cursor_value, node.pk))
+        for node in nodes
+    ]
+    return connection_type(
+        edges=edges,
+        page_info=graphene.relay.PageInfo(
+            start_cursor=edges[0].cursor if edges else None,
+            end_cursor=edges[-1].cursor if edges else None,
+            has_previous_page=has_previous_page,
+            has_next_page=has_next_page,
+        )
+    )
@@ -0,0 +1,65 @@
+"""
+Automatic persisted queries as sent by Apollo clients.
+
+A client sends `extensions: {"persistedQuery": {"version": 1, "sha256Hash": "..."}}` without
+the query. If the hash is unknown the server answers with the error `PersistedQueryNotFound`,
+the client repeats the request with the query and the server stores it for the hash.
+Queries are kept in the django cache, the operations of GRAPHQL_PERSISTED_QUERIES_MANIFEST
+(a JSON object mapping hashes to queries) are known from the start.
+"""
+import json
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .documents import document_hash
+
+CACHE_PREFIX = 'graphql:persisted:'
+
+_manifest = None
+
+
+class PersistedQueryError(Exception):
+    pass
+
+
+def get_manifest():
+    global _manifest
+    if _manifest is None:
+        path = settings.GRAPHQL_PERSISTED_QUERIES_MANIFEST
+        if path:
+            with open(path) as manifest:
+                _manifest = json.load(manifest)
+        else:
+            _manifest = {}
+    return _manifest
+
+
+def get_persisted_query(sha256_hash):
+    return get_manifest().get(sha256_hash) or cache.get(CACHE_PREFIX + sha256_hash)
+
+
+def resolve_persisted_query(query, extensions):
+    """
+    Returns the query to execute for a request with the given query and extensions.
+    Raises PersistedQueryError if the request refers to a query that is not known.
+    """
+    persisted = (extensions or {}).get('persistedQuery')
+    if not persisted:
+        return query
+    if persisted.get('version') != 1:
+        raise PersistedQueryError('PersistedQueryNotSupported')
+    sha256_hash = persisted.get('sha256Hash')
+    if not sha256_hash:
+        raise PersistedQueryError('PersistedQueryNotSupported')
+
+    if query is None:
+        query = get_persisted_query(sha256_hash)
+        if query is None:
+            raise PersistedQueryError('PersistedQueryNotFound')
+        return query
+
+    if document_hash(query) != sha256_hash:
+        raise PersistedQueryError('provided sha does not match query')
+    cache.set(CACHE_PREFIX + sha256_hash, query, settings.GRAPHQL_PERSISTED_QUERIES_TIMEOUT)
+    return query
@@ -0,0 +1,118 @@
+"""
+Records the SQL queries of a GraphQL operation.
+
+`QueryRecorder` hooks into every database connection with an execute wrapper and counts
+the queries, their time and how often the same statement ran under the same resolver path.
+`ProfilingMiddleware` tells the active recorder which resolver is running, so a statement
+that is repeated for every row of a list shows up as an N+1 under that list's path.
+"""
+import logging
+import re
+import threading
+import time
+from collections import Counter, defaultdict
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+_local = threading.local()
+
+# collapse the placeholders of IN (...) lists and literals, so batches of any size share a fingerprint
+_PLACEHOLDER_LIST = re.compile(r'\((?:\s*%s\s*,)+\s*%s\s*\)')
+_NUMBER = re.compile(r'\b\d+(?:\.\d+)?\b')
+_STRING = re.compile(r"'(?:[^']|'')*'")
+
+
+def fingerprint(sql):
+    """Returns `sql` without its literals, so statements that only differ in values are equal."""
+    sql = _STRING.sub('?', sql)
+    sql = _NUMBER.sub('?', sql)
+    return _PLACEHOLDER_LIST.sub('(...)', sql)
+
+
+def current_recorder():
+    """Returns the innermost recorder active in this thread or None."""
+    recorders = getattr(_local, 'recorders', None)
+    return recorders[-1] if recorders else None
+
+
+class QueryRecorder(object):
+    """
+    Context manager recording every SQL query run in this thread while it is active.
+    """
+
+    def __init__(self, name=None):
+        self.name = name
+        self.path = ''
+        self.count = 0
+        self.duration = 0.0
+        self.statements = defaultdict(Counter)  # resolver path -> fingerprint -> count
+        self._stack = None
+
+    def __enter__(self):
+        self._stack = ExitStack()
+        for connection in connections.all():
+            self._stack.enter_context(connection.execute_wrapper(self))
+        if not hasattr(_local, 'recorders'):
+            _local.recorders = []
+        _local.recorders.append(self)
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        _local.recorders.remove(self)
+        self._stack.close()
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.duration += time.perf_counter() - start
+            self.count += 1
+            self.statements[self.path][fingerprint(sql)] += 1
+
+    def repeated(self):
+        """Returns (path, fingerprint, count) of the statements run more than once per resolver path."""
+        repeated = [
+            (path, statement, count)
+            for path, statements in self.statements.items()
+            for statement, count in statements.items()
+            if count > 1
+        ]
+        return sorted(repeated, key=lambda item: -item[2])
+
+    def report(self):
+        lines = ['{0} queries in {1:.1f} ms'.format(self.count, self.duration * 1000)]
+        for path, statement, count in self.repeated():
+            lines.append('  {0}x under {1}: {2}'.format(count, path or '<root>', statement))
+        return '\n'.join(lines)
+
+
+class ProfilingMiddleware(object):
+    """
+    Graphene middleware telling the active QueryRecorder which resolver runs the queries.
+    The path leaves out list indices, e.g. events.jobSet.currentUsersParticipation.
+    """
+
+    def resolve(self, next, root, info, **kwargs):
+        recorder = current_recorder()
+        if recorder is None:
+            return next(root, info, **kwargs)
+
+        # the path is not restored afterwards: resolvers return lazy querysets which are
+        # only evaluated while the result is completed, right after the resolver returned
+        recorder.path = '.'.join(str(key) for key in info.path if not isinstance(key, int))
+        return next(root, info, **kwargs)
+
+
+def check_budget(recorder):
+    """Logs the operation of `recorder` if it ran more queries than GRAPHQL_QUERY_BUDGET."""
+    budget = getattr(settings, 'GRAPHQL_QUERY_BUDGET', None)
+    if budget is not None and recorder.count > budget:
+        logger.warning(
+            'GraphQL operation %s exceeded the query budget of %d: %s',
+            recorder.name or '<anonymous>', budget, recorder.report()
+        )
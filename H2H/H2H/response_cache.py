@@ -0,0 +1,114 @@
+"""
+Cache of the responses to anonymous discovery queries.
+
+Only queries of anonymous users whose root fields are all listed in CACHEABLE_FIELDS are
+cached. The key is built from the normalized operation, the variables and the generations
+of the tags the root fields depend on. Saving or deleting a model bumps the generations of
+its tags (see the signal receivers in the models), which makes every dependent key unreachable,
+the stale entries expire with GRAPHQL_RESPONSE_CACHE_TIMEOUT.
+
+With the default local-memory cache every worker has its own entries and only sees the
+invalidations of its own process, configure a shared cache (REDIS_URL) to invalidate globally.
+"""
+import hashlib
+import json
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from graphql.language.ast import Field, Variable
+from graphql.language.printer import print_ast
+from graphql.utils.get_operation_ast import get_operation_ast
+
+KEY_PREFIX = 'graphql:response:'
+GENERATION_PREFIX = 'graphql:generation:'
+
+# root field -> function returning the tags of a selection of the field
+CACHEABLE_FIELDS = {
+    'events': lambda arguments: ['events'],
+    'eventsConnection': lambda arguments: ['events'],
+    'eventsByCoordinates': lambda arguments: ['events'],
+    'eventsByCoordinatesConnection': lambda arguments: ['events'],
+    'eventsWithinRadius': lambda arguments: ['events'],
+    'eventClusters': lambda arguments: ['events'],
+    'event': lambda arguments: ['event:{0}'.format(arguments.get('id'))],
+    'organisations': lambda arguments: ['organisations'],
+    'organisationsConnection': lambda arguments: ['organisations'],
+}
+
+
+def get_cache():
+    return caches[settings.GRAPHQL_RESPONSE_CACHE_ALIAS]
+
+
+def _arguments(field, variables):
+    arguments = {}
+    for argument in field.arguments:
+        if isinstance(argument.value, Variable):
+            arguments[argument.name.value] = (variables or {}).get(argument.value.name.value)
+        else:
+            arguments[argument.name.value] = getattr(argument.value, 'value', None)
+    return arguments
+
+
+def _tags(operation, variables):
+    """Returns the tags the operation depends on or None if it can not be cached."""
+    tags = set()
+    for selection in operation.selection_set.selections:
+        if not isinstance(selection, Field) or selection.directives:
+            return None
+        name = selection.name.value
+        if name == '__typename':
+            continue
+        if name not in CACHEABLE_FIELDS:
+            return None
+        tags.update(CACHEABLE_FIELDS[name](_arguments(selection, variables)))
+    return tags
+
+
+def _generations(tags):
+    cache = get_cache()
+    keys = [GENERATION_PREFIX + tag for tag in sorted(tags)]
+    generations = cache.get_many(keys)
+    for key in keys:
+        if key not in generations:
+            # a fresh generation must never equal one that was evicted, so it starts at the current time
+            cache.add(key, int(time.time() * 1000000), None)
+            generations[key] = cache.get(key)
+    return [generations[key] for key in keys]
+
+
+def response_cache_key(document, variables, operation_name):
+    """Returns the cache key of an operation or None if its response must not be cached."""
+    if not settings.GRAPHQL_RESPONSE_CACHE_TIMEOUT:
+        return None
+    operation = get_operation_ast(document.document_ast, operation_name)
+    if operation is None or operation.operation != 'query':
+        return None
+    tags = _tags(operation, variables)
+    if not tags:
+        return None
+
+    normalized = json.dumps(
+        [print_ast(document.document_ast), operation_name, variables, _generations(tags)],
+        sort_keys=True, default=str
+    )
+    return KEY_PREFIX + hashlib.sha256(normalized.encode('utf-8')).hexdigest()
+
+
+def get_response(key):
+    return get_cache().get(key)
+
+
+def set_response(key, data):
+    get_cache().set(key, data, settings.GRAPHQL_RESPONSE_CACHE_TIMEOUT)
+
+
+def invalidate(*tags):
+    """Bumps the generations of `tags`, responses depending on them are not served anymore."""
+    cache = get_cache()
+    for tag in tags:
+        try:
+            cache.incr(GENERATION_PREFIX + tag)
+        except ValueError:
+            pass  # no response depends on the tag yet
@@ -33,6 +33,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     'graphene_django',
     'User',
     'Organisation',
@@ -44,10 +45,101 @@ INSTALLED_APPS = [
     "cloudinary",
 ]
 
+# local memory by default, a shared redis cache (needs django-redis) also invalidates across workers
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+}
+if os.getenv('REDIS_URL'):
+    CACHES['default'] = {
+        'BACKEND': 'django_redis.cache.RedisCache',
+        'LOCATION': os.getenv('REDIS_URL'),
+    }
+
 GRAPHENE = {
-    'SCHEMA': 'H2H.schema.schema'
+    'SCHEMA': 'H2H.schema.schema',
+    'MIDDLEWARE': [
+        'H2H.profiling.ProfilingMiddleware',
+        'H2H.tracing.TracingMiddleware',
+    ],
 }
 
+# page sizes of the *Connection queries
+GRAPHQL_PAGE_SIZE = 20
+GRAPHQL_MAX_PAGE_SIZE = 100
+
+# operations running more SQL queries are logged with their repeated statements, None disables it
+GRAPHQL_QUERY_BUDGET = 50
+
+# operations taking longer (in seconds) are logged with their slowest fields, None disables it
+GRAPHQL_SLOW_OPERATION = 1.0
+
+# allows clients to ask for Apollo tracing with the header X-GraphQL-Tracing: 1
+GRAPHQL_TRACING = DEBUG
+
+# number of parsed and validated GraphQL documents kept in memory
+GRAPHQL_DOCUMENT_CACHE_SIZE = 250
+
+# persisted queries are kept in the cache for this many seconds, None keeps them forever
+GRAPHQL_PERSISTED_QUERIES_TIMEOUT = 60 * 60 * 24 * 7
+# optional JSON file mapping the sha256 hashes of the client operations to their queries
+GRAPHQL_PERSISTED_QUERIES_MANIFEST = os.getenv('GRAPHQL_PERSISTED_QUERIES_MANIFEST')
+
+# responses to anonymous discovery queries are cached for this many seconds, 0 disables it
+GRAPHQL_RESPONSE_CACHE_ALIAS = 'default'
+GRAPHQL_RESPONSE_CACHE_TIMEOUT = 30
+
+# cache of the organisation membership checks, see Organisation/permissions.py. Only used
+# when the cache is shared by the workers, a local-memory cache would keep revoked rights
+ORGANISATION_PERMISSION_CACHE_ALIAS = 'default'
+ORGANISATION_PERMISSION_CACHE_TIMEOUT = 300
+
+# query operations read from the DATABASE_REPLICAS (set next to DATABASES), a user is pinned
+# to the primary for DATABASE_STICKINESS_TIMEOUT seconds after writing, see H2H/db_router.py
+DATABASE_ROUTERS = ['H2H.db_router.ReplicaRouter']
+DATABASE_STICKINESS_CACHE_ALIAS = 'default'
+DATABASE_STICKINESS_TIMEOUT = 10
+
+# image uploads are spooled here and pushed to the storage backend by a pool of threads,
+# see Image/uploads.py. LocalStorage keeps the images in MEDIA_ROOT instead of cloudinary
+IMAGE_STORAGE_BACKEND = os.getenv('IMAGE_STORAGE_BACKEND', 'Image.storage.CloudinaryStorage')
+IMAGE_SPOOL_DIR = os.getenv('IMAGE_SPOOL_DIR', os.path.join(BASE_DIR, 'spool'))
+IMAGE_UPLOAD_WORKERS = 2
+# runs the uploads in the request, for tests
+IMAGE_UPLOAD_EAGER = False
+# larger uploads and other types are rejected while the request is read (413/415), keep
+# client_max_body_size in nginx_conf slightly above
+IMAGE_UPLOAD_MAX_SIZE = int(os.getenv('IMAGE_UPLOAD_MAX_SIZE', 10 * 1024 * 1024))
+IMAGE_UPLOAD_CONTENT_TYPES = ('image/jpeg', 'image/png', 'image/gif', 'image/webp')
+# parts of the uploads to cloudinary, at least 5 MB
+IMAGE_UPLOAD_CHUNK_SIZE = 6 * 1024 * 1024
+# uploaded files are streamed into temporary files next to the spooled images
+FILE_UPLOAD_TEMP_DIR = IMAGE_SPOOL_DIR
+
+MEDIA_URL = '/media/'
+MEDIA_ROOT = os.getenv('MEDIA_ROOT', os.path.join(BASE_DIR, 'media'))
+
+# 'haversine' (spherical, up to 0.5% off) or 'ellipsoidal' (WGS-84, about 10 m off). haversine
+# agrees with the distance annotation the SQL of order_by_distance and within_radius uses
+LOCATION_DISTANCE_MODE = 'haversine'
+
+# /metrics only answers requests from these addresses
+METRICS_ALLOWED_IPS = ['127.0.0.1', '::1']
+
+# gunicorn, see H2H/gunicorn_conf.py. 'gthread' workers serve GUNICORN_THREADS requests at
+# once, a slow cloudinary or geocoding call blocks one thread instead of the whole worker.
+# 'gevent' needs gevent and psycogreen installed, 'sync' is the old one request per worker.
+# Every thread or greenlet holds its own database connection, keep
+# workers * (threads or worker connections) below the connection limit of the database.
+GUNICORN_WORKER_CLASS = os.getenv('GUNICORN_WORKER_CLASS', 'gthread')
+GUNICORN_WORKERS = int(os.getenv(
+    'GUNICORN_WORKERS', (os.cpu_count() or 1) * 2 + 1 if GUNICORN_WORKER_CLASS == 'sync' else (os.cpu_count() or 1) + 1
+))
+GUNICORN_THREADS = int(os.getenv('GUNICORN_THREADS', 4))
+GUNICORN_WORKER_CONNECTIONS = int(os.getenv('GUNICORN_WORKER_CONNECTIONS', 50))
+GUNICORN_TIMEOUT = int(os.getenv('GUNICORN_TIMEOUT', 30))
+
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -8,11 +8,17 @@ BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 
 DATABASES = {
    'default': {
-        'ENGINE': 'django.db.backends.postgresql',
+        'ENGINE': 'H2H.db_backend',
         'NAME':  'happy2help',
         'USER': os.environ.get('DB_USER', None),
         'PASSWORD': os.environ.get('DB_PW', None),
         'HOST':  '127.0.0.1',
         'PORT':  1337,
+        'CONN_MAX_AGE': 300,
+        'CONN_HEALTH_CHECKS': True,
     },
-}
\ No newline at end of file
+}
+
+# a second alias of the same database, so the replica routing runs locally and in the tests
+DATABASES['replica'] = dict(DATABASES['default'], TEST={'MIRROR': 'default'})
+DATABASE_REPLICAS = ['replica']
@@ -3,20 +3,36 @@
 
 import os
 
+from django.core.exceptions import ImproperlyConfigured
+
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 ALLOWED_HOSTS = ['h2h-dev.taher.io', 'localhost', '127.0.0.1', '0.0.0.0']
 
 DATABASES = {
    'default': {
-        'ENGINE': 'django.db.backends.postgresql',
+        'ENGINE': 'H2H.db_backend',
         'NAME':  os.getenv('DB_NAME', None),
         'USER':  os.getenv('DB_USER', None),
         'PASSWORD': os.getenv('DB_PASSWORD', None),
         'HOST':  os.getenv('DB_HOST', None),
         'PORT':  os.getenv('DB_PORT', None),
+        # connections are kept between requests and pinged before reuse, see H2H/db_backend/base.py
+        'CONN_MAX_AGE': int(os.getenv('DB_CONN_MAX_AGE', 300)),
+        'CONN_HEALTH_CHECKS': True,
+        # DB_HOST is a pgbouncer in transaction pooling mode
+        'DISABLE_SERVER_SIDE_CURSORS': os.getenv('DB_PGBOUNCER', '0') == '1',
     },
 }
 
+# streaming replicas of the primary, comma separated hosts with the credentials of the primary
+for index, host in enumerate(filter(None, os.getenv('DB_REPLICA_HOSTS', '').split(','))):
+    DATABASES['replica_{0}'.format(index)] = dict(DATABASES['default'], HOST=host.strip())
+DATABASE_REPLICAS = [alias for alias in DATABASES if alias != 'default']
+# the read-your-writes pin of H2H/db_router.py has to reach every worker, a local-memory cache
+# would send the queries following a mutation in another worker to a lagging replica
+if DATABASE_REPLICAS and not os.getenv('REDIS_URL'):
+    raise ImproperlyConfigured('DB_REPLICA_HOSTS needs a shared cache, set REDIS_URL')
+
 LOGGING = {
     'version': 1,
     'disable_existing_loggers': False,
@@ -45,7 +61,7 @@ LOGGING = {
             'level': 'ERROR',
             'propagate': True,
         },
-        'APPNAME': {
+        'H2H': {
             'handlers': ['applogfile',],
             'level': 'DEBUG',
         },
@@ -0,0 +1,43 @@
+from graphene_django.settings import graphene_settings
+from graphene_django.views import instantiate_middleware
+from graphql_jwt.testcases import JSONWebTokenClient, JSONWebTokenTestCase
+
+from .profiling import QueryRecorder
+
+
+class ProfilingJSONWebTokenClient(JSONWebTokenClient):
+    """Executes operations with the graphene middleware of the settings, like the GraphQL view does"""
+
+    def execute(self, query, variables=None, **extra):
+        extra.update(self._credentials)
+        context = self.post('/', **extra)
+        middleware = list(instantiate_middleware(graphene_settings.MIDDLEWARE))
+        return self._schema.execute(query, context=context, variables=variables, middleware=middleware)
+
+
+class _AssertMaxQueriesContext(QueryRecorder):
+    def __init__(self, test_case, limit):
+        super(_AssertMaxQueriesContext, self).__init__()
+        self.test_case = test_case
+        self.limit = limit
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        super(_AssertMaxQueriesContext, self).__exit__(exc_type, exc_value, traceback)
+        if exc_type is None and self.count > self.limit:
+            self.test_case.fail('{0} queries executed, at most {1} expected. {2}'.format(
+                self.count, self.limit, self.report()
+            ))
+
+
+class GraphQLTestCase(JSONWebTokenTestCase):
+    client_class = ProfilingJSONWebTokenClient
+
+    def assertMaxQueries(self, limit):
+        """
+        Fails if the block runs more than `limit` SQL queries. The failure lists the
+        statements that were repeated per resolver path.
+
+            with self.assertMaxQueries(5):
+                self.client.execute(query)
+        """
+        return _AssertMaxQueriesContext(self, limit)
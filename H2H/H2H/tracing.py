@@ -0,0 +1,93 @@
+"""
+Times the GraphQL resolvers.
+
+`TracingMiddleware` feeds every resolver duration into the `graphql_resolver_duration_seconds`
+histogram. If the request carries a `Tracer`, the durations are also summed per field for the
+operation and, on request, listed per resolver in the Apollo tracing format.
+"""
+import datetime
+import time
+from collections import defaultdict
+
+from django.utils import timezone
+from promise import Promise, is_thenable
+
+from .metrics import RESOLVER_DURATION
+
+
+def _nanoseconds(seconds):
+    return int(seconds * 1e9)
+
+
+class Tracer(object):
+    """Collects the resolver timings of one operation"""
+
+    def __init__(self, resolvers=False):
+        self.operation_name = None
+        self.start_time = timezone.now()
+        self.start = time.perf_counter()
+        self.end = None
+        self.fields = defaultdict(lambda: [0.0, 0])  # Type.field -> [total seconds, calls]
+        self.resolvers = [] if resolvers else None
+
+    def record(self, info, start, end):
+        field = self.fields['{0}.{1}'.format(info.parent_type.name, info.field_name)]
+        field[0] += end - start
+        field[1] += 1
+        if self.resolvers is not None:
+            self.resolvers.append({
+                'path': list(info.path),
+                'parentType': info.parent_type.name,
+                'fieldName': info.field_name,
+                'returnType': str(info.return_type),
+                'startOffset': _nanoseconds(start - self.start),
+                'duration': _nanoseconds(end - start),
+            })
+
+    def finish(self):
+        self.end = time.perf_counter()
+        return self.end - self.start
+
+    def summary(self, limit=10):
+        """Returns the slowest fields, e.g. 'Query.events 180 ms, EventType.jobSet 40 ms x50'."""
+        fields = sorted(self.fields.items(), key=lambda item: -item[1][0])[:limit]
+        return ', '.join(
+            '{0} {1:.0f} ms{2}'.format(name, total * 1000, ' x{0}'.format(calls) if calls > 1 else '')
+            for name, (total, calls) in fields
+        )
+
+    def as_apollo_tracing(self):
+        end = self.end if self.end is not None else time.perf_counter()
+        duration = end - self.start
+        return {
+            'version': 1,
+            'startTime': self.start_time.isoformat(),
+            'endTime': (self.start_time + datetime.timedelta(seconds=duration)).isoformat(),
+            'duration': _nanoseconds(duration),
+            'execution': {
+                'resolvers': self.resolvers or [],
+            },
+        }
+
+
+class TracingMiddleware(object):
+    """
+    Graphene middleware timing every resolver. Resolvers returning a promise (DataLoaders)
+    are timed until the promise is resolved.
+    """
+
+    def resolve(self, next, root, info, **kwargs):
+        start = time.perf_counter()
+        result = next(root, info, **kwargs)
+
+        def done(value):
+            end = time.perf_counter()
+            RESOLVER_DURATION.observe(end - start, '{0}.{1}'.format(info.parent_type.name, info.field_name))
+            tracer = getattr(info.context, 'tracer', None)
+            if tracer is not None:
+                tracer.record(info, start, end)
+            return value
+
+        if is_thenable(result):
+            return Promise.resolve(result).then(done)
+        return done(result)
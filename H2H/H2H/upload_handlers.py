@@ -0,0 +1,55 @@
+"""
+Upload handler of the multipart GraphQL requests.
+
+Every file is streamed in chunks into a temporary file in IMAGE_SPOOL_DIR, nothing is buffered
+in memory. Requests that can not fit the limits are rejected before their body is read, files
+are rejected as soon as their first chunk shows the wrong type or they grow over
+IMAGE_UPLOAD_MAX_SIZE. The rest of the body is left unread then, the view answers with the
+status stored in `request.upload_rejection`.
+"""
+import os
+
+from django.conf import settings
+from django.core.files.uploadhandler import StopUpload, TemporaryFileUploadHandler
+from django.http import QueryDict
+from django.utils.datastructures import MultiValueDict
+
+# leading bytes of the accepted content types
+SIGNATURES = {
+    'image/jpeg': (b'\xff\xd8\xff',),
+    'image/png': (b'\x89PNG\r\n\x1a\n',),
+    'image/gif': (b'GIF87a', b'GIF89a'),
+    'image/webp': (b'RIFF',),
+}
+
+
+def max_request_size():
+    # one file plus the operations and map fields
+    return settings.IMAGE_UPLOAD_MAX_SIZE + settings.DATA_UPLOAD_MAX_MEMORY_SIZE
+
+
+class LimitedUploadHandler(TemporaryFileUploadHandler):
+    def handle_raw_input(self, input_data, META, content_length, boundary, encoding=None):
+        if content_length > max_request_size():
+            self.request.upload_rejection = (413, "The upload is larger than {0} bytes".format(
+                settings.IMAGE_UPLOAD_MAX_SIZE))
+            return QueryDict(encoding=encoding), MultiValueDict()
+        return None
+
+    def new_file(self, field_name, file_name, content_type, *args, **kwargs):
+        if content_type not in settings.IMAGE_UPLOAD_CONTENT_TYPES:
+            self.reject(415, "Images have to be one of " + ", ".join(settings.IMAGE_UPLOAD_CONTENT_TYPES))
+        os.makedirs(settings.FILE_UPLOAD_TEMP_DIR, exist_ok=True)
+        super(LimitedUploadHandler, self).new_file(field_name, file_name, content_type, *args, **kwargs)
+
+    def receive_data_chunk(self, raw_data, start):
+        if start == 0 and not raw_data.startswith(SIGNATURES.get(self.content_type, ())):
+            self.reject(415, "The file is not a valid " + self.content_type)
+        if start + len(raw_data) > settings.IMAGE_UPLOAD_MAX_SIZE:
+            self.reject(413, "The upload is larger than {0} bytes".format(settings.IMAGE_UPLOAD_MAX_SIZE))
+        return super(LimitedUploadHandler, self).receive_data_chunk(raw_data, start)
+
+    def reject(self, status, message):
+        self.request.upload_rejection = (status, message)
+        # the parser closes and deletes the temporary file and leaves the rest of the body unread
+        raise StopUpload(connection_reset=True)
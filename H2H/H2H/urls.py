@@ -13,18 +13,24 @@ Including another URLconf
     1. Import the include() function: from django.urls import include, path
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
+from django.conf import settings
+from django.conf.urls.static import static
 from django.contrib import admin
 from django.urls import path
 from django.conf.urls import url
 from django.views.decorators.csrf import csrf_exempt
-from graphene_django.views import GraphQLView
-from graphene_file_upload.django import FileUploadGraphQLView
+
+from .views import GraphQLView, metrics
 
 import os
 
 urlpatterns = [
     path('admin/', admin.site.urls),
-    url(r'^graphql', csrf_exempt(FileUploadGraphQLView.as_view(graphiql=os.getenv('PRODUCTION', '0') == '0'))),
+    path('metrics', metrics),
+    url(r'^graphql', csrf_exempt(GraphQLView.as_view(graphiql=os.getenv('PRODUCTION', '0') == '0'))),
 ]
 
+# images of the LocalStorage backend, only served with DEBUG
+urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
+
 #urlpatterns.append(path('graphql/', csrf_exempt(GraphQLView.as_view(graphiql=os.getenv('PRODUCTION', '0') == '0'))))
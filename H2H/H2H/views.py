@@ -0,0 +1,140 @@
+import json
+import logging
+
+from django.conf import settings
+from django.http import Http404, HttpResponse, HttpResponseBadRequest
+from graphene_django.views import HttpError
+from graphene_file_upload.django import FileUploadGraphQLView
+from graphql.execution import ExecutionResult
+
+from . import metrics as metrics_registry
+from . import response_cache
+from .db_router import route_operation
+from .documents import document_backend
+from .metrics import OPERATION_DURATION
+from .persisted_queries import PersistedQueryError, resolve_persisted_query
+from .profiling import QueryRecorder, check_budget
+from .tracing import Tracer
+from .upload_handlers import LimitedUploadHandler
+
+logger = logging.getLogger(__name__)
+
+
+class GraphQLView(FileUploadGraphQLView):
+    """
+    The GraphQL endpoint. Records the SQL queries and resolver timings of every operation
+    and logs the operations that exceed the query budget or take too long.
+    Supports persisted queries, caches the parsed and validated documents and the
+    responses to anonymous discovery queries. Query operations read from the replicas.
+    Multipart uploads are streamed to disk and rejected early when they exceed the upload limits.
+    """
+
+    def __init__(self, *args, **kwargs):
+        kwargs.setdefault('backend', document_backend)
+        self.persisted_query_error = None
+        super(GraphQLView, self).__init__(*args, **kwargs)
+
+    def parse_body(self, request):
+        if self.get_content_type(request) == 'multipart/form-data':
+            # has to be set before request.POST parses the body
+            request.upload_handlers = [LimitedUploadHandler(request)]
+            request.POST  # parses the body with the handler, which may reject it
+            rejection = getattr(request, 'upload_rejection', None)
+            if rejection is not None:
+                status, message = rejection
+                raise HttpError(HttpResponse(status=status), message)
+        return super(GraphQLView, self).parse_body(request)
+
+    def get_graphql_params(self, request, data):
+        query, variables, operation_name, id = super(GraphQLView, self).get_graphql_params(request, data)
+        extensions = request.GET.get('extensions') or data.get('extensions')
+        if extensions and isinstance(extensions, str):
+            try:
+                extensions = json.loads(extensions)
+            except ValueError:
+                raise HttpError(HttpResponseBadRequest("Extensions are invalid JSON."))
+
+        self.persisted_query_error = None
+        try:
+            query = resolve_persisted_query(query, extensions)
+        except PersistedQueryError as e:
+            self.persisted_query_error = e
+            query = None
+        return query, variables, operation_name, id
+
+    def tracing_requested(self, request):
+        """Apollo tracing is opt-in: it has to be enabled and asked for with the X-GraphQL-Tracing header"""
+        return settings.GRAPHQL_TRACING and request.META.get('HTTP_X_GRAPHQL_TRACING') == '1'
+
+    def get_response(self, request, data, show_graphiql=False):
+        tracer = request.tracer = Tracer(resolvers=self.tracing_requested(request))
+        try:
+            result, status_code = super(GraphQLView, self).get_response(request, data, show_graphiql)
+        finally:
+            del request.tracer
+
+        duration = tracer.finish()
+        OPERATION_DURATION.observe(duration)
+        slow = settings.GRAPHQL_SLOW_OPERATION
+        if slow is not None and duration > slow:
+            logger.warning('Slow GraphQL operation %s took %.0f ms: %s',
+                           tracer.operation_name or '<anonymous>', duration * 1000, tracer.summary())
+
+        if result and tracer.resolvers is not None:
+            response = json.loads(result)
+            response.setdefault('extensions', {})['tracing'] = tracer.as_apollo_tracing()
+            result = self.json_encode(request, response, pretty=show_graphiql)
+        return result, status_code
+
+    def execute_graphql_request(self, request, data, query, variables, operation_name, *args, **kwargs):
+        if self.persisted_query_error is not None:
+            return ExecutionResult(errors=[self.persisted_query_error])
+        request.tracer.operation_name = operation_name
+
+        cache_key = self.response_cache_key(request, query, variables, operation_name)
+        if cache_key is not None:
+            cached = response_cache.get_response(cache_key)
+            if cached is not None:
+                return ExecutionResult(data=cached)
+
+        operation_type = self.operation_type(request, query, operation_name)
+        with QueryRecorder(operation_name) as recorder, route_operation(operation_type, request.user):
+            result = super(GraphQLView, self).execute_graphql_request(
+                request, data, query, variables, operation_name, *args, **kwargs
+            )
+        check_budget(recorder)
+
+        if cache_key is not None and result is not None and not result.errors and not result.invalid:
+            response_cache.set_response(cache_key, result.data)
+        return result
+
+    def operation_type(self, request, query, operation_name):
+        """Returns 'query', 'mutation' or None if the document is invalid, the parsed document is cached"""
+        if not query:
+            return None
+        try:
+            document = self.get_backend(request).document_from_string(self.schema, query)
+            return document.get_operation_type(operation_name)
+        except Exception:
+            return None  # the request fails anyway, the error is reported by execute_graphql_request
+
+    def response_cache_key(self, request, query, variables, operation_name):
+        """Returns the response cache key of an anonymous discovery query, otherwise None"""
+        if not query or request.user.is_authenticated or request.tracer.resolvers is not None:
+            return None  # a traced operation has to run to be traced
+        try:
+            document = self.get_backend(request).document_from_string(self.schema, query)
+        except Exception:
+            return None  # the request fails anyway, the error is reported by execute_graphql_request
+        return response_cache.response_cache_key(document, variables, operation_name)
+
+
+def metrics(request):
+    """
+    Prometheus metrics. Only answers requests made directly to the application server from
+    the machine itself, requests passing through nginx carry X-Forwarded-For.
+    """
+    if request.META.get('REMOTE_ADDR') not in settings.METRICS_ALLOWED_IPS or \
+            'HTTP_X_FORWARDED_FOR' in request.META:
+        raise Http404()
+    return HttpResponse(metrics_registry.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
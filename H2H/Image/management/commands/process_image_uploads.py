@@ -0,0 +1,61 @@
+import os
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Count
+
+from Image import uploads
+from Image.models import Image, ImageDerivative
+
+
+class Command(BaseCommand):
+    help = 'Uploads the spooled images whose background upload was lost or failed.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--older-than', type=int, default=300,
+            help='only images spooled at least this many seconds ago, younger ones are still queued in a worker'
+        )
+        parser.add_argument('--retry-failed', action='store_true', help='upload failed images again')
+        parser.add_argument(
+            '--derivatives', action='store_true',
+            help='create the missing renditions of ready images, needs a storage backend with url transforms'
+        )
+
+    def handle(self, *args, **options):
+        if options['retry_failed']:
+            Image.objects.filter(status=Image.FAILED).update(status=Image.PENDING)
+
+        spooled_before = time.time() - options['older_than']
+        ready = failed = 0
+        for image in Image.objects.filter(status=Image.PENDING).order_by('id'):
+            if not os.path.exists(image.spool_path):
+                Image.objects.filter(pk=image.pk, status=Image.PENDING).update(status=Image.FAILED)
+                failed += 1
+                self.stderr.write('Image {0}: the spooled file {1} is missing'.format(image.pk, image.spool_path))
+                continue
+            if os.path.getmtime(image.spool_path) > spooled_before:
+                continue
+            try:
+                uploads.process_upload(image.pk)
+            except Exception as e:
+                failed += 1
+                self.stderr.write('Image {0}: {1}'.format(image.pk, e))
+            else:
+                ready += 1
+        self.stdout.write(self.style.SUCCESS('{0} images uploaded, {1} failed'.format(ready, failed)))
+
+        if options['derivatives']:
+            self.create_derivatives()
+
+    def create_derivatives(self):
+        # the originals of ready images are not spooled anymore, Pillow can not render them here
+        if not hasattr(uploads.get_storage(), 'transform_url'):
+            raise CommandError('The storage backend can not transform images')
+        missing = Image.objects.filter(status=Image.READY).exclude(public_id='').annotate(
+            derivative_count=Count('derivatives')
+        ).filter(derivative_count__lt=len(ImageDerivative.BOXES))
+        created = 0
+        for image in missing.order_by('id').iterator():
+            created += len(uploads.create_derivatives(image))
+        self.stdout.write(self.style.SUCCESS('{0} derivatives created'.format(created)))
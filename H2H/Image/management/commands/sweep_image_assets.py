@@ -0,0 +1,104 @@
+import os
+from datetime import datetime, timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from Image import uploads
+from Image.models import Image, ImageDerivative, OrphanedAsset
+
+
+class Command(BaseCommand):
+    help = 'Removes the stored files of deleted and replaced images in batches.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=100, help='files removed per storage call')
+        parser.add_argument(
+            '--older-than', type=int, default=300,
+            help='only files queued or stored at least this many seconds ago, younger ones may still be in use by a worker'
+        )
+        parser.add_argument(
+            '--scan', action='store_true',
+            help='also list the folders of the storage and remove the files no image or derivative refers to'
+        )
+        parser.add_argument('--dry-run', action='store_true', help='only report the files that would be removed')
+
+    def handle(self, *args, **options):
+        before = timezone.now() - timedelta(seconds=options['older_than'])
+        batch_size = options['batch_size']
+
+        if options['scan']:
+            storage = uploads.get_storage()
+            unreferenced = 0
+            for folder in Image.FOLDERS:
+                batch = []
+                for public_id, stored_at in storage.assets(folder):
+                    if stored_at <= before:
+                        batch.append(public_id)
+                    if len(batch) >= batch_size:
+                        unreferenced += self.remove_unreferenced(storage, batch, options['dry_run'])
+                        batch = []
+                unreferenced += self.remove_unreferenced(storage, batch, options['dry_run'])
+            self.stdout.write('{0} unreferenced files {1}'.format(unreferenced, 'found' if options['dry_run'] else 'removed'))
+
+        removed = failed = 0
+        orphans = OrphanedAsset.objects.filter(created_at__lte=before).order_by('id')
+        last_id = 0
+        while True:
+            batch = list(orphans.filter(id__gt=last_id).values_list('id', flat=True)[:batch_size])
+            if not batch:
+                break
+            last_id = batch[-1]
+            if options['dry_run']:
+                removed += len(batch)
+                continue
+            try:
+                uploads.destroy_orphans(batch)
+            except Exception as e:
+                failed += len(batch)
+                self.stderr.write('Assets {0}-{1}: {2}'.format(batch[0], batch[-1], e))
+            else:
+                removed += len(batch)
+        self.stdout.write(self.style.SUCCESS('{0} queued files {1}, {2} failed'.format(
+            removed, 'found' if options['dry_run'] else 'removed', failed)))
+
+        spooled = self.remove_stale_spool(before, batch_size, options['dry_run'])
+        self.stdout.write('{0} stale spooled files {1}'.format(spooled, 'found' if options['dry_run'] else 'removed'))
+
+    def remove_unreferenced(self, storage, public_ids, dry_run):
+        # queued files are removed below
+        referenced = set(Image.objects.filter(public_id__in=public_ids).values_list('public_id', flat=True))
+        referenced.update(ImageDerivative.objects.filter(public_id__in=public_ids).values_list('public_id', flat=True))
+        referenced.update(OrphanedAsset.objects.filter(public_id__in=public_ids).values_list('public_id', flat=True))
+        unreferenced = [public_id for public_id in public_ids if public_id not in referenced]
+        if unreferenced and not dry_run:
+            storage.destroy_many(unreferenced)
+        return len(unreferenced)
+
+    def remove_stale_spool(self, before, batch_size, dry_run):
+        # spooled files no pending image refers to, their upload was rolled back
+        try:
+            names = os.listdir(settings.IMAGE_SPOOL_DIR)
+        except FileNotFoundError:
+            return 0
+        stale = []
+        for name in names:
+            path = os.path.join(settings.IMAGE_SPOOL_DIR, name)
+            try:
+                modified = datetime.fromtimestamp(os.stat(path).st_mtime, timezone.utc)
+            except FileNotFoundError:
+                continue  # uploaded or removed meanwhile
+            if os.path.isfile(path) and modified <= before:
+                stale.append(path)
+
+        removed = 0
+        for start in range(0, len(stale), batch_size):
+            batch = stale[start:start + batch_size]
+            referenced = set(Image.objects.filter(spool_path__in=batch).values_list('spool_path', flat=True))
+            for path in batch:
+                if path not in referenced:
+                    removed += 1
+                    if not dry_run:
+                        uploads.remove_spooled(path)
+        return removed
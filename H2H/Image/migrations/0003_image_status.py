@@ -0,0 +1,38 @@
+# Generated by Django 2.1.2 on 2019-02-01 11:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Image', '0002_auto_20181212_1811'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='image',
+            name='folder',
+            field=models.CharField(blank=True, max_length=200),
+        ),
+        migrations.AddField(
+            model_name='image',
+            name='spool_path',
+            field=models.CharField(blank=True, max_length=500),
+        ),
+        migrations.AddField(
+            model_name='image',
+            name='status',
+            field=models.IntegerField(choices=[(1, 'Pending'), (2, 'Ready'), (3, 'Failed')], default=2),
+        ),
+        migrations.AlterField(
+            model_name='image',
+            name='public_id',
+            field=models.TextField(blank=True),
+        ),
+        migrations.AlterField(
+            model_name='image',
+            name='url',
+            field=models.TextField(blank=True),
+        ),
+    ]
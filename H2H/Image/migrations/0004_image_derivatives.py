@@ -0,0 +1,44 @@
+# Generated by Django 2.1.2 on 2019-02-04 10:12
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Image', '0003_image_status'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ImageDerivative',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('size', models.CharField(choices=[('thumb', 'Thumbnail'), ('medium', 'Medium')], max_length=10)),
+                ('public_id', models.TextField(blank=True)),
+                ('url', models.TextField()),
+                ('width', models.PositiveIntegerField(blank=True, null=True)),
+                ('height', models.PositiveIntegerField(blank=True, null=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='image',
+            name='height',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='image',
+            name='width',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='imagederivative',
+            name='image',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='derivatives', to='Image.Image'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='imagederivative',
+            unique_together={('image', 'size')},
+        ),
+    ]
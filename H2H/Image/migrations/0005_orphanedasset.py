@@ -0,0 +1,21 @@
+# Generated by Django 2.1.2 on 2019-02-05 09:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Image', '0004_image_derivatives'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OrphanedAsset',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('public_id', models.TextField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+    ]
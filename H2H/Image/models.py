@@ -1,43 +1,127 @@
-import cloudinary
 from django.contrib.auth.models import User
-from django.db import models
-from django.db.models.signals import post_delete, pre_save
+from django.db import IntegrityError, models, transaction
+from django.db.models.signals import post_delete, post_save
 from django.dispatch import receiver
 
 from Organisation.models import Organisation
 from Event.models import Event
+from H2H import response_cache
+from . import uploads
+
+
+class ImageManager(models.Manager):
+    def set_for_owner(self, **fields):
+        """
+        Creates the image of an organisation, event or user, given as `organisation`, `event` or
+        `user` in `fields`, and deletes the image the owner had before in the same transaction.
+        The files of the old image are removed in the background, see OrphanedAsset.
+        """
+        owner = {name: fields[name] for name in ('organisation', 'event', 'user') if fields.get(name) is not None}
+        if len(owner) != 1:
+            raise Exception("An image belongs to exactly one organisation, event or user")
+        for attempt in range(2):
+            try:
+                with transaction.atomic():
+                    self.filter(**owner).delete()
+                    return self.create(**fields)
+            except IntegrityError:
+                # a concurrent upload of the same owner inserted its image first, replace that one
+                if attempt:
+                    raise
 
 
 class Image(models.Model):
-    public_id = models.TextField()
-    url = models.TextField() 
+    PENDING = 1
+    READY = 2
+    FAILED = 3
+    STATES = (
+        (PENDING, 'Pending'),
+        (READY, 'Ready'),
+        (FAILED, 'Failed'),
+    )
+    # storage folders of the uploads, one per kind of owner
+    FOLDERS = ('userProfiles', 'organisationProfiles', 'eventImages')
+
+    # empty until the upload pipeline has stored the image, see Image/uploads.py
+    public_id = models.TextField(blank=True)
+    url = models.TextField(blank=True)
+    status = models.IntegerField(choices=STATES, default=READY)
+    folder = models.CharField(max_length=200, blank=True)
+    spool_path = models.CharField(max_length=500, blank=True)
+    width = models.PositiveIntegerField(blank=True, null=True)
+    height = models.PositiveIntegerField(blank=True, null=True)
 
     organisation = models.OneToOneField(Organisation, on_delete=models.CASCADE, blank=True, null=True)
     event = models.OneToOneField(Event, on_delete=models.CASCADE, blank=True, null=True)
     user = models.OneToOneField(User, on_delete=models.CASCADE, blank=True, null=True)
 
+    objects = ImageManager()
+
+    def response_tags(self):
+        tags = ['events', 'organisations']
+        if self.event_id:
+            tags.append('event:{0}'.format(self.event_id))
+        return tags
+
+    def __str__(self):
+        return self.public_id
+
+
+class ImageDerivative(models.Model):
+    """A smaller rendition of an image, created by the upload pipeline."""
+    THUMB = 'thumb'
+    MEDIUM = 'medium'
+    SIZES = (
+        (THUMB, 'Thumbnail'),
+        (MEDIUM, 'Medium'),
+    )
+    # bounding boxes, the renditions keep the aspect ratio and are never larger than the original
+    BOXES = {
+        THUMB: (240, 240),
+        MEDIUM: (960, 960),
+    }
+
+    image = models.ForeignKey(Image, on_delete=models.CASCADE, related_name='derivatives')
+    size = models.CharField(max_length=10, choices=SIZES)
+    # empty for renditions the storage backend transforms from the original on request
+    public_id = models.TextField(blank=True)
+    url = models.TextField()
+    width = models.PositiveIntegerField(blank=True, null=True)
+    height = models.PositiveIntegerField(blank=True, null=True)
+
+    class Meta:
+        unique_together = ('image', 'size')
+
+    def __str__(self):
+        return str(self.image) + ' ' + self.size
+
+
+class OrphanedAsset(models.Model):
+    """
+    A stored file whose image was deleted or replaced. The rows are queued in the transaction
+    that deletes the image and removed in the background (see Image/uploads.py), the
+    `sweep_image_assets` command removes what is left.
+    """
+    public_id = models.TextField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
     def __str__(self):
         return self.public_id
 
 
+@receiver(post_delete, sender=ImageDerivative)
+def delete_derivative_file(sender, instance, *args, **kwargs):
+    if instance.public_id:
+        uploads.queue_destroy(instance.public_id)
+
+
 @receiver(post_delete, sender=Image)
 def delete_cloud_image(sender, instance, *args, **kwargs):
-    cloudinary.uploader.destroy(instance.public_id)
-
-
-@receiver(pre_save, sender=Image)
-def replace_on_upload(sender, instance, *args, **kwargs):
-    if instance.organisation:
-        organisation = Organisation.objects.get(id=instance.organisation.id)
-        if hasattr(organisation, 'image'):
-            organisation.image.delete()
-    
-    elif instance.event:
-        event = Event.objects.get(id=instance.event.id)
-        if hasattr(event, 'image'):
-            event.image.delete()
-
-    elif instance.user:
-        user = User.objects.get(id=instance.user.id)
-        if hasattr(user, 'image'):
-            user.image.delete()
+    uploads.remove_spooled(instance.spool_path)
+    if instance.public_id:
+        uploads.queue_destroy(instance.public_id)
+
+
+@receiver([post_save, post_delete], sender=Image)
+def invalidate_image_responses(sender, instance, *args, **kwargs):
+    response_cache.invalidate(*instance.response_tags())
@@ -3,29 +3,62 @@ from django.contrib.auth.models import User
 from graphene_django import DjangoObjectType
 from graphql_jwt.decorators import login_required
 from graphene_file_upload.scalars import Upload
-import cloudinary
 
+from H2H.loaders import get_loaders
+from H2H.optimizer import optimize_queryset
+from H2H.pagination import connection_args, paginate
 from Organisation.models import Organisation
+from Organisation.permissions import is_admin, is_member
 from Event.models import Event
-from .models import Image
+from . import uploads
+from .models import Image, ImageDerivative
+
+
+class ImageSize(graphene.Enum):
+    THUMB = ImageDerivative.THUMB
+    MEDIUM = ImageDerivative.MEDIUM
+    ORIGINAL = 'original'
 
 
 class ImageType(DjangoObjectType):
+    status = graphene.Int()
+    url = graphene.String(size=ImageSize(default_value=ImageSize.ORIGINAL.value))
+
     class Meta:
         model = Image
+        exclude_fields = ('folder', 'spool_path', 'derivatives')
+
+    def resolve_status(self, info, **kwargs):
+        return self.status
+
+    def resolve_url(self, info, size=ImageSize.ORIGINAL.value):
+        """Url of the rendition of `size`, the original if the image has none (yet)."""
+        if size == ImageSize.ORIGINAL.value:
+            return self.url
+        original = self.url
+        return get_loaders(info).derivatives_by_image.load(self.id).then(
+            lambda derivatives: derivatives[size].url if size in derivatives else original
+        )
+
+
+class ImageConnection(graphene.relay.Connection):
+    class Meta:
+        node = ImageType
 
 
 class UploadImage(graphene.Mutation):
     """
-    This mutation handles file input. The transferred file is uploaded to cloudinary and
-    a server-side Image object is created. Depending on whether an organisation or event Id
-    was part of the mutation, the model establishes a one-to-one field to the respective entity.
+    This mutation handles file input. The transferred file is spooled and a pending server-side
+    Image object is created at once, the upload to cloudinary happens in the background (see
+    Image/uploads.py). Depending on whether an organisation or event Id was part of the
+    mutation, the model establishes a one-to-one field to the respective entity.
     If no Id was given, the image references the auth user.
     """
 
     id = graphene.ID()
     public_id = graphene.String()
     url = graphene.String()
+    status = graphene.Int()
     organisation = graphene.Field('Organisation.schema.OrganisationType')
     event = graphene.Field('Event.schema.EventType')
     user = graphene.Field('User.schema.UserType')
@@ -48,31 +81,41 @@ class UploadImage(graphene.Mutation):
 
         if organisation_id:
             organisation = Organisation.objects.get(id=organisation_id)
-            if user not in organisation.members.all():
+            if not is_member(info, organisation):
                  raise Exception(f"You need to be a member of {organisation.name} to upload the image")
             folder = 'organisationProfiles'
             user = None
         elif event_id:
             event = Event.objects.get(id=event_id)
-            if user not in event.organisation.members.all():
-                 raise Exception(f"You need to be a member of {organisation.name} to upload the image")
+            if not is_member(info, event.organisation_id):
+                 raise Exception(f"You need to be a member of {event.organisation} to upload the image")
             folder = 'eventImages'
             user = None
 
-        cloud_img = cloudinary.uploader.upload(image, folder=folder)
-
-        server_img = Image.objects.create(
-            public_id=cloud_img.get('public_id'),
-            url=cloud_img.get('secure_url'),
-            organisation=organisation,
-            event=event,
-            user=user,
-        )
+        # the image is pending until the upload pipeline has pushed the spooled file to the storage,
+        # the image the owner had before is replaced and its files are removed in the background
+        spool_path = uploads.spool(image)
+        try:
+            server_img = Image.objects.set_for_owner(
+                status=Image.PENDING,
+                folder=folder,
+                spool_path=spool_path,
+                organisation=organisation,
+                event=event,
+                user=user,
+            )
+        except Exception:
+            # no image refers to the file, rolled back callers leave theirs to sweep_image_assets
+            uploads.remove_spooled(spool_path)
+            raise
+        uploads.queue_upload(server_img)
+        server_img.refresh_from_db(fields=['public_id', 'url', 'status'])  # eager uploads are done already
 
         return UploadImage(
             id=server_img.id,
             public_id=server_img.public_id, 
             url=server_img.url, 
+            status=server_img.status,
             organisation=server_img.organisation, 
             event=server_img.event,
             user=server_img.user
@@ -97,7 +140,7 @@ class DeleteImage(graphene.Mutation):
         if event and event.creator != user:
             raise Exception("You need to be the event creator to delete this image")
 
-        if organisation and organisation.admin != user:
+        if organisation and not is_admin(info, organisation):
             raise Exception("You need to be the admin of this organisation to delete this image")
 
         if img_user and img_user != user:
@@ -109,9 +152,14 @@ class DeleteImage(graphene.Mutation):
 
 class Query(graphene.ObjectType):
     images = graphene.List(ImageType)
+    images_connection = graphene.Field(ImageConnection, **connection_args())
 
     def resolve_images(self, info):
-        return Image.objects.all()
+        return optimize_queryset(Image.objects.all(), info)
+
+    def resolve_images_connection(self, info, first=None, after=None):
+        images = optimize_queryset(Image.objects.all(), info, path=('edges', 'node'))
+        return paginate(ImageConnection, images, 'id', first, after)
 
 
 class Mutation(graphene.AbstractType):
@@ -0,0 +1,90 @@
+"""
+Storage backends of the images, selected with IMAGE_STORAGE_BACKEND.
+
+A backend uploads an open binary file into a folder and returns its public id, url, width and
+height (None if unknown), destroys the files of public ids and lists the stored files of a
+folder. Backends that can scale images
+themselves have `transform_url`, the upload pipeline renders the smaller sizes with Pillow for
+the others. CloudinaryStorage is used in production, LocalStorage keeps the files below
+MEDIA_ROOT and lets the upload pipeline run offline.
+"""
+import glob
+import os
+import shutil
+import uuid
+from datetime import datetime, timezone
+
+import cloudinary
+import cloudinary.api
+import cloudinary.uploader
+from django.conf import settings
+from django.utils.dateparse import parse_datetime
+from django.utils.module_loading import import_string
+
+
+class CloudinaryStorage:
+    def upload(self, file, folder):
+        # sent in parts of IMAGE_UPLOAD_CHUNK_SIZE, large files are never read into memory at once
+        result = cloudinary.uploader.upload_large(file, folder=folder, chunk_size=settings.IMAGE_UPLOAD_CHUNK_SIZE)
+        return result.get('public_id'), result.get('secure_url'), result.get('width'), result.get('height')
+
+    def transform_url(self, public_id, box):
+        """Returns the url of the image scaled down into `box`, cloudinary renders and caches it on first request."""
+        width, height = box
+        return cloudinary.CloudinaryImage(public_id).build_url(
+            width=width, height=height, crop='limit', fetch_format='auto', quality='auto', secure=True
+        )
+
+    def destroy(self, public_id):
+        cloudinary.uploader.destroy(public_id)
+
+    def destroy_many(self, public_ids):
+        # the admin api deletes up to 100 resources per call
+        for start in range(0, len(public_ids), 100):
+            cloudinary.api.delete_resources(public_ids[start:start + 100])
+
+    def assets(self, folder):
+        """Yields the public id and upload time of every file in `folder`."""
+        cursor = None
+        while True:
+            result = cloudinary.api.resources(
+                type='upload', prefix=folder + '/', max_results=500, next_cursor=cursor
+            )
+            for resource in result.get('resources', []):
+                yield resource['public_id'], parse_datetime(resource['created_at'])
+            cursor = result.get('next_cursor')
+            if not cursor:
+                return
+
+
+class LocalStorage:
+    def __init__(self, root=None, base_url=None):
+        self.root = root or settings.MEDIA_ROOT
+        self.base_url = base_url or settings.MEDIA_URL
+
+    def upload(self, file, folder):
+        public_id = '{0}/{1}'.format(folder, uuid.uuid4().hex)
+        name = public_id + os.path.splitext(file.name)[1].lower()
+        target = os.path.join(self.root, name)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        with open(target, 'wb') as stored:
+            shutil.copyfileobj(file, stored)
+        return public_id, self.base_url + name, None, None
+
+    def destroy(self, public_id):
+        for path in glob.glob(os.path.join(self.root, glob.escape(public_id)) + '.*'):
+            os.remove(path)
+
+    def destroy_many(self, public_ids):
+        for public_id in public_ids:
+            self.destroy(public_id)
+
+    def assets(self, folder):
+        """Yields the public id and modification time of every file in `folder`."""
+        for path in glob.glob(os.path.join(self.root, glob.escape(folder), '*')):
+            public_id = '{0}/{1}'.format(folder, os.path.splitext(os.path.basename(path))[0])
+            yield public_id, datetime.fromtimestamp(os.path.getmtime(path), timezone.utc)
+
+
+def get_storage():
+    return import_string(settings.IMAGE_STORAGE_BACKEND)()
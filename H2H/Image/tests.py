@@ -1,3 +1,271 @@
-from django.test import TestCase
+import io
+import json
+import os
+import shutil
+import tempfile
+from unittest import mock, skipIf
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import IntegrityError
+from django.test import Client, override_settings
+from graphql_jwt.shortcuts import get_token
+
+from H2H.testcases import GraphQLTestCase
+from Image import uploads
+from Image.models import Image, ImageDerivative, OrphanedAsset
+from Image.storage import CloudinaryStorage, LocalStorage
+
+PNG = b'\x89PNG\r\n\x1a\n' + b'\x00' * 100
+
+
+class TransformingStorage(LocalStorage):
+    """LocalStorage with the url transforms of a backend like cloudinary"""
+
+    def upload(self, file, folder):
+        public_id, url, width, height = super(TransformingStorage, self).upload(file, folder)
+        return public_id, url, 2000, 1000
+
+    def transform_url(self, public_id, box):
+        return '/media/{0}?box={1}x{2}'.format(public_id, *box)
+
+
+class ImageTests(GraphQLTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create(username='test_user', password='test_password')
+
+    def setUp(self):
+        self.client.authenticate(self.user)
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        settings = override_settings(
+            IMAGE_STORAGE_BACKEND='Image.storage.LocalStorage',
+            IMAGE_SPOOL_DIR=os.path.join(self.directory, 'spool'),
+            MEDIA_ROOT=os.path.join(self.directory, 'media'),
+            IMAGE_UPLOAD_EAGER=True,
+        )
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+    def stored_path(self, image):
+        return os.path.join(self.directory, 'media', image.url[len('/media/'):])
+
+    def test_upload_image(self):
+        resp = self.client.execute(
+            """
+            mutation upload($image: Upload!) {
+                uploadImage(image: $image) {
+                    id
+                    url
+                    status
+                }
+            }
+            """,
+            variables={'image': SimpleUploadedFile('profile.PNG', b'png data')}
+        )
+
+        self.assertEqual(resp.data['uploadImage']['status'], Image.READY)
+        image = Image.objects.get(id=resp.data['uploadImage']['id'])
+        self.assertTrue(image.url.startswith('/media/userProfiles/') and image.url.endswith('.png'))
+        with open(self.stored_path(image), 'rb') as stored:
+            self.assertEqual(stored.read(), b'png data')
+        self.assertEqual(os.listdir(os.path.join(self.directory, 'spool')), [])
+
+        image.delete()
+        self.assertFalse(os.path.exists(self.stored_path(image)))
+
+    def test_replace_image(self):
+        upload = """
+            mutation upload($image: Upload!) {
+                uploadImage(image: $image) {
+                    id
+                }
+            }
+        """
+        first = self.client.execute(upload, variables={'image': SimpleUploadedFile('first.png', b'first')})
+        old_image = Image.objects.get(id=first.data['uploadImage']['id'])
+
+        second = self.client.execute(upload, variables={'image': SimpleUploadedFile('second.png', b'second')})
+
+        new_image = Image.objects.get(user=self.user)
+        self.assertEqual(str(new_image.id), second.data['uploadImage']['id'])
+        self.assertFalse(Image.objects.filter(id=old_image.id).exists())
+        self.assertFalse(os.path.exists(self.stored_path(old_image)))
+        self.assertFalse(OrphanedAsset.objects.exists())
+
+        # savepoint, old image, its derivatives, delete, queued file, insert, release
+        with self.settings(IMAGE_UPLOAD_EAGER=False), self.assertNumQueries(7):
+            Image.objects.set_for_owner(user=self.user, status=Image.PENDING)
+        self.assertEqual(list(OrphanedAsset.objects.values_list('public_id', flat=True)), [new_image.public_id])
+
+    def test_sweep_image_assets_command(self):
+        storage = LocalStorage()
+        stored = {
+            name: storage.upload(SimpleUploadedFile(name + '.png', PNG), 'eventImages')
+            for name in ('kept', 'queued', 'stray')
+        }
+        Image.objects.create(public_id=stored['kept'][0], url=stored['kept'][1], user=self.user)
+        with override_settings(IMAGE_UPLOAD_EAGER=False):  # queued by a worker that stopped
+            uploads.queue_destroy(stored['queued'][0])
+
+        call_command('sweep_image_assets', '--older-than', '0', '--scan', '--batch-size', '1', stdout=open(os.devnull, 'w'))
+
+        self.assertFalse(OrphanedAsset.objects.exists())
+        self.assertEqual(
+            {name: os.path.exists(self.stored_path(Image(url=url))) for name, (public_id, url, _, _) in stored.items()},
+            {'kept': True, 'queued': False, 'stray': False}
+        )
+
+    def test_sweep_stale_spooled_files(self):
+        pending = Image.objects.create(user=self.user, spool_path=uploads.spool(SimpleUploadedFile('pending.png', PNG)))
+        rolled_back = uploads.spool(SimpleUploadedFile('rolled_back.png', PNG))
+
+        call_command('sweep_image_assets', '--older-than', '3600', stdout=open(os.devnull, 'w'))
+        self.assertTrue(os.path.exists(rolled_back))  # may still be inserted by its upload
+        call_command('sweep_image_assets', '--older-than', '0', stdout=open(os.devnull, 'w'))
+
+        self.assertTrue(os.path.exists(pending.spool_path))
+        self.assertFalse(os.path.exists(rolled_back))
+
+    def test_upload_image_failed_insert(self):
+        with mock.patch.object(Image.objects, 'set_for_owner', side_effect=IntegrityError('duplicate key')):
+            resp = self.client.execute(
+                """
+                mutation upload($image: Upload!) {
+                    uploadImage(image: $image) {
+                        id
+                    }
+                }
+                """,
+                variables={'image': SimpleUploadedFile('profile.png', PNG)}
+            )
+
+        self.assertTrue(resp.errors)
+        self.assertEqual(os.listdir(os.path.join(self.directory, 'spool')), [])
+
+    def test_process_image_uploads_command(self):
+        with override_settings(IMAGE_UPLOAD_EAGER=False):
+            image = Image.objects.create(
+                status=Image.PENDING, folder='userProfiles', user=self.user,
+                spool_path=uploads.spool(SimpleUploadedFile('profile.jpg', b'jpg data'))
+            )
+
+        call_command('process_image_uploads', '--older-than', '0', stdout=open(os.devnull, 'w'))
+
+        image.refresh_from_db()
+        self.assertEqual((image.status, image.spool_path), (Image.READY, ''))
+        self.assertTrue(os.path.exists(self.stored_path(image)))
+
+    def post_upload(self, file):
+        operations = {
+            'query': 'mutation upload($image: Upload!) { uploadImage(image: $image) { id status } }',
+            'variables': {'image': None},
+        }
+        return Client().post('/graphql', data={
+            'operations': json.dumps(operations),
+            'map': json.dumps({'0': ['variables.image']}),
+            '0': file,
+        }, HTTP_AUTHORIZATION='JWT ' + get_token(self.user))
+
+    def test_upload_image_multipart(self):
+        resp = self.post_upload(SimpleUploadedFile('profile.png', PNG, content_type='image/png'))
+
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp.json()['data']['uploadImage']['status'], Image.READY)
+        # the temporary file of the upload handler was moved into the spool and uploaded from there
+        self.assertEqual(os.listdir(os.path.join(self.directory, 'spool')), [])
+
+    def test_upload_limits(self):
+        resp_0 = self.post_upload(SimpleUploadedFile('profile.png', b'not an image', content_type='image/png'))
+        resp_1 = self.post_upload(SimpleUploadedFile('profile.txt', PNG, content_type='text/plain'))
+        with self.settings(IMAGE_UPLOAD_MAX_SIZE=len(PNG) - 1):
+            resp_2 = self.post_upload(SimpleUploadedFile('profile.png', PNG, content_type='image/png'))
+        with self.settings(IMAGE_UPLOAD_MAX_SIZE=0, DATA_UPLOAD_MAX_MEMORY_SIZE=10):
+            resp_3 = self.post_upload(SimpleUploadedFile('profile.png', PNG, content_type='image/png'))
+
+        self.assertEqual([resp.status_code for resp in (resp_0, resp_1, resp_2, resp_3)], [415, 415, 413, 413])
+        self.assertEqual(resp_2.json()['errors'][0]['message'], "The upload is larger than {0} bytes".format(len(PNG) - 1))
+        self.assertFalse(Image.objects.exists())
+
+    def test_image_url_sizes(self):
+        with self.settings(IMAGE_STORAGE_BACKEND='Image.tests.TransformingStorage'):
+            with_derivatives = Image.objects.create(
+                status=Image.PENDING, folder='userProfiles', user=self.user,
+                spool_path=uploads.spool(SimpleUploadedFile('profile.png', PNG))
+            )
+            uploads.process_upload(with_derivatives.id)
+        without_derivatives = Image.objects.create(public_id='plain', url='/media/plain.png')
+
+        with_derivatives.refresh_from_db()
+        self.assertEqual((with_derivatives.width, with_derivatives.height), (2000, 1000))
+        self.assertEqual(
+            sorted(with_derivatives.derivatives.values_list('size', 'width', 'height')),
+            [(ImageDerivative.MEDIUM, 960, 480), (ImageDerivative.THUMB, 240, 120)]
+        )
+
+        query = """
+            {
+                images {
+                    id
+                    url
+                    thumb: url(size: THUMB)
+                    medium: url(size: MEDIUM)
+                }
+            }
+        """
+        with self.assertNumQueries(3):  # user, images and one query for the derivatives of all of them
+            resp = self.client.execute(query)
+        urls = {image['id']: image for image in resp.data['images']}
+
+        self.assertEqual(urls[str(with_derivatives.id)]['url'], with_derivatives.url)
+        self.assertEqual(
+            urls[str(with_derivatives.id)]['thumb'], '/media/{0}?box=240x240'.format(with_derivatives.public_id)
+        )
+        # images without renditions fall back to the original
+        self.assertEqual(urls[str(without_derivatives.id)]['thumb'], '/media/plain.png')
+        self.assertEqual(urls[str(without_derivatives.id)]['medium'], '/media/plain.png')
+
+    def test_process_image_uploads_derivatives(self):
+        image = Image.objects.create(public_id='userProfiles/old', url='/media/userProfiles/old.png', user=self.user)
+
+        with self.settings(IMAGE_STORAGE_BACKEND='Image.tests.TransformingStorage'):
+            call_command('process_image_uploads', '--derivatives', stdout=open(os.devnull, 'w'))
+            call_command('process_image_uploads', '--derivatives', stdout=open(os.devnull, 'w'))
+
+        self.assertEqual(
+            sorted(image.derivatives.values_list('size', 'url')),
+            [(ImageDerivative.MEDIUM, '/media/userProfiles/old?box=960x960'),
+             (ImageDerivative.THUMB, '/media/userProfiles/old?box=240x240')]
+        )
+
+    def test_cloudinary_transform_url(self):
+        url = CloudinaryStorage().transform_url('eventImages/abc', (240, 240))
+
+        self.assertTrue(url.startswith('https://'))
+        self.assertIn('c_limit', url)
+        self.assertIn('h_240', url)
+        self.assertIn('w_240', url)
+        self.assertTrue(url.endswith('/eventImages/abc'))
+
+    @skipIf(uploads.PILImage is None, 'Pillow is not installed')
+    def test_rendered_derivatives(self):
+        spooled = io.BytesIO()
+        uploads.PILImage.new('RGB', (1200, 600)).save(spooled, format='PNG')
+        image = Image.objects.create(
+            status=Image.PENDING, folder='userProfiles', user=self.user,
+            spool_path=uploads.spool(SimpleUploadedFile('profile.png', spooled.getvalue()))
+        )
+
+        uploads.process_upload(image.id)
+
+        image.refresh_from_db()
+        self.assertEqual((image.width, image.height), (1200, 600))
+        thumb = image.derivatives.get(size=ImageDerivative.THUMB)
+        self.assertEqual((thumb.width, thumb.height), (240, 120))
+        self.assertTrue(os.path.exists(self.stored_path(thumb)))
+        self.assertEqual(os.listdir(os.path.join(self.directory, 'spool')), [])
+
+        image.delete()
+        self.assertFalse(os.path.exists(self.stored_path(thumb)))
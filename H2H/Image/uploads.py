@@ -0,0 +1,202 @@
+"""
+Background pipeline of the image uploads.
+
+UploadImage only spools the file into IMAGE_SPOOL_DIR and creates a pending Image. Once the
+transaction is committed a thread of the worker pool pushes the spooled file to the storage
+backend, marks the image ready with its url and creates the smaller renditions (see
+`create_derivatives`). The files of deleted or replaced images are queued as OrphanedAssets in
+the deleting transaction and destroyed by the pool the same way. With IMAGE_UPLOAD_EAGER the
+tasks run at once in the calling thread.
+
+The pool lives in memory, tasks of a process that stops are lost. `process_image_uploads`
+uploads the images that are still pending after a while, `sweep_image_assets` removes the
+orphaned files that are still queued and the spooled files of uploads whose transaction was
+rolled back. Both can run periodically.
+"""
+import logging
+import os
+import shutil
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+
+from H2H import response_cache
+from .storage import get_storage
+
+try:
+    from PIL import Image as PILImage
+except ImportError:  # Pillow is optional, without it only backends with transforms get smaller renditions
+    PILImage = None
+
+logger = logging.getLogger('H2H.images')
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            # created on first use, so every forked gunicorn worker gets its own threads
+            _executor = ThreadPoolExecutor(max_workers=settings.IMAGE_UPLOAD_WORKERS, thread_name_prefix='images')
+        return _executor
+
+
+def _run(task, *args):
+    try:
+        task(*args)
+    except Exception:
+        logger.exception('Image task %s%r failed', task.__name__, args)
+    finally:
+        close_old_connections()
+
+
+def submit(task, *args):
+    """Runs `task(*args)` in the worker pool once the current transaction is committed."""
+    if settings.IMAGE_UPLOAD_EAGER:
+        task(*args)
+    else:
+        transaction.on_commit(lambda: get_executor().submit(_run, task, *args))
+
+
+def spool(uploaded_file):
+    """Writes an uploaded file into the spool directory and returns its path."""
+    os.makedirs(settings.IMAGE_SPOOL_DIR, exist_ok=True)
+    extension = os.path.splitext(uploaded_file.name or '')[1].lower()
+    path = os.path.join(settings.IMAGE_SPOOL_DIR, uuid.uuid4().hex + extension)
+    if hasattr(uploaded_file, 'temporary_file_path'):
+        # streamed to disk by the upload handler already, next to the spool in FILE_UPLOAD_TEMP_DIR
+        shutil.move(uploaded_file.temporary_file_path(), path)
+        return path
+    with open(path, 'wb') as spooled:
+        for chunk in uploaded_file.chunks():
+            spooled.write(chunk)
+    return path
+
+
+def remove_spooled(path):
+    if path:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+
+def process_upload(image_id):
+    """
+    Uploads the spooled file of a pending image and marks it ready, or failed if the upload
+    raises. The smaller renditions are created from the spooled file right after.
+    """
+    from .models import Image
+
+    image = Image.objects.filter(pk=image_id, status=Image.PENDING).first()
+    if image is None:
+        return
+    try:
+        with open(image.spool_path, 'rb') as spooled:
+            public_id, url, width, height = get_storage().upload(spooled, image.folder)
+        if width is None and PILImage is not None:
+            width, height = _dimensions(image.spool_path)
+    except Exception:
+        Image.objects.filter(pk=image_id, status=Image.PENDING).update(status=Image.FAILED)
+        raise
+
+    updated = Image.objects.filter(pk=image_id, status=Image.PENDING).update(
+        public_id=public_id, url=url, width=width, height=height, status=Image.READY, spool_path=''
+    )
+    if not updated:  # deleted or replaced during the upload
+        get_storage().destroy(public_id)
+        return
+    image.public_id, image.url, image.width, image.height = public_id, url, width, height
+    try:
+        create_derivatives(image, image.spool_path)
+    except Exception:
+        # the image is usable without them, `url(size:)` falls back to the original
+        logger.exception('Creating the derivatives of image %s failed', image_id)
+    finally:
+        remove_spooled(image.spool_path)
+        response_cache.invalidate(*image.response_tags())
+
+
+def fit(width, height, box):
+    """Returns the size of a width x height image scaled down into `box`, keeping the aspect ratio."""
+    scale = min(1.0, box[0] / width, box[1] / height)
+    return max(1, round(width * scale)), max(1, round(height * scale))
+
+
+def _dimensions(path):
+    try:
+        with PILImage.open(path) as original:
+            return original.size
+    except OSError:
+        return None, None
+
+
+def _render(storage, path, folder, box):
+    """Scales the image at `path` down into `box` with Pillow and uploads the rendition."""
+    extension = os.path.splitext(path)[1]
+    rendition_path = os.path.join(settings.IMAGE_SPOOL_DIR, uuid.uuid4().hex + extension)
+    try:
+        with PILImage.open(path) as original:
+            image_format = original.format
+            rendition = original.copy()
+        rendition.thumbnail(box)
+        rendition.save(rendition_path, format=image_format)
+        with open(rendition_path, 'rb') as rendered:
+            public_id, url, width, height = storage.upload(rendered, folder)
+        return public_id, url, rendition.width, rendition.height
+    finally:
+        remove_spooled(rendition_path)
+
+
+def create_derivatives(image, spooled_path=None):
+    """
+    Creates the missing renditions of ImageDerivative.BOXES for a ready image. Backends with
+    `transform_url` only need the url, otherwise the spooled original is rendered with Pillow.
+    Without either the image keeps only its original.
+    """
+    from .models import ImageDerivative
+
+    storage = get_storage()
+    existing = set(image.derivatives.values_list('size', flat=True))
+    derivatives = []
+    for size, box in sorted(ImageDerivative.BOXES.items()):
+        if size in existing:
+            continue
+        if hasattr(storage, 'transform_url'):
+            width, height = fit(image.width, image.height, box) if image.width and image.height else (None, None)
+            derivatives.append(ImageDerivative(
+                image=image, size=size, url=storage.transform_url(image.public_id, box), width=width, height=height
+            ))
+        elif PILImage is not None and spooled_path:
+            public_id, url, width, height = _render(storage, spooled_path, image.folder, box)
+            derivatives.append(ImageDerivative(
+                image=image, size=size, public_id=public_id, url=url, width=width, height=height
+            ))
+    ImageDerivative.objects.bulk_create(derivatives)
+    return derivatives
+
+
+def destroy_orphans(asset_ids):
+    """Removes the files of the queued OrphanedAssets, failed ones stay queued for the sweeper."""
+    from .models import OrphanedAsset
+
+    assets = list(OrphanedAsset.objects.filter(pk__in=asset_ids))
+    if assets:
+        get_storage().destroy_many([asset.public_id for asset in assets])
+        OrphanedAsset.objects.filter(pk__in=[asset.pk for asset in assets]).delete()
+
+
+def queue_upload(image):
+    submit(process_upload, image.pk)
+
+
+def queue_destroy(public_id):
+    from .models import OrphanedAsset
+
+    asset = OrphanedAsset.objects.create(public_id=public_id)
+    submit(destroy_orphans, [asset.pk])
@@ -0,0 +1,132 @@
+"""
+Batched great circle and ellipsoidal distances.
+
+`distances_km` computes the distances of many points to one point at once. With numpy
+installed the formulas run as array operations, otherwise as a plain python loop.
+
+Modes:
+    haversine   spherical earth, up to 0.5% off
+    ellipsoidal Lambert's formula on the WGS-84 ellipsoid, agrees with geopy's geodesic
+                up to a few metres below 5000 km (see `max_error_km`). It gets worse towards
+                antipodal points, distances above GEODESIC_FALLBACK_KM are left to geopy.
+"""
+import math
+
+import geopy.distance
+from django.conf import settings
+
+try:
+    import numpy
+except ImportError:  # numpy is optional, the python fallback gives the same results
+    numpy = None
+
+EARTH_RADIUS_KM = 6371.0088
+WGS84_A_KM = 6378.137
+WGS84_F = 1 / 298.257223563
+
+# Lambert is off by hundreds of metres for nearly antipodal points
+GEODESIC_FALLBACK_KM = 15000
+
+HAVERSINE = 'haversine'
+ELLIPSOIDAL = 'ellipsoidal'
+
+
+def _haversine_numpy(latitudes, longitudes, latitude, longitude):
+    """Central angles in radians between the arrays of coordinates and one coordinate, all in radians."""
+    a = numpy.sin((latitudes - latitude) / 2) ** 2 + \
+        numpy.cos(latitudes) * math.cos(latitude) * numpy.sin((longitudes - longitude) / 2) ** 2
+    return 2 * numpy.arcsin(numpy.sqrt(numpy.minimum(a, 1.0)))
+
+
+def _haversine(latitude_1, longitude_1, latitude_2, longitude_2):
+    a = math.sin((latitude_1 - latitude_2) / 2) ** 2 + \
+        math.cos(latitude_1) * math.cos(latitude_2) * math.sin((longitude_1 - longitude_2) / 2) ** 2
+    return 2 * math.asin(math.sqrt(min(a, 1.0)))
+
+
+def _reduced_latitude(latitude):
+    return math.atan((1 - WGS84_F) * math.tan(latitude))
+
+
+def _lambert(sigma, beta_1, beta_2):
+    """Lambert's correction of the central angle `sigma` between two reduced latitudes, in km."""
+    if sigma == 0:
+        return 0.0
+    p = (beta_1 + beta_2) / 2
+    q = (beta_2 - beta_1) / 2
+    x = (sigma - math.sin(sigma)) * math.sin(p) ** 2 * math.cos(q) ** 2 / math.cos(sigma / 2) ** 2
+    y = (sigma + math.sin(sigma)) * math.cos(p) ** 2 * math.sin(q) ** 2 / math.sin(sigma / 2) ** 2
+    return WGS84_A_KM * (sigma - WGS84_F / 2 * (x + y))
+
+
+def _distances_numpy(points, to, mode):
+    coordinates = numpy.radians(numpy.asarray(points, dtype=float))
+    latitudes, longitudes = coordinates[:, 0], coordinates[:, 1]
+    latitude, longitude = math.radians(to[0]), math.radians(to[1])
+
+    if mode == HAVERSINE:
+        return EARTH_RADIUS_KM * _haversine_numpy(latitudes, longitudes, latitude, longitude)
+
+    betas = numpy.arctan((1 - WGS84_F) * numpy.tan(latitudes))
+    beta = _reduced_latitude(latitude)
+    sigma = _haversine_numpy(betas, longitudes, beta, longitude)
+    p = (betas + beta) / 2
+    q = (beta - betas) / 2
+    with numpy.errstate(divide='ignore', invalid='ignore'):
+        x = (sigma - numpy.sin(sigma)) * numpy.sin(p) ** 2 * numpy.cos(q) ** 2 / numpy.cos(sigma / 2) ** 2
+        y = (sigma + numpy.sin(sigma)) * numpy.cos(p) ** 2 * numpy.sin(q) ** 2 / numpy.sin(sigma / 2) ** 2
+        distances = WGS84_A_KM * (sigma - WGS84_F / 2 * (x + y))
+    return numpy.where(sigma == 0, 0.0, distances)
+
+
+def _distances_python(points, to, mode):
+    latitude, longitude = math.radians(to[0]), math.radians(to[1])
+    if mode == HAVERSINE:
+        return [
+            EARTH_RADIUS_KM * _haversine(math.radians(lat), math.radians(lon), latitude, longitude)
+            for lat, lon in points
+        ]
+
+    beta = _reduced_latitude(latitude)
+    distances = []
+    for lat, lon in points:
+        beta_point = _reduced_latitude(math.radians(lat))
+        sigma = _haversine(beta_point, math.radians(lon), beta, longitude)
+        distances.append(_lambert(sigma, beta_point, beta))
+    return distances
+
+
+def distances_km(points, to, mode=None):
+    """
+    Returns the distances in km of the (latitude, longitude) pairs in `points` to the pair `to`.
+    `mode` defaults to settings.LOCATION_DISTANCE_MODE.
+    """
+    mode = mode or settings.LOCATION_DISTANCE_MODE
+    if mode not in (HAVERSINE, ELLIPSOIDAL):
+        raise Exception("Unknown distance mode " + str(mode))
+    points = [(float(lat), float(lon)) for lat, lon in points]
+    to = (float(to[0]), float(to[1]))
+    if not points:
+        return []
+    if numpy is not None:
+        distances = [float(d) for d in _distances_numpy(points, to, mode)]
+    else:
+        distances = _distances_python(points, to, mode)
+
+    if mode == ELLIPSOIDAL:
+        for i, distance in enumerate(distances):
+            if distance > GEODESIC_FALLBACK_KM:
+                distances[i] = geopy.distance.geodesic(points[i], to).km
+    return distances
+
+
+def distance_km(point, to, mode=None):
+    return distances_km([point], to, mode)[0]
+
+
+def max_error_km(points, to, mode=None):
+    """Returns the largest difference between `distances_km` and geopy's geodesic for the points."""
+    return max(
+        abs(distance - geopy.distance.geodesic(point, to).km)
+        for point, distance in zip(points, distances_km(points, to, mode))
+    )
@@ -0,0 +1,56 @@
+import math
+
+from django.db.models import FloatField, Func, Value
+from django.db.models.functions import Least
+
+EARTH_RADIUS_KM = 6371.0088
+
+
+class Radians(Func):
+    function = 'RADIANS'
+    output_field = FloatField()
+
+
+class Sin(Func):
+    function = 'SIN'
+    output_field = FloatField()
+
+
+class Cos(Func):
+    function = 'COS'
+    output_field = FloatField()
+
+
+class ASin(Func):
+    function = 'ASIN'
+    output_field = FloatField()
+
+
+class Sqrt(Func):
+    function = 'SQRT'
+    output_field = FloatField()
+
+
+class Power(Func):
+    function = 'POWER'
+    arity = 2
+    output_field = FloatField()
+
+
+def haversine(latitude, longitude, other):
+    """
+    Builds a SQL expression for the great circle distance in km between the
+    coordinate columns `latitude`/`longitude` and the point `other`.
+    """
+    other_latitude = math.radians(float(other.latitude))
+    other_longitude = math.radians(float(other.longitude))
+
+    delta_latitude = Radians(latitude) - Value(other_latitude, output_field=FloatField())
+    delta_longitude = Radians(longitude) - Value(other_longitude, output_field=FloatField())
+
+    a = Power(Sin(delta_latitude / Value(2.0)), Value(2)) + \
+        Value(math.cos(other_latitude), output_field=FloatField()) * Cos(Radians(latitude)) * \
+        Power(Sin(delta_longitude / Value(2.0)), Value(2))
+
+    # LEAST guards against rounding errors pushing the argument of ASIN above 1
+    return Value(2 * EARTH_RADIUS_KM, output_field=FloatField()) * ASin(Sqrt(Least(a, Value(1.0), output_field=FloatField())))
@@ -0,0 +1,73 @@
+import math
+
+BASE32 = '0123456789bcdefghjkmnpqrstuvwxyz'
+MAX_PRECISION = 12
+KM_PER_DEGREE = 111.32
+
+
+def encode(latitude, longitude, precision=MAX_PRECISION):
+    """Encodes a coordinate as a geohash with `precision` characters."""
+    latitude_range = [-90.0, 90.0]
+    longitude_range = [-180.0, 180.0]
+    geohash = []
+    bits = 0
+    bit_count = 0
+    even = True  # geohashes start with a longitude bit
+    while len(geohash) < precision:
+        interval, value = (longitude_range, longitude) if even else (latitude_range, latitude)
+        middle = (interval[0] + interval[1]) / 2
+        bits <<= 1
+        if value >= middle:
+            bits |= 1
+            interval[0] = middle
+        else:
+            interval[1] = middle
+        even = not even
+        bit_count += 1
+        if bit_count == 5:
+            geohash.append(BASE32[bits])
+            bits = 0
+            bit_count = 0
+    return ''.join(geohash)
+
+
+def cell_size(precision):
+    """Returns the (latitude, longitude) extent in degrees of a geohash cell."""
+    longitude_bits = (5 * precision + 1) // 2
+    latitude_bits = 5 * precision // 2
+    return 180.0 / 2 ** latitude_bits, 360.0 / 2 ** longitude_bits
+
+
+def bounding_box(latitude, longitude, km):
+    """Returns the (latitude, longitude) half extents in degrees of a circle with radius `km`."""
+    delta_latitude = km / KM_PER_DEGREE
+    cos_latitude = math.cos(math.radians(min(abs(latitude) + delta_latitude, 89.9)))
+    delta_longitude = min(km / (KM_PER_DEGREE * cos_latitude), 180.0)
+    return delta_latitude, delta_longitude
+
+
+def covering_cells(latitude, longitude, km):
+    """
+    Returns the set of geohash prefixes whose cells cover a circle with radius `km`,
+    or None if the circle is too large to be covered by a few cells.
+    The precision is chosen so a cell is at least as large as the radius, then three
+    sample points per axis are enough to hit every cell that intersects the circle.
+    """
+    delta_latitude, delta_longitude = bounding_box(latitude, longitude, km)
+    height, width = cell_size(1)
+    if height < delta_latitude or width < delta_longitude:
+        return None  # the circle is larger than the coarsest cells, no prefix can narrow it down
+    precision = 1
+    while precision < MAX_PRECISION:
+        height, width = cell_size(precision + 1)
+        if height < delta_latitude or width < delta_longitude:
+            break
+        precision += 1
+
+    cells = set()
+    for lat in (latitude - delta_latitude, latitude, latitude + delta_latitude):
+        for lon in (longitude - delta_longitude, longitude, longitude + delta_longitude):
+            lat = max(-90.0, min(90.0, lat))
+            lon = (lon + 180.0) % 360.0 - 180.0  # wrap around the antimeridian
+            cells.add(encode(lat, lon, precision))
+    return cells
@@ -0,0 +1,43 @@
+import random
+import timeit
+from decimal import Decimal
+
+import geopy.distance
+from django.core.management.base import BaseCommand
+
+from Location import distance
+
+
+class Command(BaseCommand):
+    help = 'Compares the batched distance engine with the per row geopy computation.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--points', type=int, default=200, help='number of locations per batch')
+        parser.add_argument('--repeat', type=int, default=20, help='number of timed batches')
+        parser.add_argument('--radius', type=float, default=5.0, help='spread of the locations in degrees')
+
+    def handle(self, *args, **options):
+        rng = random.Random(0)
+        to = (52.520008, 13.404954)
+        spread = options['radius']
+        points = [
+            (Decimal('%.6f' % (to[0] + rng.uniform(-spread, spread))), Decimal('%.6f' % (to[1] + rng.uniform(-spread, spread))))
+            for _ in range(options['points'])
+        ]
+        repeat = options['repeat']
+
+        def geopy_loop():
+            return [geopy.distance.vincenty(point, to).km for point in points]
+
+        def timed(function):
+            return min(timeit.repeat(function, number=1, repeat=repeat)) * 1000
+
+        self.stdout.write('{0} locations, best of {1} runs, numpy {2}'.format(
+            len(points), repeat, 'available' if distance.numpy is not None else 'not installed'))
+        self.stdout.write('geopy vincenty per row: {0:8.3f} ms'.format(timed(geopy_loop)))
+        for mode in (distance.HAVERSINE, distance.ELLIPSOIDAL):
+            self.stdout.write('{0:<22} {1:8.3f} ms, max error {2:.4f} km'.format(
+                mode + ':',
+                timed(lambda: distance.distances_km(points, to, mode)),
+                distance.max_error_km(points, to, mode),
+            ))
@@ -0,0 +1,32 @@
+# Generated by Django 2.1.2 on 2019-01-28 18:02
+
+from django.db import migrations, models
+
+from Location import geohash
+
+
+def fill_geohash(apps, schema_editor):
+    Location = apps.get_model('Location', 'Location')
+    for location in Location.objects.all().iterator():
+        location.geohash = geohash.encode(float(location.latitude), float(location.longitude))
+        location.save(update_fields=['geohash'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Location', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='location',
+            name='geohash',
+            field=models.CharField(blank=True, db_index=True, editable=False, max_length=12),
+        ),
+        migrations.AddIndex(
+            model_name='location',
+            index=models.Index(fields=['latitude', 'longitude'], name='Location_lo_latitud_e4400f_idx'),
+        ),
+        migrations.RunPython(fill_geohash, migrations.RunPython.noop),
+    ]
@@ -1,5 +1,11 @@
-import geopy.distance
 from django.db import models
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from H2H import response_cache
+
+from . import geohash
+from .distance import distance_km
 
 
 # Create your models here.
@@ -7,11 +13,47 @@ class Location(models.Model):
     latitude = models.DecimalField(max_digits=9, decimal_places=6)
     longitude = models.DecimalField(max_digits=9, decimal_places=6)
     name = models.CharField(max_length=200)
+    # spatial index: prefix searches on the geohash narrow a query down to a few grid cells
+    geohash = models.CharField(max_length=geohash.MAX_PRECISION, db_index=True, editable=False, blank=True)
+
+    loaded_geohash = None
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['latitude', 'longitude']),
+        ]
 
     def __str__(self):
         return self.name
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super(Location, cls).from_db(db, field_names, values)
+        # remember the stored geohash so receivers can tell whether the location moved
+        instance.loaded_geohash = instance.__dict__.get('geohash')
+        return instance
+
+    def save(self, *args, **kwargs):
+        self.geohash = geohash.encode(float(self.latitude), float(self.longitude))
+        super(Location, self).save(*args, **kwargs)
+        self.loaded_geohash = self.geohash
+
+    def annotated_distance_to(self, other):
+        """Returns the distance to other computed by the database if the location was loaded with it, else None"""
+        annotated = getattr(self, 'annotated_distance', None)
+        if annotated and annotated[0] == (float(other.latitude), float(other.longitude)):
+            return annotated[1]
+        return None
+
     def distance(self, other):
-        own_loc = (self.latitude, self.longitude)
-        other_loc = (other.latitude, other.longitude)
-        return geopy.distance.vincenty(own_loc, other_loc).km
\ No newline at end of file
+        annotated = self.annotated_distance_to(other)
+        if annotated is not None:
+            return annotated
+        return distance_km((self.latitude, self.longitude), (other.latitude, other.longitude))
+
+
+@receiver([post_save, post_delete], sender=Location)
+def invalidate_location_responses(sender, instance, *args, **kwargs):
+    event = getattr(instance, 'event', None)
+    if event is not None:
+        response_cache.invalidate('events', 'event:{0}'.format(event.pk))
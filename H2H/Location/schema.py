@@ -2,6 +2,8 @@ import graphene
 from graphene_django import DjangoObjectType
 from graphql_jwt.decorators import login_required
 
+from H2H.loaders import get_loaders
+
 from .models import Location
 
 
@@ -18,7 +20,12 @@ class LocationType(DjangoObjectType):
         exclude_fields = ('profile', 'event',)
 
     def resolve_distance(self, info, to):
-        return self.distance(to)
+        # reuse the value computed by the database, otherwise compute the distances of all rows at once
+        annotated = self.annotated_distance_to(to)
+        if annotated is not None:
+            return annotated
+        key = (float(self.latitude), float(self.longitude), float(to.latitude), float(to.longitude))
+        return get_loaders(info).distance.load(key)
 
 
 class CreateLocation(graphene.Mutation):
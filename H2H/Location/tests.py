@@ -1,3 +1,29 @@
+from unittest import skipIf
+
+import geopy.distance
 from django.test import TestCase
 
-# Create your tests here.
+from Location import distance
+
+
+class DistanceTests(TestCase):
+    points = [(52.520008, 13.404954), (48.137154, 11.576124), (-33.86882, 151.209296), (40.712776, -74.005974), (0, 0)]
+    to = (53.551086, 9.993682)
+
+    def test_ellipsoidal_agrees_with_geopy(self):
+        for point, km in zip(self.points, distance.distances_km(self.points, self.to, distance.ELLIPSOIDAL)):
+            self.assertAlmostEqual(km, geopy.distance.geodesic(point, self.to).km, delta=0.05)
+
+    def test_haversine_is_close(self):
+        for point, km in zip(self.points, distance.distances_km(self.points, self.to, distance.HAVERSINE)):
+            self.assertAlmostEqual(km / geopy.distance.geodesic(point, self.to).km, 1, delta=0.005)
+
+    @skipIf(distance.numpy is None, "numpy is not installed")
+    def test_python_fallback_matches_numpy(self):
+        for mode in (distance.HAVERSINE, distance.ELLIPSOIDAL):
+            fallback = distance._distances_python(self.points, self.to, mode)
+            for km, expected in zip(fallback, distance._distances_numpy(self.points, self.to, mode)):
+                self.assertAlmostEqual(km, expected, places=6)
+
+    def test_same_point(self):
+        self.assertEqual(distance.distances_km([self.to], self.to), [0.0])
@@ -1,5 +1,9 @@
 from django.contrib.auth.models import User
 from django.db import models
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+
+from H2H import response_cache
 
 
 # Create your models here.
@@ -11,3 +15,26 @@ class Organisation(models.Model):
 
     def __str__(self):
         return self.name
+
+
+@receiver([post_save, post_delete], sender=Organisation)
+def invalidate_organisation_responses(sender, instance, *args, **kwargs):
+    event_tags = ['event:{0}'.format(pk) for pk in instance.event_set.values_list('id', flat=True)]
+    response_cache.invalidate('events', 'organisations', *event_tags)
+
+
+@receiver(m2m_changed, sender=Organisation.members.through)
+def forget_changed_memberships(sender, instance, action, reverse, pk_set, **kwargs):
+    from .permissions import forget_memberships
+
+    if action not in ('post_add', 'post_remove', 'pre_clear'):
+        return
+    if action == 'pre_clear':  # the cleared rows are only known before they are deleted
+        if reverse:
+            pk_set = list(instance.organisation_set.values_list('pk', flat=True))
+        else:
+            pk_set = list(instance.members.values_list('pk', flat=True))
+    if reverse:
+        forget_memberships((pk, instance.pk) for pk in pk_set)
+    else:
+        forget_memberships((instance.pk, pk) for pk in pk_set)
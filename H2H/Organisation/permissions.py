@@ -0,0 +1,86 @@
+"""
+Membership and admin checks of organisations.
+
+`is_member` answers with an EXISTS query on the members table, which is served by the index
+on (organisation, user) instead of loading every member. The answers are remembered for the
+rest of the request and in the cache for ORGANISATION_PERMISSION_CACHE_TIMEOUT seconds. The
+m2m_changed receiver of Organisation.members drops the cached answers of changed memberships.
+
+The receiver only reaches the cache of the process that changed the membership. A local-memory
+cache would let the other workers keep the rights of a removed member until the answer expires,
+so the answers are only cached across requests in a shared cache (REDIS_URL). Without one every
+request asks the database once per organisation.
+"""
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+
+from .models import Organisation
+
+KEY_PREFIX = 'organisation:member:'
+
+# backends that keep their entries in the worker process
+LOCAL_CACHE_BACKENDS = (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+
+
+def get_cache():
+    """Returns the cache of the membership answers, None unless every worker shares it."""
+    alias = settings.ORGANISATION_PERMISSION_CACHE_ALIAS
+    if alias is None or settings.CACHES[alias]['BACKEND'] in LOCAL_CACHE_BACKENDS:
+        return None
+    return caches[alias]
+
+
+def membership_key(organisation_id, user_id):
+    return '{0}{1}:{2}'.format(KEY_PREFIX, organisation_id, user_id)
+
+
+def _primary_key(organisation):
+    return getattr(organisation, 'pk', organisation)
+
+
+def is_member(info, organisation):
+    """Returns whether the user of the request is a member of `organisation`, an instance or an id."""
+    user = info.context.user
+    organisation_id = _primary_key(organisation)
+    if organisation_id is None or not user.is_authenticated:
+        return False
+
+    if not hasattr(info.context, 'memberships'):
+        info.context.memberships = {}
+    memberships = info.context.memberships
+    if organisation_id not in memberships:
+        cache = get_cache()
+        key = membership_key(organisation_id, user.pk)
+        member = cache.get(key) if cache is not None else None
+        if member is None:
+            member = Organisation.members.through.objects.filter(
+                organisation_id=organisation_id, user_id=user.pk
+            ).exists()
+            if cache is not None:
+                cache.set(key, member, settings.ORGANISATION_PERMISSION_CACHE_TIMEOUT)
+        memberships[organisation_id] = member
+    return memberships[organisation_id]
+
+
+def is_admin(info, organisation):
+    """Returns whether the user of the request is the admin of `organisation`, an instance or an id."""
+    user = info.context.user
+    if organisation is None or not user.is_authenticated:
+        return False
+    if isinstance(organisation, Organisation):
+        return organisation.admin_id == user.pk
+    return Organisation.objects.filter(pk=organisation, admin_id=user.pk).exists()
+
+
+def forget_memberships(pairs):
+    """Drops the cached answers of the (organisation id, user id) `pairs`."""
+    cache = get_cache()
+    keys = [membership_key(organisation_id, user_id) for organisation_id, user_id in pairs]
+    if cache is not None and keys:
+        cache.delete_many(keys)
+        # a concurrent request may cache the old membership again until the change is committed
+        transaction.on_commit(lambda: cache.delete_many(keys))
@@ -3,7 +3,10 @@ from django.contrib.auth.models import User
 from graphene_django import DjangoObjectType
 from graphql_jwt.decorators import login_required
 
+from H2H.optimizer import optimize_queryset
+from H2H.pagination import connection_args, paginate
 from .models import Organisation
+from .permissions import is_admin
 
 
 class OrganisationType(DjangoObjectType):
@@ -11,6 +14,11 @@ class OrganisationType(DjangoObjectType):
         model = Organisation
 
 
+class OrganisationConnection(graphene.relay.Connection):
+    class Meta:
+        node = OrganisationType
+
+
 class CreateOrganisation(graphene.Mutation):
     id = graphene.ID()
     name = graphene.String()
@@ -55,10 +63,9 @@ class UpdateOrganisation(graphene.Mutation):
 
     @login_required
     def mutate(self, info, **kwargs):
-        user = info.context.user
         organisation = Organisation.objects.get(pk=kwargs.get('organisation_id'))
 
-        if user != organisation.admin:
+        if not is_admin(info, organisation):
             raise Exception('You have to be the admin of this organisation to update it')
 
         if kwargs.get('name', None):
@@ -90,10 +97,9 @@ class AddMember(graphene.Mutation):
 
     @login_required
     def mutate(self, info, organisation_id, username):
-        user = info.context.user
         organisation = Organisation.objects.get(pk=organisation_id)
 
-        if user != organisation.admin:
+        if not is_admin(info, organisation):
             raise Exception('You have to be the admin of this organisation to add members to it')
 
         organisation.members.add(User.objects.get(username=username))
@@ -121,15 +127,14 @@ class RemoveMembers(graphene.Mutation):
 
     @login_required
     def mutate(self, info, organisation_id, user_ids):
-        user = info.context.user
         organisation = Organisation.objects.get(pk=organisation_id)
 
-        if user != organisation.admin:
+        if not is_admin(info, organisation):
             raise Exception('You have to be the admin of this organisation to delete its members')
 
         for id in user_ids:
             to_be_deleted = User.objects.get(pk=id)
-            if to_be_deleted != organisation.admin:
+            if to_be_deleted.pk != organisation.admin_id:
                 organisation.members.remove(to_be_deleted)
             else:
                 raise Exception('You cannot remove the admin of an organisation')
@@ -153,10 +158,9 @@ class DeleteOrganisation(graphene.Mutation):
 
     @login_required
     def mutate(self, info, organisation_id):
-        user = info.context.user
         organisation = Organisation.objects.get(id=organisation_id)
 
-        if user != organisation.admin:
+        if not is_admin(info, organisation):
             raise Exception('You have to be the admin of this organisation to delete it')
 
         organisation.delete()
@@ -167,9 +171,14 @@ class DeleteOrganisation(graphene.Mutation):
 class Query(graphene.ObjectType):
     organisations = graphene.List(OrganisationType)
     organisation = graphene.Field(OrganisationType, id=graphene.ID())
+    organisations_connection = graphene.Field(OrganisationConnection, **connection_args())
 
     def resolve_organisations(self, info):
-        return Organisation.objects.all()
+        return optimize_queryset(Organisation.objects.all(), info)
+
+    def resolve_organisations_connection(self, info, first=None, after=None):
+        organisations = optimize_queryset(Organisation.objects.all(), info, path=('edges', 'node'))
+        return paginate(OrganisationConnection, organisations, 'id', first, after)
 
     def resolve_organisation(self, info, id):
         return Organisation.objects.get(id=id)
@@ -1,11 +1,22 @@
 
+from types import SimpleNamespace
+
+from django.conf import settings
 from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.test import override_settings
 
 
 # Create your tests here.
 from graphql_jwt.testcases import JSONWebTokenTestCase
 
 from Organisation.models import Organisation
+from Organisation.permissions import is_admin, is_member, membership_key
+
+
+class SharedCache(LocMemCache):
+    """Stands in for a cache shared by the workers like redis, the tests run in one process"""
 
 
 class OrganisationTest(JSONWebTokenTestCase):
@@ -93,4 +104,52 @@ class UpdateTests(OrganisationTest):
             }
         """
         result = self.client.execute(query)
-        self.assertTrue("user_1" in result.data['updateOrganisation']['organisation']['members'][0].values())
\ No newline at end of file
+        self.assertTrue("user_1" in result.data['updateOrganisation']['organisation']['members'][0].values())
+
+
+class PermissionTests(OrganisationTest):
+    def info(self, user):
+        return SimpleNamespace(context=SimpleNamespace(user=user))
+
+    @override_settings(
+        CACHES=dict(settings.CACHES, permissions={'BACKEND': 'Organisation.tests.SharedCache'}),
+        ORGANISATION_PERMISSION_CACHE_ALIAS='permissions',
+    )
+    def test_is_member(self):
+        caches['permissions'].clear()
+        info = self.info(self.user_1)
+        self.assertFalse(is_member(info, self.orga_0))
+
+        self.orga_0.members.add(self.user_1)
+
+        # remembered for the request, the cached answer was dropped for the next one
+        self.assertFalse(is_member(info, self.orga_0))
+        with self.assertNumQueries(1):
+            self.assertTrue(is_member(self.info(self.user_1), self.orga_0.id))
+        with self.assertNumQueries(0):
+            self.assertTrue(is_member(self.info(self.user_1), self.orga_0.id))
+
+        self.user_1.organisation_set.clear()
+        self.assertFalse(is_member(self.info(self.user_1), self.orga_0))
+
+    @override_settings(CACHES=dict(
+        settings.CACHES,
+        worker_0={'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'worker_0'},
+        worker_1={'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'worker_1'},
+    ))
+    def test_is_member_local_cache(self):
+        self.orga_0.members.add(self.user_1)
+        # answered and cached by the first worker before the member is removed through the second
+        caches['worker_0'].set(membership_key(self.orga_0.id, self.user_1.id), True)
+        with self.settings(ORGANISATION_PERMISSION_CACHE_ALIAS='worker_1'):
+            self.orga_0.members.remove(self.user_1)
+
+        with self.settings(ORGANISATION_PERMISSION_CACHE_ALIAS='worker_0'), self.assertNumQueries(1):
+            self.assertFalse(is_member(self.info(self.user_1), self.orga_0))
+
+    def test_is_admin(self):
+        with self.assertNumQueries(0):
+            self.assertTrue(is_admin(self.info(self.user_0), self.orga_0))
+            self.assertFalse(is_admin(self.info(self.user_1), self.orga_0))
+        self.assertTrue(is_admin(self.info(self.user_0), self.orga_0.id))
+
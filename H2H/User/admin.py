@@ -11,6 +11,7 @@ class ProfileInline(admin.StackedInline):
     model = Profile
     can_delete = False
     fields = ('birthday', 'credit_points', 'location')
+    readonly_fields = ('credit_points',)
     verbose_name_plural = 'profiles'
 
 
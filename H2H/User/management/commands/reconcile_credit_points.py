@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import F
+
+from User.models import Profile, ledger_balances
+
+
+class Command(BaseCommand):
+    help = 'Compares the cached credit points of the profiles with the sum of their credit transactions.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repair', action='store_true', help='set the wrong balances to the ledger sums')
+
+    def handle(self, *args, **options):
+        wrong = list(
+            ledger_balances().exclude(credit_points=F('ledger_balance'))
+            .values_list('user_id', 'credit_points', 'ledger_balance')
+        )
+        for user_id, credit_points, ledger_balance in wrong:
+            self.stdout.write('User {0}: balance {1}, ledger {2}'.format(user_id, credit_points, ledger_balance))
+
+        if not wrong:
+            self.stdout.write(self.style.SUCCESS('All credit points match the ledger'))
+        elif options['repair']:
+            user_ids = [row[0] for row in wrong]
+            with transaction.atomic():
+                # recomputed under the row locks, a booking may have happened since the comparison
+                list(Profile.objects.select_for_update().filter(user_id__in=user_ids).values_list('pk'))
+                for pk, ledger_balance in ledger_balances().filter(user_id__in=user_ids).values_list('pk', 'ledger_balance'):
+                    Profile.objects.filter(pk=pk).update(credit_points=ledger_balance)
+            self.stdout.write(self.style.SUCCESS('Repaired {0} balances'.format(len(wrong))))
+        else:
+            self.stdout.write(self.style.WARNING('{0} balances differ from the ledger, use --repair to fix them'.format(len(wrong))))
@@ -0,0 +1,48 @@
+# Generated by Django 2.1.2 on 2019-01-31 10:12
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def open_ledger(apps, schema_editor):
+    """Books the existing balances as opening balances, so the ledger adds up to them."""
+    Profile = apps.get_model('User', 'Profile')
+    CreditTransaction = apps.get_model('User', 'CreditTransaction')
+    CreditTransaction.objects.bulk_create(
+        CreditTransaction(user_id=user_id, amount=credit_points, reason=1)
+        for user_id, credit_points in Profile.objects.filter(credit_points__gt=0).values_list('user_id', 'credit_points')
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('Event', '0012_job_counters'),
+        ('User', '0005_auto_20181209_1439'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CreditTransaction',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('amount', models.IntegerField()),
+                ('reason', models.IntegerField(choices=[(1, 'Opening balance'), (2, 'Participated'), (3, 'Event created'), (4, 'Adjustment')])),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('event', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='Event.Event')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.AlterField(
+            model_name='profile',
+            name='credit_points',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddIndex(
+            model_name='credittransaction',
+            index=models.Index(fields=['user', 'id'], name='User_credit_user_id_050e0c_idx'),
+        ),
+        migrations.RunPython(open_ledger, migrations.RunPython.noop),
+    ]
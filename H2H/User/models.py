@@ -1,5 +1,7 @@
 from django.contrib.auth.models import User
-from django.db import models
+from django.db import models, transaction
+from django.db.models import F, Sum
+from django.db.models.functions import Coalesce
 
 from django.db.models.signals import post_delete, post_save
 from django.dispatch import receiver
@@ -10,13 +12,92 @@ from Location.models import Location
 class Profile(models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE)
     birthday = models.DateField(blank=True, null=True)
-    credit_points = models.PositiveIntegerField(default=0)
+    # cached balance of the CreditTransactions of the user, only changed by add_credit_points
+    credit_points = models.PositiveIntegerField(default=0, editable=False)
     location = models.OneToOneField('Location.Location', on_delete=models.PROTECT, null=True, blank=True)
 
+    def save(self, *args, **kwargs):
+        # writing the loaded balance back would lose the F() updates that happened in the meantime
+        if not self._state.adding and kwargs.get('update_fields') is None:
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name != 'credit_points'
+            ]
+        super(Profile, self).save(*args, **kwargs)
+
     def __str__(self):
         return str(self.user)
 
 
+class CreditTransaction(models.Model):
+    """
+    Append-only ledger of the credit points. Profile.credit_points is the cached sum of the
+    transactions of a user and only changed together with them, see `add_credit_points`.
+    """
+    REASONS = (
+        (1, 'Opening balance'),
+        (2, 'Participated'),
+        (3, 'Event created'),
+        (4, 'Adjustment'),
+    )
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    amount = models.IntegerField()
+    reason = models.IntegerField(choices=REASONS)
+    event = models.ForeignKey('Event.Event', on_delete=models.SET_NULL, blank=True, null=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            # creditHistory pages through the transactions of one user by id
+            models.Index(fields=['user', 'id']),
+        ]
+
+    def __str__(self):
+        return str(self.user) + ': ' + str(self.amount) + ' (' + self.get_reason_display() + ')'
+
+
+def add_credit_points(bookings, reason):
+    """
+    Books (user id, amount, event) `bookings` into the ledger and adds them to the balances.
+    The ledger rows are inserted first and the balances are changed with one F() update per
+    distinct total as the last statements of the transaction, so the profile rows stay locked
+    as short as possible. A debit only matches profiles that can afford it, if one can not the
+    whole booking is rolled back.
+    """
+    bookings = [(user_id, amount, event) for user_id, amount, event in bookings if amount]
+    totals = {}
+    for user_id, amount, event in bookings:
+        totals[user_id] = totals.get(user_id, 0) + amount
+    users_by_total = {}
+    for user_id, total in totals.items():
+        users_by_total.setdefault(total, []).append(user_id)
+
+    with transaction.atomic():
+        CreditTransaction.objects.bulk_create(
+            CreditTransaction(user_id=user_id, amount=amount, reason=reason, event=event)
+            for user_id, amount, event in bookings
+        )
+        for total, user_ids in sorted(users_by_total.items()):
+            profiles = Profile.objects.filter(user_id__in=user_ids)
+            if total < 0:
+                profiles = profiles.filter(credit_points__gte=-total)
+            if profiles.update(credit_points=F('credit_points') + total) != len(user_ids):
+                raise Exception("Not enough credit points")
+
+
+def set_credit_points(user, credit_points):
+    """Books the difference between the balance of `user` and `credit_points` as an adjustment."""
+    with transaction.atomic():
+        balance = Profile.objects.select_for_update().values_list('credit_points', flat=True).get(user=user)
+        add_credit_points([(user.id, credit_points - balance, None)], 4)
+
+
+def ledger_balances():
+    """Returns the profiles annotated with the `ledger_balance` summed up from their transactions."""
+    return Profile.objects.annotate(ledger_balance=Coalesce(Sum('user__credittransaction__amount'), 0))
+
+
 class Skill(models.Model):
     name = models.CharField(max_length=200)
 
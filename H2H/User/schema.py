@@ -9,8 +9,11 @@ from graphql_jwt.decorators import login_required
 
 from Event.models import Event
 from Event.schema import EventType
+from H2H.loaders import get_loaders
+from H2H.optimizer import optimize_queryset
+from H2H.pagination import connection_args, paginate
 from Location.models import Location
-from .models import Skill, HasSkill, Profile, Favourite
+from .models import CreditTransaction, Skill, HasSkill, Profile, Favourite, set_credit_points
 
 
 # Types
@@ -27,7 +30,7 @@ class SkillType(DjangoObjectType):
         exclude_fields = ('hasskill_set',)
 
     def resolve_approved(self, info):
-        return HasSkill.objects.get(user=info.context.user, skill=self).approved
+        return get_loaders(info).skill_approval.load(self.id)
 
 
 class HasSkillType(DjangoObjectType):
@@ -43,10 +46,26 @@ class UserType(DjangoObjectType):
         model = User
 
     def resolve_skills(self, info):
-        return [s.skill for s in HasSkill.objects.filter(user=self)]
+        return get_loaders(info).skills_by_user.load(self.id)
 
     def resolve_event_set(self, info):
-        return [event for event in Event.objects.filter(creator=self, organisation=None)]
+        return get_loaders(info).private_events_by_creator.load(self.id)
+
+
+class CreditTransactionType(DjangoObjectType):
+    reason = graphene.String()
+
+    class Meta:
+        model = CreditTransaction
+        exclude_fields = ('user',)
+
+    def resolve_reason(self, info):
+        return self.get_reason_display()
+
+
+class CreditTransactionConnection(graphene.relay.Connection):
+    class Meta:
+        node = CreditTransactionType
 
 
 class ProfileType(DjangoObjectType):
@@ -126,13 +145,16 @@ class UpdateUser(graphene.Mutation):
     @login_required
     def mutate(self, info, **kwargs):
         user = info.context.user
+        credit_points = kwargs.get('credit_points', None)
+        # balances change with the bookings of add_credit_points, only staff may adjust them by hand
+        if credit_points is not None and not user.is_staff:
+            raise Exception("Only staff members can set credit points")
         # users old email if email=""
         email = kwargs.get("email", None)
         if email:
             validate_email(email)
             user.email = email
         user.profile.birthday = kwargs.get('birthday', user.profile.birthday)
-        user.profile.credit_points = kwargs.get('credit_points', user.profile.credit_points)
         location_id = kwargs.get('location_id', None)
         if location_id:
             location = Location.objects.get(id=location_id)
@@ -145,6 +167,9 @@ class UpdateUser(graphene.Mutation):
             user.last_name = last_name
         user.save()
         user.profile.save()
+        if credit_points is not None:
+            set_credit_points(user, credit_points)
+            user.profile.refresh_from_db(fields=['credit_points'])
         return UpdateUser(
             id=user.id,
             username=user.username,
@@ -224,6 +249,7 @@ class Query(graphene.ObjectType):
     user = graphene.Field(UserType)
     find_participant = graphene.Field(UserType, user_id=graphene.ID())
     skill_search = graphene.List(SkillType, query=graphene.String())
+    credit_history = graphene.Field(CreditTransactionConnection, **connection_args())
 
     def resolve_user(self, info):
         return User.objects.get(id=info.context.user.id)
@@ -238,6 +264,13 @@ class Query(graphene.ObjectType):
     def resolve_find_participant(self, info, user_id):
         return User.objects.get(id=user_id)
 
+    @login_required
+    def resolve_credit_history(self, info, first=None, after=None):
+        # newest first, the (user, id) index serves every page
+        transactions = CreditTransaction.objects.filter(user=info.context.user)
+        transactions = optimize_queryset(transactions, info, path=('edges', 'node'))
+        return paginate(CreditTransactionConnection, transactions, '-id', first, after)
+
 
 class Mutation(graphene.AbstractType):
     create_user = CreateUser.Field()
@@ -1,9 +1,12 @@
 
+import os
+
 from django.contrib.auth import get_user_model
+from django.core.management import call_command
 
 from graphql_jwt.testcases import JSONWebTokenTestCase
 
-from User.models import Skill, HasSkill, Profile
+from User.models import CreditTransaction, Skill, HasSkill, Profile, add_credit_points
 
 
 class UsersTests(JSONWebTokenTestCase):
@@ -66,6 +69,8 @@ class UsersTests(JSONWebTokenTestCase):
         self.assertEqual(resp.data['user']['profile']['creditPoints'], 0)
 
     def test_increase_credit_points(self):
+        self.user.is_staff = True
+        self.user.save()
         resp = self.client.execute(
             """
             mutation {
@@ -82,6 +87,68 @@ class UsersTests(JSONWebTokenTestCase):
 
         self.assertEqual(resp.data['updateUser']['user']['profile']['creditPoints'], 10)
 
+    def test_set_own_credit_points(self):
+        resp = self.client.execute(
+            """
+            mutation {
+              updateUser(creditPoints:10, firstName:"test"){
+                id
+              }
+            }
+            """
+        )
+
+        self.assertEqual(resp.errors[0].message, "Only staff members can set credit points")
+        profile = Profile.objects.select_related('user').get(user=self.user)
+        self.assertEqual(profile.credit_points, 0)
+        self.assertEqual(profile.user.first_name, '')
+        self.assertFalse(CreditTransaction.objects.filter(user=self.user).exists())
+
+    def test_credit_ledger(self):
+        add_credit_points([(self.user.id, 5, None)] * 3, 2)
+
+        with self.assertRaises(Exception):
+            add_credit_points([(self.user.id, -20, None)], 3)
+
+        self.assertEqual(Profile.objects.get(user=self.user).credit_points, 15)
+        self.assertEqual(CreditTransaction.objects.filter(user=self.user).count(), 3)
+
+    def test_credit_history(self):
+        add_credit_points([(self.user.id, amount, None) for amount in (1, 2, 3)], 2)
+        query = """
+            query {
+              creditHistory(first: 2%s) {
+                edges {
+                  cursor
+                  node {
+                    amount
+                    reason
+                  }
+                }
+                pageInfo {
+                  hasNextPage
+                }
+              }
+            }
+            """
+
+        resp_0 = self.client.execute(query % "")
+        edges = resp_0.data['creditHistory']['edges']
+        resp_1 = self.client.execute(query % (', after: "%s"' % edges[-1]['cursor']))
+
+        self.assertEqual([edge['node']['amount'] for edge in edges], [3, 2])
+        self.assertEqual(edges[0]['node']['reason'], 'Participated')
+        self.assertTrue(resp_0.data['creditHistory']['pageInfo']['hasNextPage'])
+        self.assertEqual([edge['node']['amount'] for edge in resp_1.data['creditHistory']['edges']], [1])
+
+    def test_reconcile_credit_points(self):
+        add_credit_points([(self.user.id, 10, None)], 2)
+        Profile.objects.filter(user=self.user).update(credit_points=3)
+
+        call_command('reconcile_credit_points', '--repair', stdout=open(os.devnull, 'w'))
+
+        self.assertEqual(Profile.objects.get(user=self.user).credit_points, 10)
+
     def test_negative_credit_points(self):
         pass
         # TODO: SQLite does not validate PositiveIntegerField.
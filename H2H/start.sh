@@ -4,7 +4,9 @@
 echo Starting Gunicorn.
 python3 ./manage.py makemigrations
 python3 ./manage.py migrate
+python3 ./manage.py rebuild_event_clusters
 
+# worker class, workers and threads are derived from the cpu count, see GUNICORN_* in settings.py
 exec gunicorn H2H.wsgi \
-    --bind 0.0.0.0:8000 \
-    --workers 3
\ No newline at end of file
+    --config H2H/gunicorn_conf.py \
+    --bind 0.0.0.0:8000
\ No newline at end of file